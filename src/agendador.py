@@ -0,0 +1,231 @@
+import argparse
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from constants import *
+from database import (ler_execucoes_agendador, listar_carteiras, registrar_execucao_agendador, salvar_cotacoes,
+                      salvar_detalhes_ativo, usar_carteira)
+from migracoes import migrar
+
+# Agendador dos dados externos (cotações, histórico de preços, SGS e notícias)
+# Roda fora do carregamento da página: numa thread do próprio app (iniciar_em_segundo_plano) ou como
+# serviço separado no docker-compose (python src/agendador.py). As buscas seguem os pregões da B3 e dos EUA:
+#   - cotações: a cada 15 min com algum pregão aberto e uma vez depois de cada fechamento
+#   - histórico de preços, benchmarks, SGS e valor diário: uma vez depois de cada fechamento
+#   - notícias e descrição dos ativos: a cada 3 horas
+# Cada tarefa tem uma "marca": o último instante em que os dados deveriam ter sido buscados.
+# Se a última execução (tabela agendador_execucoes da carteira) é anterior à marca, a tarefa roda.
+#
+# Para subir: python src/agendador.py            (laço, até Ctrl+C)
+#             python src/agendador.py --uma-vez  (só as tarefas vencidas, para usar no cron)
+
+_parar = threading.Event()
+_thread = None
+_trava = threading.Lock()
+
+# Funções dos pregões (horários em UTC)
+
+def _pregao_do_dia(mercado, dia):
+    """(abertura, fechamento) do pregão do mercado no dia (data local), ou None no fim de semana."""
+    fuso, abertura, fechamento = PREGOES[mercado]
+    if dia.weekday() >= 5:
+        return None
+    horarios = []
+    for horario in (abertura, fechamento):
+        hora, minuto = map(int, horario.split(":"))
+        horarios.append(datetime(dia.year, dia.month, dia.day, hora, minuto, tzinfo=ZoneInfo(fuso)).astimezone(timezone.utc))
+    return tuple(horarios)
+
+def pregoes_recentes(agora, dias=7):
+    """[(mercado, abertura, fechamento), ...] de hoje e dos dias anteriores, em UTC."""
+    pregoes = []
+    for mercado, (fuso, _, _) in PREGOES.items():
+        hoje = agora.astimezone(ZoneInfo(fuso)).date()
+        for atras in range(dias):
+            pregao = _pregao_do_dia(mercado, hoje - timedelta(days=atras))
+            if pregao:
+                pregoes.append((mercado, *pregao))
+    return pregoes
+
+def mercados_abertos(agora=None):
+    """Mercados com pregão aberto agora (ex: ['B3', 'EUA'])."""
+    agora = agora or datetime.now(timezone.utc)
+    return [mercado for mercado, abertura, fechamento in pregoes_recentes(agora, 1) if abertura <= agora < fechamento]
+
+def _piso(agora, passo):
+    """Arredonda o horário para baixo num múltiplo de 'passo' (contado desde a meia-noite UTC)."""
+    meia_noite = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    return meia_noite + (agora - meia_noite) // passo * passo
+
+def _ultimo_fechamento(agora):
+    folga = timedelta(minutes=FOLGA_FECHAMENTO_MIN)
+    fechamentos = [fechamento + folga for _, _, fechamento in pregoes_recentes(agora) if fechamento + folga <= agora]
+    return max(fechamentos, default=None)
+
+# Marcas de cada tarefa
+
+def marca_cotacoes(agora):
+    """Com pregão aberto: o último múltiplo de 15 min. Fora do pregão: o último fechamento (+ folga)."""
+    if mercados_abertos(agora):
+        return _piso(agora, timedelta(minutes=INTERVALO_COTACOES_MIN))
+    return _ultimo_fechamento(agora)
+
+def marca_historico(agora):
+    """O último fechamento (B3 ou EUA), com folga para o fechamento oficial sair."""
+    return _ultimo_fechamento(agora)
+
+def marca_noticias(agora):
+    return _piso(agora, timedelta(hours=INTERVALO_NOTICIAS_H))
+
+# Tarefas (rodam dentro da carteira escolhida; retornam quantos itens foram atualizados)
+
+def _ativos_renda_variavel():
+    from nucleo.dados import carregar_transacoes
+    from nucleo.posicoes import calcular_carteira_atual, selecionar_ativos_renda_variavel
+
+    df = carregar_transacoes()
+    if df.empty:
+        return df, []
+    return df, selecionar_ativos_renda_variavel(calcular_carteira_atual(df), df)
+
+def _atualizar_cotacoes():
+    from nucleo.cotacoes import buscar_cotacoes
+
+    _, ativos = _ativos_renda_variavel()
+    cotacoes = buscar_cotacoes(ativos)
+    salvar_cotacoes(cotacoes)
+    return len(cotacoes)
+
+def _atualizar_historico():
+    from nucleo.benchmarks import atualizar_benchmarks
+    from nucleo.precos import atualizar_historico_precos, inicios_renda_variavel
+    from nucleo.renda_fixa import atualizar_series_sgs
+    from nucleo.valor_diario import atualizar_valor_diario
+
+    df, _ = _ativos_renda_variavel()
+    if df.empty:
+        return 0
+    novos = atualizar_historico_precos(inicios_renda_variavel(df))
+    novos += atualizar_benchmarks(df['Data'].min().strftime('%Y-%m-%d'))
+    novos += sum(atualizar_series_sgs().values())
+    # Deixa o valor diário pronto: a página só lê a tabela
+    atualizar_valor_diario()
+    return novos
+
+def _atualizar_noticias():
+    from nucleo.cotacoes import buscar_detalhes_ativo
+
+    _, ativos = _ativos_renda_variavel()
+    atualizados = 0
+    for ativo in ativos:
+        detalhes = buscar_detalhes_ativo(ativo)
+        # Falha na busca não apaga o que já estava guardado
+        if not detalhes.get("erro"):
+            salvar_detalhes_ativo(ativo, detalhes)
+            atualizados += 1
+    return atualizados
+
+# tarefa -> (marca, função)
+TAREFAS_AGENDADAS = {
+    "cotacoes": (marca_cotacoes, _atualizar_cotacoes),
+    "historico": (marca_historico, _atualizar_historico),
+    "noticias": (marca_noticias, _atualizar_noticias),
+}
+
+# Funções de execução
+
+def pendentes(agora=None):
+    """Tarefas vencidas na carteira ativa (a última execução é anterior à marca)."""
+    agora = agora or datetime.now(timezone.utc)
+    execucoes = ler_execucoes_agendador()
+    vencidas = []
+    for tarefa, (marca, _) in TAREFAS_AGENDADAS.items():
+        limite = marca(agora)
+        ultima = execucoes.get(tarefa)
+        if ultima is None or (limite is not None and datetime.fromisoformat(ultima) < limite):
+            vencidas.append(tarefa)
+    return vencidas
+
+def em_dia(tarefa, agora=None):
+    """True se o agendador já buscou os dados da tarefa depois da última marca (a página não precisa buscar)."""
+    return tarefa not in pendentes(agora)
+
+def executar_pendentes(carteiras=None, agora=None, forcar=False, tarefas=None):
+    """
+    Roda as tarefas vencidas (ou todas, com forcar=True) de cada carteira; 'tarefas' limita a
+    quais (ex: só ['cotacoes'] na subida do container).
+    Uma falha é registrada como execução também: a próxima tentativa fica para a marca seguinte.
+    Retorna {(carteira, tarefa): itens atualizados (None se falhou)}.
+    """
+    agora = agora or datetime.now(timezone.utc)
+    resultados = {}
+    for carteira in carteiras or listar_carteiras():
+        with usar_carteira(carteira):
+            migrar()
+            vencidas = list(TAREFAS_AGENDADAS) if forcar else pendentes(agora)
+            for tarefa in [t for t in vencidas if tarefas is None or t in tarefas]:
+                try:
+                    resultados[(carteira, tarefa)] = TAREFAS_AGENDADAS[tarefa][1]()
+                except Exception as e:
+                    print(f"❌ Agendador: erro em {tarefa} ({carteira}): {e}", file=sys.stderr)
+                    resultados[(carteira, tarefa)] = None
+                registrar_execucao_agendador(tarefa, agora.isoformat(timespec='seconds'))
+    return resultados
+
+def rodar(intervalo=INTERVALO_AGENDADOR_S, parar=None):
+    """Laço do agendador: confere as tarefas vencidas a cada 'intervalo' segundos até 'parar' ser marcado."""
+    parar = parar or _parar
+    while not parar.is_set():
+        try:
+            executar_pendentes()
+        except Exception as e:
+            # Banco travado, carteira apagada no meio...: tenta de novo na próxima volta
+            print(f"❌ Agendador: {e}", file=sys.stderr)
+        parar.wait(intervalo)
+
+def iniciar_em_segundo_plano():
+    """
+    Sobe o agendador numa thread do processo (uma só, mesmo com vários reruns/sessões).
+    Com AGENDADOR_SIDECAR=1 (docker-compose, serviço 'agendador') não faz nada.
+    Retorna True se a thread está rodando neste processo.
+    """
+    global _thread
+    if os.environ.get("AGENDADOR_SIDECAR") == "1":
+        return False
+    with _trava:
+        if _thread is None or not _thread.is_alive():
+            _parar.clear()
+            _thread = threading.Thread(target=rodar, name="agendador", daemon=True)
+            _thread.start()
+    return True
+
+def parar_agendador():
+    _parar.set()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Atualiza cotações, histórico de preços, SGS e notícias seguindo os pregões")
+    parser.add_argument("--uma-vez", action="store_true", help="Roda só as tarefas vencidas e sai (para o cron)")
+    parser.add_argument("--forcar", action="store_true", help="Roda todas as tarefas agora e sai")
+    parser.add_argument("--carteira", action="append", help="Carteira a atualizar (pode repetir; padrão: todas)")
+    parser.add_argument("--intervalo", type=int, default=INTERVALO_AGENDADOR_S, help="Segundos entre as verificações do laço")
+    args = parser.parse_args(argv)
+
+    if args.uma_vez or args.forcar:
+        resultados = executar_pendentes(args.carteira, forcar=args.forcar)
+        for (carteira, tarefa), itens in resultados.items():
+            print(f"{'✅' if itens is not None else '❌'} {carteira}: {tarefa} ({itens if itens is not None else 'falhou'})")
+        if not resultados:
+            print("✅ Nada vencido.")
+        return
+
+    print(f"✅ Agendador rodando (verificação a cada {args.intervalo}s). Ctrl+C para sair.", file=sys.stderr)
+    try:
+        rodar(args.intervalo)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
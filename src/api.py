@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response
+from starlette.routing import Route
+
+from constants import *
+from database import (buscar_transacoes, carteira_atual, consultar_extrato_paginado, listar_carteiras, listar_indexadores,
+                      listar_metas, obter_versoes, usar_carteira)
+from migracoes import migrar
+
+# API HTTP/JSON (somente leitura) sobre o núcleo de cálculos.
+# Cada resposta leva um ETag derivado das versões do banco (extrato, metas...): se nada mudou,
+# o cliente recebe 304 e nada é recalculado. Os cálculos rodam fora do event loop.
+# Todas as rotas aceitam ?carteira=<nome> (padrão: a carteira principal).
+# Não há autenticação: a API só pode ficar em 127.0.0.1 ou numa rede privada.
+#
+# Para subir: python src/api.py --porta 8502
+# Para testar: TestClient(criar_app()) do starlette.testclient
+
+_cache_respostas = OrderedDict()   # { (rota, parâmetros em ordem): (etag, corpo) }, LRU
+_cache_df = {}          # { carteira: (versao_transacoes, DataFrame) }
+_trava = threading.Lock()
+
+class ParametroInvalido(ValueError):
+    """Parâmetro da query fora do formato esperado (vira resposta 400)."""
+
+# Funções de apoio
+
+def _carregar_transacoes(versao):
+    """DataFrame do extrato da carteira ativa, recarregado apenas quando a versão muda."""
+    carteira = carteira_atual()
+    with _trava:
+        if _cache_df.get(carteira, (None,))[0] != versao:
+            from nucleo.dados import carregar_transacoes
+            _cache_df[carteira] = (versao, carregar_transacoes())
+        return _cache_df[carteira][1]
+
+def _na_carteira(carteira, funcao, *args):
+    """Roda a função (numa thread do pool) com a carteira da requisição ativa."""
+    with usar_carteira(carteira):
+        migrar()
+        return funcao(*args)
+
+def _carteira_da_requisicao(request):
+    """Nome da carteira pedida, ou None se ela não existir."""
+    carteira = request.query_params.get("carteira", CARTEIRA_PADRAO)
+    return carteira if carteira in listar_carteiras() else None
+
+def _erro(mensagem, status):
+    return Response(json.dumps({"erro": mensagem}, ensure_ascii=False), status_code=status, media_type="application/json")
+
+def _carteira_inexistente():
+    return _erro("carteira não encontrada", 404)
+
+def _inteiro(params, nome, padrao, minimo=1, maximo=None):
+    """Parâmetro inteiro da query, entre 'minimo' e 'maximo'; senão levanta ParametroInvalido."""
+    valor = params.get(nome)
+    if valor is None:
+        return padrao
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ParametroInvalido(f"'{nome}' deve ser um número inteiro") from None
+    if numero < minimo or (maximo is not None and numero > maximo):
+        faixa = f"estar entre {minimo} e {maximo}" if maximo is not None else f"ser no mínimo {minimo}"
+        raise ParametroInvalido(f"'{nome}' deve {faixa}")
+    return numero
+
+def _para_json(resultado):
+    """Serializa DataFrame/dict/lista para bytes JSON."""
+    import pandas as pd
+
+    if isinstance(resultado, pd.DataFrame):
+        return resultado.to_json(orient="records", date_format="iso", force_ascii=False).encode("utf-8")
+    return json.dumps(resultado, ensure_ascii=False, default=str).encode("utf-8")
+
+def _calcular_etag(rota, query, versoes, dia=None):
+    base = f"{rota}?{query}|{sorted(versoes.items())}|{dia or ''}"
+    return '"' + hashlib.sha1(base.encode("utf-8")).hexdigest()[:20] + '"'
+
+def endpoint(calculo, por_dia=False):
+    """
+    Transforma uma função de cálculo (versao, query_params) em handler async com ETag.
+    O resultado serializado fica em cache até a versão do banco mudar.
+    As cotações vêm do cache local, que tem versão própria ('cotacoes'): elas também entram no ETag.
+    Com por_dia=True (valores que mudam com a data, como a renda fixa na curva) o dia também entra no ETag.
+    """
+    async def handler(request):
+        carteira = _carteira_da_requisicao(request)
+        if carteira is None:
+            return _carteira_inexistente()
+        versoes = await run_in_threadpool(_na_carteira, carteira, obter_versoes)
+        # A carteira está na query, então também entra no ETag e na chave do cache
+        query = str(request.query_params)
+        etag = _calcular_etag(request.url.path, query, versoes, date.today() if por_dia else None)
+
+        cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=cabecalhos)
+
+        # Chave pelos parâmetros em ordem (?a=1&b=2 e ?b=2&a=1 são a mesma resposta)
+        chave = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        em_cache = _cache_respostas.get(chave)
+        if em_cache and em_cache[0] == etag:
+            _cache_respostas.move_to_end(chave)
+            corpo = em_cache[1]
+        else:
+            versao = versoes.get('transacoes', 0)
+            try:
+                resultado = await run_in_threadpool(_na_carteira, carteira, calculo, versao, request.query_params)
+            except ParametroInvalido as e:
+                return _erro(str(e), 400)
+            corpo = _para_json(resultado)
+            _cache_respostas[chave] = (etag, corpo)
+            _cache_respostas.move_to_end(chave)
+            while len(_cache_respostas) > MAX_RESPOSTAS_CACHE_API:
+                _cache_respostas.popitem(last=False)
+
+        return Response(corpo, media_type="application/json", headers=cabecalhos)
+    return handler
+
+# Cálculos expostos
+
+def _posicoes(versao, params):
+    from nucleo.posicoes import calcular_resumo_ativos
+    return calcular_resumo_ativos(_carregar_transacoes(versao))
+
+def _alocacao(versao, params):
+    from nucleo.posicoes import calcular_carteira_atual, gerar_tabela_alocacao
+
+    df = _carregar_transacoes(versao)
+    if df.empty:
+        return []
+    return gerar_tabela_alocacao(calcular_carteira_atual(df), df)
+
+def _extrato(versao, params):
+    pagina = _inteiro(params, "pagina", 1)
+    por_pagina = _inteiro(params, "por_pagina", 50, maximo=MAX_POR_PAGINA_API)
+    if params.get("busca"):
+        # Busca no índice FTS5 (prefixo e termos parecidos); ?tipo continua filtrando
+        tipos = [params["tipo"]] if params.get("tipo") else None
+        linhas, total, aproximados = buscar_transacoes(params["busca"], pagina, por_pagina, tipos=tipos)
+    else:
+        linhas, total = consultar_extrato_paginado(pagina, por_pagina, params.get("ativo"), params.get("tipo"))
+        aproximados = []
+    return {
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total": total,
+        "aproximados": aproximados,
+        "transacoes": [dict(zip(COLUNAS_DB, linha)) for linha in linhas]
+    }
+
+def _proventos(versao, params):
+    from nucleo.proventos import calcular_proventos_ano_atual, calcular_proventos_caixa, calcular_total_bonificacoes
+
+    df = _carregar_transacoes(versao)
+    mensal = []
+    if not df.empty:
+        df_prov = df[df['Tipo'].isin(['Dividendo', 'JCP'])]
+        por_mes = df_prov.groupby(df_prov['Data'].dt.strftime('%Y-%m'))['Total'].sum()
+        mensal = [{"mes": mes, "total": float(total)} for mes, total in por_mes.items()]
+    return {
+        "proventos_caixa": calcular_proventos_caixa(df),
+        "bonificacoes": calcular_total_bonificacoes(df),
+        "proventos_ano": calcular_proventos_ano_atual(df),
+        "mensal": mensal
+    }
+
+def _metas(versao, params):
+    from nucleo.metas import calcular_progresso_metas
+
+    df = _carregar_transacoes(versao)
+    if df.empty:
+        return []
+    return calcular_progresso_metas(df, listar_metas())
+
+def _rentabilidade(versao, params):
+    from nucleo.cotacoes import cotacoes_locais
+    from nucleo.posicoes import calcular_carteira_atual, gerar_painel_rentabilidade, selecionar_ativos_renda_variavel
+    from nucleo.renda_fixa import valorizar_renda_fixa
+
+    df = _carregar_transacoes(versao)
+    if df.empty:
+        return {"resumo": {}, "ativos": []}
+    carteira = calcular_carteira_atual(df)
+    # Somente leitura: sem cotação no cache local, o painel mostra o ativo como offline
+    cotacoes = cotacoes_locais(selecionar_ativos_renda_variavel(carteira, df), buscar_faltantes=False)
+    df_rf = valorizar_renda_fixa(df, listar_indexadores())
+    df_rent, resumo = gerar_painel_rentabilidade(carteira, df, cotacoes, dict(zip(df_rf['Ativo'], df_rf['Valor Atual'])))
+    return {"resumo": resumo, "ativos": json.loads(_para_json(df_rent))}
+
+async def _versao(request):
+    carteira = _carteira_da_requisicao(request)
+    if carteira is None:
+        return _carteira_inexistente()
+    versoes = await run_in_threadpool(_na_carteira, carteira, obter_versoes)
+    return Response(json.dumps(versoes), media_type="application/json")
+
+def criar_app():
+    """Monta a aplicação ASGI (usada pelo uvicorn e pelo TestClient)."""
+    migrar()
+    _cache_respostas.clear()
+    _cache_df.clear()
+    rotas = [
+        Route("/versao", _versao),
+        Route("/posicoes", endpoint(_posicoes)),
+        Route("/alocacao", endpoint(_alocacao)),
+        Route("/extrato", endpoint(_extrato)),
+        Route("/proventos", endpoint(_proventos)),
+        Route("/metas", endpoint(_metas)),
+        Route("/rentabilidade", endpoint(_rentabilidade, por_dia=True)),
+    ]
+    return Starlette(routes=rotas, middleware=[Middleware(GZipMiddleware, minimum_size=500)])
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="API JSON (somente leitura) da carteira.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8502)
+    args = parser.parse_args()
+    uvicorn.run(criar_app(), host=args.host, port=args.porta)
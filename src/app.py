@@ -1,39 +1,159 @@
 import time
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
-import yfinance as yf
 from datetime import date
+from plotly.colors import sequential as escalas
 from constants import *
 from database import *
 from utils import *
-# Cria os bancos de dados no maindata.db e consultando os dados
-inicializar_tabela_transacoes()
-inicializar_tabela_config()
-inicializar_tabela_metas()
-dados = consultar_extrato()
+from agendador import iniciar_em_segundo_plano
+from migracoes import migrar
+from tarefas import cancelar_tarefa, descrever_tarefa, enviar_em_lote, enviar_tarefa, tarefas_ativas
 
 # Inicio do streamlit
 st.set_page_config(page_title="Meus Investimentos", layout="wide")
+
+# Carteira da sessão: cada carteira é um .db próprio (db/maindata.db é a padrão)
+with st.sidebar:
+    st.subheader("👛 Carteira")
+    carteiras = listar_carteiras()
+    carteira_sel = st.selectbox("Carteira ativa", carteiras, key="carteira")
+    with st.expander("➕ Nova carteira"):
+        with st.form("form_carteira", clear_on_submit=True):
+            nome_carteira = st.text_input("Nome", help="Letras, números, espaço, - e _")
+            if st.form_submit_button("Criar"):
+                if criar_carteira(nome_carteira):
+                    st.success(f"Carteira {nome_carteira.strip()} criada.")
+                    time.sleep(1)
+                    st.rerun()
+                else:
+                    st.error("Nome inválido ou já usado.")
+selecionar_carteira(carteira_sel)
+
+# Cria/atualiza o esquema do banco da carteira (só na primeira vez no processo) e consulta os dados
+migrar()
+# Cotações, histórico, SGS e notícias são buscados fora da página (uma thread por processo, ou o serviço do docker-compose)
+iniciar_em_segundo_plano()
+dados = consultar_extrato()
+
+# Tarefas pesadas rodam em outros processos (tarefas.py): aqui só se dispara e acompanha o progresso.
+# O painel é um fragmento que se atualiza sozinho enquanto houver tarefa ativa, sem rerodar a página.
+tarefas_rodando = any(tarefas_ativas(nome) for nome in carteiras)
+
+def painel_tarefas():
+    selecionar_carteira(st.session_state["carteira"])
+    recentes = []
+    for nome in carteiras:
+        with usar_carteira(nome):
+            recentes += [(nome, *tarefa) for tarefa in listar_tarefas(limite=5)]
+    recentes.sort(key=lambda tarefa: tarefa[7], reverse=True)   # criada_em
+
+    ativas = 0
+    for carteira, id_tarefa, tipo, parametros, estado, progresso, mensagem, criada_em, *_ in recentes[:8]:
+        rotulo = descrever_tarefa(tipo, parametros) + (f" · {carteira}" if len(carteiras) > 1 else "")
+        if estado in ESTADOS_TAREFA_ATIVOS:
+            ativas += 1
+            st.progress(progresso, text=f"{rotulo}: {mensagem or estado}")
+            if estado != "cancelando" and st.button("✖️ Cancelar", key=f"cancelar_{carteira}_{id_tarefa}"):
+                cancelar_tarefa(id_tarefa, carteira)
+                st.rerun(scope="fragment")
+        else:
+            icone = {"concluida": "✅", "cancelada": "⛔", "erro": "❌"}.get(estado, "•")
+            st.caption(f"{icone} {rotulo} ({criada_em[11:16]}): {mensagem or estado}")
+    if not recentes:
+        st.caption("Nenhuma tarefa ainda.")
+    if tarefas_rodando and not ativas:
+        # Acabou tudo: rerun completo para a página ler os resultados novos
+        st.rerun()
+
+# Simulador de vendas (aba Impostos): fragmento, então mexer nos controles refaz só a grade
+# (um array NumPy ativo x fração x choque) e o mapa de calor, sem rerodar a página
+def painel_simulador_vendas(posicoes_venda, situacao_ir):
+    passo = PASSO_SIMULACAO_VENDAS
+    c1, c2 = st.columns(2)
+    faixa_fracao = c1.slider("Fração vendida (%)", passo, 100, (passo, 100), step=passo)
+    faixa_choque = c2.slider("Choque no preço (%)", -50, 50, (-30, 30), step=passo)
+    c3, c4 = st.columns([2, 1])
+    ativos_sim = c3.multiselect("Ativos vendidos", posicoes_venda['Ativo'].tolist(), placeholder="Todos")
+    metrica = c4.radio("Mostrar", ["Imposto", "Lucro após IR", "Receita líquida"], horizontal=True)
+
+    selecao = posicoes_venda[posicoes_venda['Ativo'].isin(ativos_sim)] if ativos_sim else posicoes_venda
+    fracoes = np.arange(faixa_fracao[0], faixa_fracao[1] + passo / 2, passo) / 100
+    choques = np.arange(faixa_choque[0], faixa_choque[1] + passo / 2, passo) / 100
+    simulacao = simular_vendas(selecao, fracoes, choques, situacao_ir)
+    chave = {"Imposto": 'imposto_total', "Lucro após IR": 'lucro_liquido_total', "Receita líquida": 'liquido_total'}[metrica]
+    st.plotly_chart(figura_simulacao_vendas(simulacao[chave], fracoes, choques, metrica), use_container_width=True)
+
+    # Detalhe de um ponto da grade, ativo por ativo
+    c5, c6 = st.columns(2)
+    fracao = c5.select_slider("Fração", fracoes.tolist(), value=fracoes[-1], format_func=lambda f: f"{f * 100:.0f}%")
+    choque = c6.select_slider("Choque", choques.tolist(), value=choques[np.abs(choques).argmin()],
+                              format_func=lambda c: f"{c * 100:+.0f}%")
+    i, j = int(np.abs(fracoes - fracao).argmin()), int(np.abs(choques - choque).argmin())
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Receita", f"R$ {simulacao['receita_total'][i, j]:,.2f}")
+    k2.metric("Lucro Realizado", f"R$ {simulacao['resultado_total'][i, j]:,.2f}")
+    k3.metric("Imposto do Mês", f"R$ {simulacao['imposto_total'][i, j]:,.2f}",
+              help="Quanto o DARF do mês aumenta com todas as vendas juntas (isenções e prejuízos a compensar já considerados)")
+    detalhe = pd.DataFrame({
+        "Ativo": simulacao['ativos'],
+        "Categoria": selecao['Categoria'].to_numpy(),
+        "Receita (R$)": simulacao['receita'][:, i, j],
+        "Lucro (R$)": simulacao['resultado'][:, i, j],
+        "Imposto se vendido sozinho (R$)": simulacao['imposto'][:, i, j],
+    })
+    st.dataframe(detalhe, hide_index=True, use_container_width=True,
+                 column_config={c: st.column_config.NumberColumn(format="R$ %.2f") for c in detalhe.columns if "(R$)" in c})
+    st.caption("Imposto sobre a venda feita no mês corrente, somada às vendas que já aconteceram nele. "
+               "Stocks/REITs e Renda Fixa aparecem com imposto zero (fora do DARF mensal).")
+
+with st.sidebar:
+    with st.expander("⏳ Tarefas em segundo plano", expanded=tarefas_rodando):
+        t1, t2 = st.columns(2)
+        if t1.button("📈 Valor diário", help="Reconstrói o valor diário de todas as carteiras, em paralelo"):
+            enviar_em_lote("valor_diario")
+            st.rerun()
+        if t2.button("🧾 IR (todos os anos)", help="Apura o IR de cada ano desta carteira, em paralelo", disabled=not dados):
+            enviar_em_lote("impostos", [carteira_sel], anos=sorted({linha[1][:4] for linha in dados}))
+            st.rerun()
+        st.fragment(run_every=INTERVALO_PROGRESSO if tarefas_rodando else None)(painel_tarefas)()
+
 st.title("💰 Gerenciador de Investimentos")
+if carteira_sel != CARTEIRA_PADRAO:
+    st.caption(f"Carteira: **{carteira_sel}**")
 
-tab_dash, tab_extrato, tab_registrar, tab_atual, tab_rebal, tab_metas = st.tabs([
-    "📊 Dashboard", "📑 Extrato", "⚙️ Registrador", "📈 Atualidades", "⚖️ Rebalanceador", "🎯 Metas"
+tab_dash, tab_extrato, tab_registrar, tab_atual, tab_rebal, tab_metas, tab_impostos = st.tabs([
+    "📊 Dashboard", "📑 Extrato", "⚙️ Registrador", "📈 Atualidades", "⚖️ Rebalanceador", "🎯 Metas", "🧾 Impostos"
     ])
 
 with tab_dash:
     st.header("Visão Geral & Performance")    
+    if len(carteiras) > 1:
+        with st.expander("👨‍👩‍👧 Visão Consolidada (todas as carteiras)", expanded=False):
+            consolidado = obter_consolidado()
+            formato_moeda = {
+                "Total Investido": st.column_config.NumberColumn(format="R$ %.2f"),
+                "Valor de Mercado": st.column_config.NumberColumn(format="R$ %.2f")
+            }
+            st.dataframe(
+                consolidado["resumo"], hide_index=True, use_container_width=True,
+                column_config={**formato_moeda, "% do Total": st.column_config.NumberColumn(format="%.1f%%")}
+            )
+            st.dataframe(
+                consolidado["posicoes"], hide_index=True, use_container_width=True,
+                column_config={**formato_moeda, "Quantidade": st.column_config.NumberColumn(format="%.4f")}
+            )
     if not dados:
         st.info("Cadastre operações na aba 'Registrador' para ver os indicadores.")
     else:
-        df = pd.DataFrame(dados, columns=COLUNAS_DB)
+        df = montar_extrato_ajustado(dados)
         df['Data'] = pd.to_datetime(df['Data'])
         carteira = calcular_carteira_atual(df)
         lucro_realizado = calcular_lucro_realizado(df)
         total_bonificacoes = calcular_total_bonificacoes(df)
-        patrimonio_investido = sum(item['custo_total'] for item in carteira.values())
-        proventos_caixa = df[df['Tipo'].isin(['Dividendo', 'JCP'])]['Total'].sum()
+        patrimonio_investido = carteira.custo_total()
+        proventos_caixa = calcular_proventos_caixa(df)
         renda_passiva_total = proventos_caixa + total_bonificacoes
         proventos_ano = calcular_proventos_ano_atual(df)
         dy_anual = (proventos_ano / patrimonio_investido * 100) if patrimonio_investido > 0 else 0.0
@@ -60,14 +180,7 @@ with tab_dash:
         df_pizza = calcular_alocacao_por_classe(df)
         
         if not df_pizza.empty:
-            fig_pizza = px.pie(
-                df_pizza, 
-                values='Total', 
-                names='Classe_Ativo', 
-                hole=0.5,
-                color_discrete_sequence=['#4222d7', '#f1ab4e']
-            )
-            fig_pizza.update_layout(margin=dict(t=20, b=20, l=20, r=20))
+            fig_pizza = obter_figura_pizza(df_pizza, 'Total', 'Classe_Ativo', ['#4222d7', '#f1ab4e'])
             st.plotly_chart(fig_pizza, use_container_width=True)
         else:
             st.info("Sem dados de compra.")
@@ -76,43 +189,17 @@ with tab_dash:
             st.subheader("Evolução Patrimonial")
             
             if not df.empty:
-                df['Data'] = pd.to_datetime(df['Data'])
-                df_sorted = df.sort_values('Data')
-                
-                data_inicio = df_sorted['Data'].min().replace(day=1)
-                data_hoje = pd.Timestamp.now().replace(day=1)                
-                data_futura_minima = data_inicio + pd.DateOffset(months=12) # Garante pelo menos 12 meses de visão
-                data_fim = max(data_hoje, data_futura_minima)
-                
-                date_range = pd.date_range(start=data_inicio, end=data_fim, freq='MS')
-                
-                # Listas para o gráfico
-                eixo_datas, eixo_aportes, eixo_acumulado = calcular_evolucao_patrimonial(df_sorted, date_range)
+                # Valor de mercado dia a dia, direto da tabela valor_diario
+                df_diario = obter_patrimonio_diario(df)
+                col_periodo, col_bench = st.columns([1, 2])
+                periodo = col_periodo.radio("Período", list(PERIODOS_GRAFICO), index=len(PERIODOS_GRAFICO) - 1, horizontal=True)
+                benchmarks = []
+                if not df_diario.empty:
+                    # Mesmos aportes, nas mesmas datas, aplicados em cada benchmark
+                    benchmarks = col_bench.multiselect("Comparar com:", list(BENCHMARKS), placeholder="Benchmarks")
 
-                fig_evolucao = go.Figure()
-                
-                fig_evolucao.add_trace(go.Bar(
-                    x=eixo_datas, 
-                    y=eixo_aportes, 
-                    name='Aporte Mensal',
-                    marker_color='#114c0e'
-                ))
-                
-                fig_evolucao.add_trace(go.Scatter(
-                    x=eixo_datas, 
-                    y=eixo_acumulado, 
-                    name='Total Investido (Custo)',
-                    mode='lines+markers',
-                    line=dict(color='#447a37', width=3)
-                ))
-                
-                fig_evolucao.update_layout(
-                    hovermode="x unified",
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                    margin=dict(t=20, b=20, l=20, r=20),
-                    xaxis=dict(tickformat="%b/%Y", dtick="M1")
-                )
-                
+                # Figura pronta do cache: séries diárias reduzidas (LTTB/semana/mês) conforme o período
+                fig_evolucao = obter_figura_evolucao(df, df_diario, benchmarks, periodo)
                 st.plotly_chart(fig_evolucao, use_container_width=True)
             else:
                 st.info("Sem dados para gerar gráfico de evolução.")
@@ -131,25 +218,8 @@ with tab_dash:
             )
             df_pizza = df_posicao[df_posicao['Classe'] == tipo_visualizacao]
             if not df_pizza.empty:
-                paleta = px.colors.sequential.RdBu if tipo_visualizacao == 'Renda Fixa' else px.colors.sequential.Oranges
-                fig = px.pie(
-                    df_pizza, 
-                    values='Total Investido', 
-                    names='Categoria', 
-                    hole=0.5,
-                    color_discrete_sequence=paleta
-                )
-                fig.update_layout(
-                    showlegend=True,
-                    margin=dict(t=20, b=20, l=0, r=0),
-                    legend=dict(
-                        orientation="v",    
-                        yanchor="top",
-                        y=1,                
-                        xanchor="left",
-                        x=1.05              
-                    )
-                )
+                paleta = escalas.RdBu if tipo_visualizacao == 'Renda Fixa' else escalas.Oranges
+                fig = obter_figura_pizza(df_pizza, 'Total Investido', 'Categoria', paleta, legenda_lateral=True)
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info(f"Você não possui ativos de {tipo_visualizacao}.")
@@ -176,12 +246,79 @@ with tab_dash:
                 }
             )
 
+    st.divider()
+    st.subheader("📅 Calendário de Proventos (próximos 12 meses)")
+    # Cadência de cada ativo (mensal, trimestral...) inferida dos pagamentos dos últimos 2 anos
+    projecao_proventos, fig_calendario = obter_projecao_proventos(df)
+    if fig_calendario:
+        df_projecao = projecao_proventos['projecao']
+        col_total, col_media = st.columns(2)
+        col_total.metric("Renda Projetada (12M)", f"R$ {df_projecao['Valor'].sum():,.2f}")
+        col_media.metric("Média Mensal", f"R$ {df_projecao['Valor'].sum() / 12:,.2f}")
+        st.plotly_chart(fig_calendario, use_container_width=True)
+        with st.expander("Cadência por ativo"):
+            st.dataframe(
+                projecao_proventos['cadencia'], hide_index=True, use_container_width=True,
+                column_config={
+                    "Projeção 12M": st.column_config.NumberColumn(format="R$ %.2f"),
+                }
+            )
+        st.caption("Projeção pela posição atual: média do mesmo mês nos anos anteriores (pagadores mensais: mediana dos últimos 12 meses).")
+    else:
+        st.info("Sem proventos recentes para projetar.")
+
+    st.divider()
+    st.subheader("🛡️ Risco")
+    # Tudo vem de valor_diario + histórico de preços (cache pelas versões do banco)
+    col_janela, col_conf = st.columns(2)
+    with col_janela:
+        janela_risco = st.select_slider(
+            "Janela (dias úteis)", options=[21, 63, 126, 252], value=63,
+            help="Usada na volatilidade móvel e no VaR"
+        )
+    with col_conf:
+        confianca_risco = st.radio("Confiança do VaR", [0.95, 0.99], horizontal=True, format_func=lambda c: f"{c:.0%}")
+
+    risco = obter_analise_risco(df, janela_risco, confianca_risco)
+    if risco['resumo'].empty:
+        st.info("Sem histórico diário suficiente para calcular o risco.")
+    else:
+        st.dataframe(
+            risco['resumo'],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Valor Atual": st.column_config.NumberColumn(format="R$ %.2f"),
+                "Volatilidade (%)": st.column_config.NumberColumn(format="%.2f%%"),
+                "Máx. Drawdown (%)": st.column_config.NumberColumn(format="%.2f%%"),
+                "VaR Histórico (%)": st.column_config.NumberColumn(format="%.2f%%"),
+                "VaR Paramétrico (%)": st.column_config.NumberColumn(format="%.2f%%"),
+                "VaR Histórico (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+                "VaR Paramétrico (R$)": st.column_config.NumberColumn(format="R$ %.2f")
+            }
+        )
+
+        fig_vol, fig_dd, fig_corr = obter_figuras_risco(df, janela_risco, confianca_risco)
+        col_vol, col_dd = st.columns(2)
+        with col_vol:
+            st.markdown("##### Volatilidade Anualizada (Móvel)")
+            st.plotly_chart(fig_vol, use_container_width=True)
+        with col_dd:
+            st.markdown("##### Drawdown")
+            st.plotly_chart(fig_dd, use_container_width=True)
+
+        if fig_corr:
+            st.markdown("##### Correlação entre os Ativos (último ano)")
+            st.plotly_chart(fig_corr, use_container_width=True)
+
 with tab_extrato:
     st.subheader("🧾 Mini Extrato - Posição Atual")
     if dados:
         if len(dados[0]) == len(COLUNAS_DB):
-            df_transacoes = pd.DataFrame(dados, columns=COLUNAS_DB)
-            df_mini_extrato = calcular_resumo_ativos(df_transacoes)
+            df_transacoes = montar_extrato_ajustado(dados)
+            posicoes_agrupadas = obter_posicoes_agrupadas(df_transacoes)
+            agrupamento = st.radio("Agrupar por:", list(AGRUPAMENTOS_POSICAO), horizontal=True)
+            df_mini_extrato = posicoes_agrupadas[agrupamento]
             
             if not df_mini_extrato.empty:
                 st.dataframe(
@@ -206,16 +343,60 @@ with tab_extrato:
                 )
                 total_geral = df_mini_extrato["Total Investido"].sum()
                 st.caption(f"**Patrimônio Total (Custo):** R$ {total_geral:,.2f}")
+
+                with st.expander("🏦 Conciliação de Custódia por Corretora"):
+                    df_conciliacao = posicoes_agrupadas["Conciliação"]
+                    corretoras = sorted(df_conciliacao['Corretora'].unique().tolist())
+                    corretora_sel = st.selectbox("Corretora", ["Todas"] + corretoras)
+                    if corretora_sel != "Todas":
+                        df_conciliacao = df_conciliacao[df_conciliacao['Corretora'] == corretora_sel]
+                    divergentes = int((df_conciliacao['Status'] != "✅ OK").sum())
+                    if divergentes:
+                        st.warning(f"{divergentes} posição(ões) não batem com o extrato. Confira transferências entre corretoras.")
+                    st.dataframe(
+                        df_conciliacao,
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={"% do Ativo": st.column_config.NumberColumn(format="%.1f%%")}
+                    )
             else:
                 st.info("Você não possui ativos em carteira no momento.")
         else:
             st.error("Erro na estrutura do banco de dados.")
     else:
         st.warning("Nenhuma transação registrada.")
+
+    # Validação do extrato: só os ativos alterados desde a última passada são verificados de novo
+    problemas = obter_validacao()
+    por_gravidade, por_regra = resumo_validacao(problemas)
+    if por_gravidade['erro']:
+        st.error(f"🩺 {por_gravidade['erro']} erro(s) no extrato afetam o preço médio. Veja 'Qualidade dos Dados'.")
+    with st.expander(f"🩺 Qualidade dos Dados ({por_gravidade['erro']} erro(s), {por_gravidade['aviso']} aviso(s))"):
+        if problemas.empty:
+            st.success("Nenhum problema encontrado no extrato.")
+        else:
+            col_regras, col_lista = st.columns([1, 2.5])
+            col_regras.dataframe(por_regra, hide_index=True, use_container_width=True)
+            regras = col_lista.multiselect("Regras", por_regra['Regra'].tolist(), placeholder="Todas")
+            col_lista.dataframe(
+                problemas[problemas['Regra'].isin(regras)] if regras else problemas,
+                hide_index=True, use_container_width=True, height=300,
+                column_config={"Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY")}
+            )
+            st.caption("Use o ID na aba ⚙️ Registrador para editar ou excluir a transação.")
+        if st.button("🔄 Revalidar tudo", help="Refaz a validação do extrato inteiro"):
+            validar_extrato(completa=True)
+            limpar_cache()
+            st.rerun()
+
     st.divider()
     st.header("Histórico de Transações")
     
     with st.expander("Filtros", expanded=True):
+        texto_busca = st.text_input(
+            "🔎 Buscar", placeholder="Ativo, observação, corretora ou categoria (ex: petr xp)",
+            help="Cada palavra vale como início de termo; se nada for encontrado, busca termos parecidos"
+        )
         col_f1, col_f2 = st.columns(2)
         with col_f1:
             data_inicial = st.date_input("Data Inicial", date(2023, 1, 1))
@@ -223,16 +404,23 @@ with tab_extrato:
         with col_f2:
             tipos_opcoes = TIPOS_OPCOES
             tipos_selecionados = st.multiselect("Filtrar Tipo", tipos_opcoes, default=tipos_opcoes)
+            por_pagina = st.selectbox("Linhas por página", [50, 100, 250, 500], index=1)
 
-    dados = consultar_extrato()
-    
-    if dados:
-        df = pd.DataFrame(dados, columns=COLUNAS_DB)
-        df['Data'] = pd.to_datetime(df['Data']).dt.date
-        mask_data = (df['Data'] >= data_inicial) & (df['Data'] <= data_final)
-        mask_tipo = df['Tipo'].isin(tipos_selecionados)
-        df_filtrado = df.loc[mask_data & mask_tipo]
-        df_filtrado = df_filtrado.sort_values(by="Data", ascending=False)
+    # Busca, filtros e paginação rodam no SQLite (índice FTS5): só a página pedida chega aqui
+    chave_busca = (texto_busca, data_inicial, data_final, tuple(tipos_selecionados), por_pagina)
+    if st.session_state.get('extrato_busca') != chave_busca:
+        st.session_state['extrato_busca'] = chave_busca
+        st.session_state['extrato_pagina'] = 1
+    linhas, total, aproximados = buscar_transacoes(
+        texto_busca, st.session_state.get('extrato_pagina', 1), por_pagina, data_inicial, data_final, tipos_selecionados
+    )
+
+    if total:
+        total_paginas = -(-total // por_pagina)
+        if aproximados:
+            st.caption(f"Nada encontrado para \"{texto_busca}\". Mostrando resultados para: {', '.join(aproximados)}")
+        df_filtrado = pd.DataFrame(linhas, columns=COLUNAS_DB)
+        df_filtrado['Data'] = pd.to_datetime(df_filtrado['Data']).dt.date
         cols_visuais = COLS_VISUAIS
         st.dataframe(
             df_filtrado[cols_visuais], 
@@ -250,6 +438,12 @@ with tab_extrato:
                 ),
             }
         )
+        col_pag, col_info = st.columns([1, 3])
+        with col_pag:
+            st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key='extrato_pagina')
+        col_info.caption(f"{total} transação(ões) · página {st.session_state.get('extrato_pagina', 1)} de {total_paginas}")
+    elif texto_busca:
+        st.info(f"Nenhuma transação encontrada para \"{texto_busca}\".")
     else:
         st.info("Nenhuma transação encontrada.")
 
@@ -299,32 +493,141 @@ with tab_registrar:
                     st.success("Registro salvo com sucesso!")
 
     with col_rm:
-        st.subheader("Remover Item")
-        id_del = st.number_input("ID da Transação", min_value=0, step=1)
-        if st.button("Apagar Registro"):
-            del_transacao(id_del)
-            st.success(f"Registro ID {id_del} removido.")
+        st.subheader("Editar ou Remover Item")
+        if dados:
+            # Escolhe a transação pelo conteúdo (não por um ID digitado às cegas)
+            linhas_por_id = {linha[0]: linha for linha in dados}
+            id_sel = st.selectbox(
+                "Transação", list(linhas_por_id),
+                format_func=lambda i: f"#{i} {str(linhas_por_id[i][1])[:10]} {linhas_por_id[i][3]} {linhas_por_id[i][2]} ({linhas_por_id[i][4] or 0:g})"
+            )
+            _, data_ed, ativo_ed, tipo_ed, qtd_ed, preco_ed, _, corretora_ed, categoria_ed, moeda_ed, cambio_ed, obs_ed, _ = linhas_por_id[id_sel]
+            with st.form(f"editar_{id_sel}"):
+                data_nova = st.date_input("Data", pd.to_datetime(data_ed).date())
+                ativo_novo = st.text_input("Ativo", ativo_ed).upper()
+                tipo_novo = st.selectbox("Tipo", TIPOS_OPCOES, index=TIPOS_OPCOES.index(tipo_ed) if tipo_ed in TIPOS_OPCOES else 0)
+                corretora_nova = st.selectbox("Corretora", CORRETORAS, index=CORRETORAS.index(corretora_ed) if corretora_ed in CORRETORAS else 0)
+                categoria_nova = st.selectbox("Categoria", LISTA_CATEGORIAS, index=LISTA_CATEGORIAS.index(categoria_ed) if categoria_ed in LISTA_CATEGORIAS else 0)
+                moeda_nova = st.radio("Moeda", ["BRL", "USD"], index=1 if moeda_ed == "USD" else 0, horizontal=True)
+                cambio_novo = st.number_input("Câmbio", value=float(cambio_ed or 1.0), min_value=0.01, step=0.01)
+                qtd_nova = st.number_input("Quantidade", value=float(qtd_ed or 0.0), min_value=0.0, step=0.00000001, format="%.8f")
+                preco_novo = st.number_input("Preço Unitário", value=float(preco_ed or 0.0), min_value=0.0, step=0.01, format="%.2f")
+                obs_nova = st.text_area("Observação", obs_ed or "")
+                c_salvar, c_excluir = st.columns(2)
+                if c_salvar.form_submit_button("💾 Salvar Alterações"):
+                    editar_transacao(
+                        id_sel, data_nova, ativo_novo, tipo_novo, qtd_nova, preco_novo, corretora_nova,
+                        categoria_nova, identificar_classe(categoria_nova), moeda_nova, cambio_novo, obs_nova
+                    )
+                    st.success(f"Registro ID {id_sel} atualizado.")
+                    time.sleep(1)
+                    st.rerun()
+                if c_excluir.form_submit_button("🗑️ Excluir"):
+                    del_transacao(id_sel)
+                    st.success(f"Registro ID {id_sel} removido (dá para desfazer).")
+                    time.sleep(1)
+                    st.rerun()
+        else:
+            st.caption("Nenhuma transação registrada.")
+
+        qtd_desfazer, qtd_refazer = resumo_pilha()
+        c_desfazer, c_refazer = st.columns(2)
+        if c_desfazer.button("↩️ Desfazer", disabled=not qtd_desfazer, use_container_width=True):
+            desfeito = desfazer_ultima_acao()
+            if desfeito:
+                st.toast(f"Desfeito: {desfeito[1]} da transação #{desfeito[0]}")
+            st.rerun()
+        if c_refazer.button("↪️ Refazer", disabled=not qtd_refazer, use_container_width=True):
+            refeito = refazer_acao()
+            if refeito:
+                st.toast(f"Refeito: {refeito[1]} da transação #{refeito[0]}")
+            st.rerun()
+
+        with st.expander("📜 Histórico de Alterações", expanded=False):
+            log = listar_log(50)
+            if log:
+                df_log = pd.DataFrame(log, columns=["ID", "Momento", "Transação", "Operação", "Antes", "Depois", "Origem", "Estado"])
+                st.dataframe(df_log.drop(columns=["ID"]), hide_index=True, use_container_width=True)
+            else:
+                st.caption("Nenhuma alteração registrada ainda.")
+        st.divider()
+
+        st.subheader("📈 Indexadores de Renda Fixa")
+        with st.expander("Marcar títulos na curva (CDI, SELIC, IPCA, PRE)", expanded=False):
+            ativos_rf = sorted({linha[2] for linha in dados if linha[8] in MAPA_CLASSES["Renda Fixa"]}) if dados else []
+            if ativos_rf:
+                with st.form("form_indexador"):
+                    ativo_rf = st.selectbox("Título", ativos_rf)
+                    indexador = st.selectbox("Indexador", INDEXADORES_RF)
+                    percentual = st.number_input("% do Indexador (Ex: 110 para 110% do CDI)", min_value=0.0, value=100.0, step=1.0)
+                    taxa = st.number_input("Taxa Fixa (% a.a.)", min_value=0.0, value=0.0, step=0.1, help="Ex: 6 para IPCA + 6%, ou a taxa do prefixado")
+                    if st.form_submit_button("Salvar Indexador"):
+                        salvar_indexador(ativo_rf, indexador, percentual, taxa)
+                        st.success(f"{ativo_rf} agora é marcado por {descrever_indexador(indexador, percentual, taxa)}.")
+                indexadores = listar_indexadores()
+                for ativo_idx, (ind, pct, tx) in indexadores.items():
+                    st.caption(f"**{ativo_idx}:** {descrever_indexador(ind, pct, tx)}")
+            else:
+                st.caption("Nenhum título de Renda Fixa cadastrado.")
+        st.divider()
+
+        st.subheader("🔀 Eventos Corporativos")
+        with st.expander("Desdobramentos, grupamentos e mudanças de ticker", expanded=False):
+            st.caption("O extrato não é alterado: os eventos ajustam quantidade e ticker na hora do cálculo.")
+            with st.form("form_evento"):
+                ativo_evento = st.text_input("Ativo (ticker na data do evento)").upper()
+                tipo_evento = st.selectbox("Tipo", ["Desdobramento", "Grupamento", "Mudança de Ticker"])
+                data_evento = st.date_input("Data Ex", help="Transações antes desta data são ajustadas")
+                c_de, c_para = st.columns(2)
+                proporcao_de = c_de.number_input("Proporção: de", min_value=1, value=1, step=1)
+                proporcao_para = c_para.number_input("para", min_value=1, value=2, step=1, help="Ex: desdobramento 1 para 2, grupamento 10 para 1")
+                novo_ticker = st.text_input("Novo ticker (só para mudança de ticker)").upper()
+                if st.form_submit_button("Registrar Evento"):
+                    if not ativo_evento:
+                        st.error("Informe o ativo.")
+                    elif tipo_evento == "Mudança de Ticker" and not novo_ticker:
+                        st.error("Informe o novo ticker.")
+                    else:
+                        fator = 1.0 if tipo_evento == "Mudança de Ticker" else proporcao_para / proporcao_de
+                        add_evento(data_evento, ativo_evento, tipo_evento, fator, novo_ticker or None)
+                        st.success(f"Evento de {ativo_evento} registrado.")
+                        time.sleep(1)
+                        st.rerun()
+
+            for id_evento, data_ev, ativo_ev, tipo_ev, fator_ev, novo_ev in listar_eventos():
+                c_ev, c_del = st.columns([5, 1])
+                detalhe = f"→ {novo_ev}" if tipo_ev == "Mudança de Ticker" else f"x{fator_ev:g} na quantidade"
+                c_ev.caption(f"**{ativo_ev}** ({data_ev}) {tipo_ev} {detalhe}")
+                if c_del.button("🗑️", key=f"del_evento_{id_evento}", help="Excluir evento"):
+                    excluir_evento(id_evento)
+                    st.rerun()
         st.divider()
 
         st.subheader("💾 Backup e Segurança")
-        arquivo_bytes = obter_arquivo_banco()
-        
         ultimo_backup = ler_config("ultimo_backup")
         if ultimo_backup:
             st.caption(f"📅 Último backup: **{ultimo_backup}**")
 
-        if arquivo_bytes:
-            st.download_button(
-                label="📥 Baixar Backup (.db)",
-                data=arquivo_bytes,
-                file_name="maindata_backup.db",
-                mime="application/x-sqlite3",
-                on_click=registrar_data_backup,
-                help="Salva uma cópia do banco de dados na pasta Downloads."
-            )
-            st.caption("O arquivo será salvo na sua pasta de Downloads padrão.")
-        else:
-            st.error("Erro: Arquivo 'maindata.db' não encontrado.")
+        # O snapshot só é gerado quando o usuário pede (nada é lido do disco a cada rerun)
+        if st.button("🗄️ Gerar Backup", help="Cria uma cópia consistente e comprimida em db/backups."):
+            st.session_state[f"backup_gerado_{carteira_sel}"] = criar_backup()
+
+        caminho_backup = st.session_state.get(f"backup_gerado_{carteira_sel}")
+        if caminho_backup:
+            arquivo_bytes = obter_arquivo_banco(caminho_backup)
+            if arquivo_bytes:
+                st.download_button(
+                    label="📥 Baixar Backup (.db.gz)",
+                    data=arquivo_bytes,
+                    file_name=os.path.basename(caminho_backup),
+                    mime="application/gzip",
+                    # Callbacks rodam antes do topo do script: reativa a carteira da sessão
+                    on_click=lambda: (selecionar_carteira(st.session_state["carteira"]), registrar_data_backup()),
+                    help="Salva uma cópia do banco de dados na pasta Downloads."
+                )
+                st.caption("O arquivo será salvo na sua pasta de Downloads padrão.")
+            else:
+                st.error("Erro: Snapshot do backup não encontrado.")
 
 with tab_atual:
     col_header, col_btn = st.columns([4, 1])
@@ -339,10 +642,10 @@ with tab_atual:
     if not dados:
         st.warning("Sem dados cadastrados. Adicione transações para ver as novidades.")
     else:
-        df = pd.DataFrame(dados, columns=COLUNAS_DB)
+        df = montar_extrato_ajustado(dados)
         carteira_atual = calcular_carteira_atual(df)
 
-        if not carteira_atual:
+        if not len(carteira_atual):
             st.info("Sua carteira está zerada no momento.")
         else:
             with st.spinner("Sintonizando frequências do mercado..."):
@@ -351,7 +654,8 @@ with tab_atual:
 
                 # Big Metrics
                 kpi1, kpi2, kpi3 = st.columns(3)
-                kpi1.metric("Patrimônio Estimado", f"R$ {resumo['valor_atual']:,.2f}")
+                kpi1.metric("Patrimônio Estimado", f"R$ {resumo['valor_atual']:,.2f}",
+                            help=f"Inclui R$ {resumo['valor_renda_fixa']:,.2f} de Renda Fixa (na curva ou pelo custo)")
                 
                 delta_val = resumo['lucro_total_rs']
                 delta_color = "normal" if delta_val >= 0 else "inverse"
@@ -365,6 +669,7 @@ with tab_atual:
                 
                 # Vamos iterar pelos ativos Renda Variável para mostrar info rica
                 # Filtra apenas o que tem no df_rentabilidade (que já filtra RV)
+                df_rentabilidade = df_rentabilidade[df_rentabilidade['Classe'] == 'Renda Variável']
                 if not df_rentabilidade.empty:
                     ativos_exibir = df_rentabilidade['Ativo'].tolist()
                     
@@ -425,7 +730,7 @@ with tab_atual:
 with tab_rebal:
         st.header("⚖️ Rebalanceamento de Carteira")
         metas_usuario = ler_config("meta_alocacao")
-        reserva_salva = float(ler_config("reserva_emergencia", 0.0))
+        reserva_salva = ler_config("reserva_emergencia")
 
         if not metas_usuario: 
             st.error("Erro: Metas não encontradas.")
@@ -441,6 +746,14 @@ with tab_rebal:
                 cols = st.columns(3)
                 for i, (cat, val) in enumerate(metas_usuario.items()):
                     novas_metas[cat] = cols[i%3].number_input(f"% {cat}", 0.0, 100.0, float(val), 1.0)
+
+                st.divider()
+                st.markdown("### 🚨 Alerta de Rebalanceamento")
+                l1, l2 = st.columns(2)
+                novo_limite_pp = l1.number_input("Desvio máximo (p.p.)", 0.5, 50.0, ler_config("limite_desvio_pp"), 0.5,
+                                                 help="Alerta quando a categoria se afasta da meta mais que isso (ex: meta 20%, fora de 15%-25%)")
+                novo_limite_rel = l2.number_input("Desvio máximo (% da meta)", 1.0, 100.0, ler_config("limite_desvio_relativo"), 1.0,
+                                                  help="Para metas pequenas: meta 5% com 25% de tolerância alerta fora de 3,75%-6,25%")
                 
                 if st.form_submit_button("Salvar 💾"):
                     if abs(sum(novas_metas.values()) - 100.0) > 0.1:
@@ -448,6 +761,8 @@ with tab_rebal:
                     else:
                         salvar_config("meta_alocacao", novas_metas)
                         salvar_config("reserva_emergencia", nova_reserva)
+                        salvar_config("limite_desvio_pp", novo_limite_pp)
+                        salvar_config("limite_desvio_relativo", novo_limite_rel)
                         st.success("Salvo!")
                         time.sleep(1)
                         st.rerun()
@@ -463,7 +778,7 @@ with tab_rebal:
         dados = consultar_extrato()
         
         if dados:
-            df_raw = pd.DataFrame(dados, columns=COLUNAS_DB)
+            df_raw = montar_extrato_ajustado(dados)
             df_carteira = calcular_resumo_ativos(df_raw)
             
             if not df_carteira.empty:
@@ -484,22 +799,18 @@ with tab_rebal:
                 st.divider()
                 
                 # --- Contador de Rebalanceamento ---
-                ult_rebal = ler_config("ultimo_rebalanceamento")
+                ult_rebal = ultimo_rebalanceamento()
                 if ult_rebal:
-                    try:
-                        dt_ult = datetime.strptime(ult_rebal, "%Y-%m-%d").date()
-                        hoje = date.today()
-                        diferenca = hoje - dt_ult
-                        meses = diferenca.days // 30
-                        dias = diferenca.days % 30
-                        st.info(f"📅 Último rebalanceamento realizado há **{meses} meses e {dias} dias** ({dt_ult.strftime('%d/%m/%Y')}).")
-                    except:
-                        st.caption("Data de rebalanceamento inválida.")
+                    dt_ult = datetime.strptime(ult_rebal, "%Y-%m-%d").date()
+                    diferenca = date.today() - dt_ult
+                    meses = diferenca.days // 30
+                    dias = diferenca.days % 30
+                    st.info(f"📅 Último rebalanceamento realizado há **{meses} meses e {dias} dias** ({dt_ult.strftime('%d/%m/%Y')}).")
 
                 c_reb1, c_reb2 = st.columns([1, 2])
                 with c_reb1:
-                    if st.button("✅ Marcar como Realizado", help="Salva a data de hoje como último rebalanceamento"):
-                        salvar_config("ultimo_rebalanceamento", str(date.today()))
+                    if st.button("✅ Marcar como Realizado", help="Marca o último cálculo (ou só a data de hoje) como rebalanceamento realizado"):
+                        marcar_rebalanceamento_realizado(str(date.today()), metas_usuario)
                         st.success("Data atualizada!")
                         time.sleep(1)
                         st.rerun()
@@ -507,6 +818,9 @@ with tab_rebal:
 
                 if st.button("Calcular Rebalanceamento 🚀", type="primary"):
                     res = calcular_rebalanceamento(df_final, aporte, dolar, metas_usuario, reserva_salva)
+                    alocacao_rebal, operacoes_rebal = registro_rebalanceamento(res)
+                    salvar_rebalanceamento(metas_usuario, alocacao_rebal, operacoes_rebal, aporte, dolar,
+                                           reserva_salva, res['patrimonio_atual'])
                     
                     st.subheader("🛒 Compras Indicadas")
                     if not res['df_compras'].empty:
@@ -526,6 +840,48 @@ with tab_rebal:
                     with st.expander("📊 Detalhes do Cálculo"):
                         st.dataframe(res['df_comparacao'], use_container_width=True, hide_index=True)
                         st.info(f"Patrimônio (Sem Reserva): R$ {res['patrimonio_atual']:,.2f}")
+
+                # --- Desvio das metas ao longo do tempo (valor_diario) ---
+                st.divider()
+                st.subheader("📉 Desvio das Metas")
+                limite_pp, limite_rel = ler_config("limite_desvio_pp"), ler_config("limite_desvio_relativo")
+                desvio, alertas_rebal, fig_desvio = obter_desvio_alocacao(df_raw, metas_usuario, reserva_salva, limite_pp, limite_rel)
+                if fig_desvio is None:
+                    st.info("Sem histórico de valor diário para acompanhar o desvio.")
+                else:
+                    if alertas_rebal.empty:
+                        st.success(f"✅ Todas as categorias dentro da faixa (±{limite_pp:g} p.p. ou ±{limite_rel:g}% da meta).")
+                    else:
+                        for _, alerta in alertas_rebal.iterrows():
+                            sentido = "acima" if alerta['Desvio (p.p.)'] > 0 else "abaixo"
+                            st.warning(f"🚨 **{alerta['Categoria']}** está {abs(alerta['Desvio (p.p.)']):.1f} p.p. {sentido} da meta "
+                                       f"({alerta['Atual (%)']:.1f}% x {alerta['Meta (%)']:.1f}%) desde {alerta['Fora Desde']:%d/%m/%Y}.")
+                    ultimo = desvio.iloc[-1]
+                    d1, d2 = st.columns(2)
+                    d1.metric("Maior Desvio Hoje", f"{ultimo.abs().max():.1f} p.p.", help=f"Categoria: {ultimo.abs().idxmax()}")
+                    d2.metric("Volume para Rebalancear", f"{ultimo.abs().sum() / 2:.1f}% do patrimônio",
+                              help="Metade da soma dos desvios: quanto precisaria trocar de categoria, sem aporte")
+                    st.plotly_chart(fig_desvio, use_container_width=True)
+                    st.caption("Faixa verde: tolerância em pontos percentuais. Linhas pontilhadas: rebalanceamentos realizados.")
+
+                historico_rebal = listar_rebalanceamentos(limite=50)
+                with st.expander(f"🗂️ Histórico de Rebalanceamentos ({len(historico_rebal)})"):
+                    if not historico_rebal:
+                        st.caption("Nenhum cálculo guardado ainda: cada 'Calcular Rebalanceamento' entra aqui.")
+                    else:
+                        st.dataframe(
+                            tabela_historico_rebalanceamentos(historico_rebal),
+                            hide_index=True,
+                            use_container_width=True,
+                            column_config={
+                                "ID": None,
+                                "Data": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm"),
+                                "Realizado em": st.column_config.DateColumn(format="DD/MM/YYYY"),
+                                "Aporte (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+                                "Patrimônio (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+                                "Maior Desvio (p.p.)": st.column_config.NumberColumn(format="%.1f"),
+                            }
+                        )
             else:
                 st.info("Carteira vazia.")
         else:
@@ -570,7 +926,7 @@ with tab_metas:
         else:
             dados_brutos = consultar_extrato()
             if dados_brutos:
-                df_metas = pd.DataFrame(dados_brutos, columns=COLUNAS_DB)
+                df_metas = montar_extrato_ajustado(dados_brutos)
                 lista_progresso = calcular_progresso_metas(df_metas, metas_db)
                 
                 for item in lista_progresso:
@@ -596,4 +952,99 @@ with tab_metas:
                         if item['pct'] >= 1.0:
                             st.success("🎉 PARABÉNS! META ATINGIDA!")
             else:
-                st.warning("Cadastre transações no sistema para ver o progresso.")
\ No newline at end of file
+                st.warning("Cadastre transações no sistema para ver o progresso.")
+
+    if metas_db:
+        st.divider()
+        st.subheader("🎲 Chance de Bater as Metas (Monte Carlo)")
+        col_mc, col_resultado = st.columns([1, 2])
+        with col_mc:
+            with st.form("form_monte_carlo"):
+                aporte_mc = st.number_input("Aporte mensal (R$)", min_value=0.0, step=500.0)
+                cenarios_mc = st.select_slider("Cenários", [1000, 5000, 10000, 50000], value=SIMULACOES_MC)
+                if st.form_submit_button("Simular em segundo plano 🚀", disabled=not dados):
+                    enviar_tarefa("monte_carlo", aporte_mensal=aporte_mc, simulacoes=cenarios_mc)
+                    st.rerun()
+            st.caption("Retorno e volatilidade estimados pelo histórico diário da carteira. "
+                       "O progresso aparece na barra lateral.")
+        with col_resultado:
+            simulacao = obter_simulacao_metas()
+            if simulacao is None:
+                st.info("Nenhuma simulação ainda.")
+            else:
+                p = simulacao['parametros']
+                st.caption(f"Gerada em {simulacao['gerado_em']} · retorno {p['retorno_anual'] * 100:.1f}% a.a. · "
+                           f"volatilidade {p['volatilidade_anual'] * 100:.1f}% a.a. · aporte R$ {p['aporte_mensal']:,.2f}/mês")
+                if not simulacao['atual']:
+                    st.warning("O extrato mudou depois desta simulação. Simule de novo para atualizar.")
+                formato_rs = {c: st.column_config.NumberColumn(format="R$ %.2f") for c in ['P10 no Prazo', 'Mediana no Prazo', 'P90 no Prazo']}
+                st.dataframe(
+                    simulacao['metas'].drop(columns='ID'),
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "Chance (%)": st.column_config.ProgressColumn(format="%.0f%%", min_value=0, max_value=100),
+                        "Meses até a Meta": st.column_config.NumberColumn(format="%.0f", help="Mediana dos cenários"),
+                        **formato_rs
+                    }
+                )
+                st.plotly_chart(simulacao['figura'], use_container_width=True)
+
+with tab_impostos:
+    st.header("🧾 Imposto de Renda")
+    if not dados:
+        st.info("Cadastre operações na aba 'Registrador' para ver a apuração.")
+    else:
+        df_ir = montar_extrato_ajustado(dados)
+        df_ir['Data'] = pd.to_datetime(df_ir['Data'])
+        apuracao, darfs = obter_apuracao_ir(df_ir)
+
+        anos = sorted(df_ir['Data'].dt.year.unique().tolist(), reverse=True)
+        ano_ir = st.selectbox("Ano-calendário", anos)
+        apuracao_ano = apuracao[apuracao['Mês'].str.startswith(str(ano_ir))]
+        darfs_ano = darfs[darfs['Mês'].str.startswith(str(ano_ir))]
+
+        prejuizos = apuracao.drop_duplicates('Grupo', keep='last').set_index('Grupo')['Prejuízo a Compensar']
+        k1, k2, k3 = st.columns(3)
+        k1.metric("DARFs no Ano", f"R$ {darfs_ano['Valor DARF'].sum():,.2f}")
+        k2.metric("Lucro Isento no Ano", f"R$ {apuracao_ano['Isento'].sum():,.2f}",
+                  help=f"Ações com vendas até R$ {LIMITE_ISENCAO_ACOES:,.0f}/mês e cripto até R$ {LIMITE_ISENCAO_CRIPTO:,.0f}/mês")
+        k3.metric("Prejuízo a Compensar", f"R$ {prejuizos.sum():,.2f}",
+                  help=" | ".join(f"{g}: R$ {v:,.2f}" for g, v in prejuizos.items()))
+
+        st.subheader("💸 DARFs")
+        if darfs_ano.empty:
+            st.success("Nenhum DARF a pagar neste ano.")
+        else:
+            st.dataframe(
+                darfs_ano,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "Imposto do Mês": st.column_config.NumberColumn(format="R$ %.2f"),
+                    "Acumulado Anterior": st.column_config.NumberColumn(format="R$ %.2f"),
+                    "Valor DARF": st.column_config.NumberColumn(format="R$ %.2f"),
+                    "Vencimento": st.column_config.DateColumn(format="DD/MM/YYYY")
+                }
+            )
+
+        with st.expander("📅 Apuração Mensal"):
+            formato_rs = {c: st.column_config.NumberColumn(format="R$ %.2f") for c in apuracao.columns if c not in ['Mês', 'Grupo']}
+            st.dataframe(apuracao_ano, hide_index=True, use_container_width=True, column_config=formato_rs)
+
+        st.subheader("🏠 Bens e Direitos")
+        df_bens = obter_bens_e_direitos(df_ir, ano_ir)
+        st.dataframe(
+            df_bens,
+            hide_index=True,
+            use_container_width=True,
+            column_config={c: st.column_config.NumberColumn(format="R$ %.2f") for c in df_bens.columns if c.startswith("Situação")}
+        )
+        st.caption("Stocks/REITs (exterior) e Renda Fixa não entram no DARF mensal: exterior é apurado na declaração anual e a Renda Fixa já tem IR retido na fonte.")
+
+        st.subheader("🧮 Simulador de Vendas")
+        posicoes_venda, situacao_ir = obter_base_simulacao_vendas(df_ir)
+        if posicoes_venda.empty:
+            st.info("Nenhuma posição aberta para simular.")
+        else:
+            st.fragment(painel_simulador_vendas)(posicoes_venda, situacao_ir)
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+
+from database import listar_carteiras, usar_carteira
+from migracoes import migrar
+
+# Aquecimento na subida do container (CMD do Dockerfile, antes do streamlit run)
+# Deixa prontos, em cada carteira, os caches que ficam no banco, para a primeira página não calcular nada pesado:
+#   - esquema migrado e valor_diario em dia (a página só lê a tabela)
+#   - snapshot das posições (todas as quebras + conciliação), lido por obter_posicoes_agrupadas
+#   - relatório de validação do extrato (as próximas passadas são incrementais)
+#   - cotações no cotacoes_cache, se o pregão andou desde a última busca (com AGENDADOR_SIDECAR=1,
+#     o serviço 'agendador' do docker-compose já busca, então o passo é pulado)
+# Falhas não impedem a subida do app: cada passo só avisa no stderr.
+#
+# Para rodar: python src/aquecimento.py [--sem-cotacoes] [--carteira Maria]
+
+def _passo(nome, funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    try:
+        resultado = funcao(*args, **kwargs)
+    except Exception as e:
+        print(f"❌ Aquecimento: {nome} falhou ({type(e).__name__}: {e})", file=sys.stderr)
+        return None
+    print(f"✅ Aquecimento: {nome} ({(time.perf_counter() - inicio) * 1000:.0f} ms)", file=sys.stderr)
+    return resultado
+
+def aquecer_carteira(nome):
+    """Migração, valor diário, snapshot das posições e validação de uma carteira."""
+    from nucleo.validacao import validar_extrato
+    from nucleo.valor_diario import atualizar_valor_diario
+    from tarefas import executar_agora
+
+    with usar_carteira(nome):
+        _passo(f"{nome}: esquema", migrar)
+        _passo(f"{nome}: valor diário", atualizar_valor_diario)
+        _passo(f"{nome}: posições", executar_agora, "posicoes")
+        _passo(f"{nome}: validação do extrato", validar_extrato)
+
+def aquecer(carteiras=None, cotacoes=True):
+    """
+    Aquece todas as carteiras (ou só as pedidas) e, com cotacoes=True, busca as cotações vencidas.
+    Com AGENDADOR_SIDECAR=1 as cotações ficam com o agendador (mesma regra de iniciar_agendador).
+    """
+    carteiras = carteiras or listar_carteiras()
+    for nome in carteiras:
+        aquecer_carteira(nome)
+    if cotacoes and os.environ.get("AGENDADOR_SIDECAR") != "1":
+        # Só as cotações: histórico e notícias ficam para o agendador, sem atrasar a subida
+        from agendador import executar_pendentes
+        _passo("cotações", executar_pendentes, carteiras, tarefas=["cotacoes"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepara os caches do banco antes de subir o app")
+    parser.add_argument("--carteira", action="append", help="Carteira a aquecer (pode repetir; padrão: todas)")
+    parser.add_argument("--sem-cotacoes", action="store_true", help="Não busca cotações (ex: sem rede)")
+    args = parser.parse_args(argv)
+    aquecer(args.carteira, cotacoes=not args.sem_cotacoes)
+
+if __name__ == "__main__":
+    main()
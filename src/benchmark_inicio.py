@@ -0,0 +1,86 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from constants import *
+
+# Benchmark da inicialização do app: quanto custa importar o que o app.py importa num processo novo
+# (o que acontece a cada subida do servidor; nos reruns os módulos já estão carregados).
+# Falha (código de saída 1) se a mediana passar do ORCAMENTO_IMPORTACAO_MS ou se alguma biblioteca
+# de MODULOS_SOB_DEMANDA (yfinance, bcb, plotly.express) for importada já na subida.
+#
+# Para rodar: python src/benchmark_inicio.py
+#             python src/benchmark_inicio.py --repeticoes 10 --detalhes 15
+
+DIRETORIO_SRC = os.path.dirname(os.path.abspath(__file__))
+# Os mesmos imports do topo do app.py
+IMPORTS_APP = "import utils, agendador, migracoes, tarefas"
+
+def _rodar(codigo, *opcoes):
+    """Roda o código num interpretador novo (na pasta src) e devolve (stdout, stderr)."""
+    resultado = subprocess.run(
+        [sys.executable, *opcoes, "-c", codigo], cwd=DIRETORIO_SRC, capture_output=True, text=True,
+        env={**os.environ, "AGENDADOR_SIDECAR": "1"}, check=True
+    )
+    return resultado.stdout, resultado.stderr
+
+def medir_importacao(repeticoes=5):
+    """Tempos (ms) de cada repetição e os módulos de MODULOS_SOB_DEMANDA que foram carregados."""
+    codigo = (
+        "import sys, time\n"
+        "inicio = time.perf_counter()\n"
+        f"{IMPORTS_APP}\n"
+        "print((time.perf_counter() - inicio) * 1000)\n"
+        f"print(','.join(m for m in {MODULOS_SOB_DEMANDA!r} if m in sys.modules))\n"
+    )
+    tempos, carregados = [], set()
+    for _ in range(repeticoes):
+        saida, _ = _rodar(codigo)
+        tempo, _, modulos = saida.partition("\n")
+        tempos.append(float(tempo))
+        carregados.update(filter(None, modulos.strip().split(",")))
+    return tempos, sorted(carregados)
+
+def mais_pesados(limite=10):
+    """[(pacote, ms acumulados)] dos pacotes mais caros de importar, pelo python -X importtime."""
+    _, relatorio = _rodar(IMPORTS_APP, "-X", "importtime")
+    pacotes = {}
+    for linha in relatorio.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, nome = linha[len("import time:"):].split("|")
+        # O custo do pacote é o da linha do próprio pacote (a maior entre as dos seus submódulos)
+        raiz = nome.strip().split(".")[0]
+        pacotes[raiz] = max(pacotes.get(raiz, 0), int(acumulado) / 1000)
+    return sorted(pacotes.items(), key=lambda item: item[1], reverse=True)[:limite]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o tempo de importação do app e confere o orçamento")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Processos novos medidos (vale a mediana)")
+    parser.add_argument("--detalhes", type=int, default=10, help="Quantos pacotes mais pesados listar (0 = nenhum)")
+    parser.add_argument("--orcamento", type=float, default=ORCAMENTO_IMPORTACAO_MS, help="Limite em ms")
+    args = parser.parse_args(argv)
+
+    tempos, carregados = medir_importacao(args.repeticoes)
+    mediana = statistics.median(tempos)
+    print(f"Importação do app: mediana {mediana:.0f} ms (mín {min(tempos):.0f}, máx {max(tempos):.0f}, "
+          f"{len(tempos)} processos) | orçamento {args.orcamento:.0f} ms")
+    if args.detalhes:
+        for nome, ms in mais_pesados(args.detalhes):
+            print(f"  {nome:<20} {ms:8.1f} ms")
+
+    ok = True
+    if mediana > args.orcamento:
+        print(f"❌ Acima do orçamento em {mediana - args.orcamento:.0f} ms.")
+        ok = False
+    if carregados:
+        print(f"❌ Importados na subida (deveriam ser sob demanda): {', '.join(carregados)}")
+        ok = False
+    if ok:
+        print("✅ Dentro do orçamento e sem bibliotecas de rede/gráfico na subida.")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
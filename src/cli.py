@@ -0,0 +1,276 @@
+import argparse
+import sys
+
+# Linha de comando do gerenciador: calcula os relatórios direto do maindata.db, sem Streamlit.
+# pandas/yfinance só são importados dentro de cada comando, então o --help abre na hora.
+#
+# Exemplos:
+#   python src/cli.py posicoes
+#   python src/cli.py rebalancear --aporte 2000 --dolar 5.40 --online
+#   python src/cli.py evolucao -f csv > evolucao.csv
+#   python src/cli.py posicoes --carteira Maria
+
+# Funções de saída
+
+def _imprimir(resultado, formato):
+    """Imprime um DataFrame ou dict no formato pedido (tabela, csv ou json)."""
+    import pandas as pd
+
+    if isinstance(resultado, dict):
+        resultado = pd.DataFrame([resultado])
+    if resultado.empty:
+        print("Nenhum dado encontrado.", file=sys.stderr)
+        return
+    if formato == "csv":
+        resultado.to_csv(sys.stdout, index=False)
+    elif formato == "json":
+        print(resultado.to_json(orient="records", date_format="iso", force_ascii=False))
+    else:
+        print(resultado.to_string(index=False))
+
+def _carregar():
+    from nucleo.dados import carregar_transacoes
+
+    df = carregar_transacoes()
+    if df.empty:
+        print("Sem transações no banco.", file=sys.stderr)
+        sys.exit(1)
+    return df
+
+# Comandos
+
+def cmd_posicoes(args):
+    from nucleo.posicoes import calcular_posicoes_agrupadas, calcular_resumo_ativos, conciliar_custodia
+
+    if args.conciliar:
+        return conciliar_custodia(_carregar())
+    if args.por:
+        chaves = ['Ativo', args.por.capitalize()]
+        return calcular_posicoes_agrupadas(_carregar(), {"quebra": chaves})["quebra"]
+    return calcular_resumo_ativos(_carregar())
+
+def cmd_alocacao(args):
+    from nucleo.posicoes import calcular_carteira_atual, gerar_tabela_alocacao
+
+    df = _carregar()
+    return gerar_tabela_alocacao(calcular_carteira_atual(df), df)
+
+def cmd_proventos(args):
+    from nucleo.posicoes import calcular_carteira_atual
+    from nucleo.proventos import (calcular_proventos_ano_atual, calcular_proventos_caixa, calcular_total_bonificacoes,
+                                  projetar_proventos)
+
+    df = _carregar()
+    if args.projecao:
+        projecao = projetar_proventos(df)
+        if args.projecao == "cadencia":
+            return projecao["cadencia"]
+        return projecao["projecao"].pivot_table(index='Ativo', columns=projecao["projecao"]['Mês'].dt.strftime('%Y-%m'),
+                                                values='Valor', aggfunc='sum', fill_value=0.0).reset_index()
+    carteira = calcular_carteira_atual(df)
+    patrimonio_investido = carteira.custo_total()
+    proventos_ano = calcular_proventos_ano_atual(df)
+    return {
+        "Proventos em Caixa": calcular_proventos_caixa(df),
+        "Bonificações": calcular_total_bonificacoes(df),
+        "Proventos no Ano": proventos_ano,
+        "Rentabilidade Anual (%)": (proventos_ano / patrimonio_investido * 100) if patrimonio_investido > 0 else 0.0
+    }
+
+def cmd_evolucao(args):
+    import pandas as pd
+    from nucleo.evolucao import calcular_evolucao_patrimonial, montar_intervalo_meses
+
+    df_sorted = _carregar().sort_values('Data')
+    eixo_datas, eixo_aportes, eixo_acumulado = calcular_evolucao_patrimonial(df_sorted, montar_intervalo_meses(df_sorted))
+    return pd.DataFrame({
+        "Mês": [d.strftime("%Y-%m") for d in eixo_datas],
+        "Aporte Mensal": eixo_aportes,
+        "Total Investido": eixo_acumulado
+    })
+
+def cmd_rentabilidade(args):
+    from nucleo.cotacoes import cotacoes_locais
+    from database import listar_indexadores
+    from nucleo.posicoes import calcular_carteira_atual, gerar_painel_rentabilidade, selecionar_ativos_renda_variavel
+    from nucleo.renda_fixa import valorizar_renda_fixa
+
+    df = _carregar()
+    carteira = calcular_carteira_atual(df)
+    cotacoes = cotacoes_locais(selecionar_ativos_renda_variavel(carteira, df))
+    df_rf = valorizar_renda_fixa(df, listar_indexadores())
+    df_rent, resumo = gerar_painel_rentabilidade(carteira, df, cotacoes, dict(zip(df_rf['Ativo'], df_rf['Valor Atual'])))
+    print(f"Patrimônio estimado: R$ {resumo['valor_atual']:,.2f} | "
+          f"Resultado: R$ {resumo['lucro_total_rs']:,.2f} ({resumo['lucro_total_pct']:.2f}%)", file=sys.stderr)
+    return df_rent
+
+def cmd_renda_fixa(args):
+    from database import listar_indexadores
+    from nucleo.renda_fixa import valorizar_renda_fixa
+    return valorizar_renda_fixa(_carregar(), listar_indexadores())
+
+def cmd_atualizar_sgs(args):
+    import pandas as pd
+    from nucleo.renda_fixa import atualizar_series_sgs
+
+    novos = atualizar_series_sgs()
+    return pd.DataFrame({"Série": list(novos), "Pontos Novos": list(novos.values())})
+
+def cmd_atualizar_precos(args):
+    import pandas as pd
+    from nucleo.precos import atualizar_historico_precos, inicios_renda_variavel
+
+    novos = atualizar_historico_precos(inicios_renda_variavel(_carregar()))
+    return pd.DataFrame({"Preços Novos": [novos]})
+
+def cmd_valor_diario(args):
+    from nucleo.valor_diario import atualizar_valor_diario, reconstruir_valor_diario, serie_patrimonio_diario
+
+    linhas = reconstruir_valor_diario() if args.reconstruir else atualizar_valor_diario()
+    print(f"✅ {linhas} linhas recalculadas em valor_diario.", file=sys.stderr)
+    return serie_patrimonio_diario(args.inicio).reset_index()
+
+def cmd_rebalancear(args):
+    from database import ler_config
+    from nucleo.posicoes import calcular_resumo_ativos
+    from nucleo.rebalanceamento import calcular_rebalanceamento, preparar_dados_editor, unificar_dados_com_categorias
+
+    df_raw = _carregar()
+    df_carteira = calcular_resumo_ativos(df_raw)
+    df_editado = preparar_dados_editor(unificar_dados_com_categorias(df_carteira, df_raw))
+
+    # Sem cotação online, usa o preço médio como preço de hoje
+    precos = dict(zip(df_carteira['Ativo'], df_carteira['Preço Médio']))
+    if args.online:
+        from nucleo.cotacoes import buscar_cotacoes
+        precos.update(buscar_cotacoes(df_editado['Ativo'].tolist()))
+    df_editado['Preço Hoje'] = df_editado['Ativo'].map(precos).fillna(0.0)
+
+    metas_usuario = ler_config("meta_alocacao")
+    reserva = ler_config("reserva_emergencia")
+    res = calcular_rebalanceamento(df_editado, args.aporte, args.dolar, metas_usuario, reserva)
+    print(f"Patrimônio (Sem Reserva): R$ {res['patrimonio_atual']:,.2f} | "
+          f"Após aporte: R$ {res['patrimonio_final']:,.2f}", file=sys.stderr)
+    if args.salvar:
+        from database import salvar_rebalanceamento
+        from nucleo.rebalanceamento import registro_rebalanceamento
+
+        id_rebal = salvar_rebalanceamento(metas_usuario, *registro_rebalanceamento(res), args.aporte, args.dolar,
+                                          reserva, res['patrimonio_atual'])
+        print(f"✅ Cálculo guardado no histórico (ID {id_rebal}).", file=sys.stderr)
+    return res['df_comparacao']
+
+def cmd_desvio(args):
+    from database import ler_config, listar_rebalanceamentos
+    from nucleo.rebalanceamento import alertas_desvio, calcular_desvio_alocacao, tabela_historico_rebalanceamentos
+    from nucleo.valor_diario import atualizar_valor_diario
+
+    if args.historico:
+        return tabela_historico_rebalanceamentos(listar_rebalanceamentos())
+    atualizar_valor_diario()
+    metas = ler_config("meta_alocacao")
+    desvio = calcular_desvio_alocacao(_carregar(), metas, ler_config("reserva_emergencia"), args.inicio)
+    if args.alertas:
+        return alertas_desvio(desvio, metas, ler_config("limite_desvio_pp"), ler_config("limite_desvio_relativo"))
+    return desvio.round(2).reset_index()
+
+def cmd_metas(args):
+    import pandas as pd
+    from database import listar_metas
+    from nucleo.metas import calcular_progresso_metas
+
+    return pd.DataFrame(calcular_progresso_metas(_carregar(), listar_metas()))
+
+def cmd_impostos(args):
+    from nucleo.impostos import apurar_ir_mensal, bens_e_direitos, calcular_darfs
+
+    df = _carregar()
+    if args.bens:
+        return bens_e_direitos(df, args.ano or df['Data'].dt.year.max())
+    apuracao = apurar_ir_mensal(df)
+    resultado = apuracao if args.apuracao else calcular_darfs(apuracao)
+    if args.ano:
+        resultado = resultado[resultado['Mês'].str.startswith(str(args.ano))]
+    return resultado
+
+def cmd_validar(args):
+    from nucleo.validacao import validar_extrato
+
+    problemas = validar_extrato(completa=args.completa)
+    if args.erros:
+        problemas = problemas[problemas['Gravidade'] == 'erro']
+    return problemas
+
+def cmd_consolidado(args):
+    from nucleo.consolidacao import consolidar_carteiras
+
+    consolidado = consolidar_carteiras(args.carteiras or None)
+    return consolidado["resumo"] if args.resumo else consolidado["posicoes"]
+
+def montar_parser():
+    parser = argparse.ArgumentParser(description="Relatórios da carteira direto do maindata.db.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    def comando(nome, funcao, ajuda):
+        p = sub.add_parser(nome, help=ajuda)
+        p.add_argument("-f", "--formato", choices=["tabela", "csv", "json"], default="tabela")
+        p.add_argument("--carteira", help="Carteira (padrão: a principal, db/maindata.db)")
+        p.set_defaults(funcao=funcao)
+        return p
+
+    p = comando("posicoes", cmd_posicoes, "Qtd, preço médio e custo de cada ativo")
+    p.add_argument("--por", choices=["corretora", "moeda"], help="Quebra a posição por corretora ou moeda")
+    p.add_argument("--conciliar", action="store_true", help="Conciliação de custódia por corretora")
+    comando("alocacao", cmd_alocacao, "Alocação por ativo, categoria e classe")
+    p = comando("proventos", cmd_proventos, "Resumo de proventos e bonificações")
+    p.add_argument("--projecao", nargs="?", const="meses", choices=["meses", "cadencia"],
+                   help="Proventos esperados nos próximos 12 meses (ativo x mês) ou a cadência de cada ativo")
+    comando("evolucao", cmd_evolucao, "Aportes e total investido mês a mês")
+    comando("rentabilidade", cmd_rentabilidade, "PM x cotação atual (busca online)")
+    comando("metas", cmd_metas, "Progresso das metas cadastradas")
+    p = comando("impostos", cmd_impostos, "DARFs mensais (swing, day trade, FIIs e cripto)")
+    p.add_argument("--ano", type=int, help="Somente o ano-calendário informado")
+    p.add_argument("--apuracao", action="store_true", help="Mostra a apuração mensal por grupo em vez dos DARFs")
+    p.add_argument("--bens", action="store_true", help="Ficha Bens e Direitos do ano (padrão: último ano)")
+    p = comando("validar", cmd_validar, "Problemas do extrato (vendas a descoberto, duplicatas, categorias...)")
+    p.add_argument("--completa", action="store_true", help="Revalida o extrato inteiro (padrão: só os ativos alterados)")
+    p.add_argument("--erros", action="store_true", help="Somente os erros (sem os avisos)")
+    p = comando("consolidado", cmd_consolidado, "Posições somadas de todas as carteiras (lidas em paralelo)")
+    p.add_argument("--resumo", action="store_true", help="Uma linha por carteira em vez de uma por ativo")
+    p.add_argument("-c", "--carteiras", action="append", help="Somente estas carteiras (pode repetir)")
+    comando("renda-fixa", cmd_renda_fixa, "Valor na curva dos títulos com indexador")
+    comando("atualizar-sgs", cmd_atualizar_sgs, "Baixa os dias novos de CDI/SELIC/IPCA do Banco Central")
+    comando("atualizar-precos", cmd_atualizar_precos, "Baixa os fechamentos que faltam no histórico local")
+    p = comando("valor-diario", cmd_valor_diario, "Atualiza a tabela valor_diario e mostra o patrimônio diário")
+    p.add_argument("--reconstruir", action="store_true", help="Recalcula a tabela inteira")
+    p.add_argument("--inicio", help="Mostrar a partir da data (AAAA-MM-DD)")
+    p = comando("rebalancear", cmd_rebalancear, "Compras/vendas para voltar às metas de alocação")
+    p.add_argument("--aporte", type=float, default=0.0)
+    p.add_argument("--dolar", type=float, default=5.50)
+    p.add_argument("--online", action="store_true", help="Usa cotação online em vez do preço médio")
+    p.add_argument("--salvar", action="store_true", help="Guarda o cálculo no histórico de rebalanceamentos")
+    p = comando("desvio", cmd_desvio, "Desvio diário das metas de alocação (p.p.), pelo valor_diario")
+    p.add_argument("--inicio", help="A partir da data (AAAA-MM-DD)")
+    p.add_argument("--alertas", action="store_true", help="Somente as categorias fora da faixa de tolerância hoje")
+    p.add_argument("--historico", action="store_true", help="Histórico de rebalanceamentos calculados/realizados")
+
+    # A exportação tem os próprios argumentos (ver exportacao.py)
+    sub.add_parser("exportar", help="Exporta relatórios em CSV/Parquet", add_help=False)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "exportar":
+        from exportacao import main as exportar
+        return exportar(argv[1:])
+
+    args = montar_parser().parse_args(argv)
+    from database import selecionar_carteira
+    from migracoes import migrar
+    if args.carteira:
+        selecionar_carteira(args.carteira)
+    migrar()
+    _imprimir(args.funcao(args), args.formato)
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,15 @@ METAS_PADRAO = {
     "ETF Internacional": 10.0,
     "Criptomoedas": 5.0
 }
+# Tipo e valor padrão de cada chave da tabela config (ler_config devolve já convertido)
+# dict = {texto: número}, como as metas de alocação em %
+ESQUEMA_CONFIG = {
+    "meta_alocacao": (dict, METAS_PADRAO),
+    "reserva_emergencia": (float, 0.0),
+    "limite_desvio_pp": (float, 5.0),         # Alerta de rebalanceamento: desvio da meta em pontos percentuais
+    "limite_desvio_relativo": (float, 25.0),  # ... ou em % da própria meta (regra 5/25)
+    "ultimo_backup": (str, None),
+}
 # Corretoras
 CORRETORAS = ["XP", "Binance", "Nubank", "Outra"]
 # Colunas do extrato
@@ -26,3 +35,77 @@ MAPA_CLASSES = {
 }
 # Gera a lista plana automaticamente baseada no mapa acima
 LISTA_CATEGORIAS = [item for sublist in MAPA_CLASSES.values() for item in sublist] + ["Outros"]
+
+# Carteiras: a padrão usa o db/maindata.db, as demais db/carteiras/<nome>.db
+CARTEIRA_PADRAO = "Principal"
+TAMANHO_POOL = 8   # Conexões livres guardadas por banco
+
+# API JSON (api.py)
+MAX_RESPOSTAS_CACHE_API = 256   # Respostas guardadas em memória (as menos usadas saem primeiro)
+MAX_POR_PAGINA_API = 500        # Limite do ?por_pagina do /extrato
+
+# Backups (snapshots comprimidos em db/backups)
+BACKUPS_MANTIDOS = 10
+PAGINAS_POR_PASSO = 256
+
+# Tipos que aumentam a posição (sobem o custo) e que reduzem (mantêm o PM)
+TIPOS_ENTRADA = ['Compra', 'Aporte', 'Reinvestimento', 'Bonificacao']
+TIPOS_SAIDA = ['Venda', 'Resgate', 'Saque']
+
+# Séries do SGS (Banco Central) usadas na marcação da Renda Fixa
+SERIES_SGS = {"CDI": 12, "SELIC": 11, "IPCA": 433}
+INDEXADORES_RF = ["CDI", "SELIC", "IPCA", "PRE"]
+DATA_INICIO_SGS = "2015-01-01"
+
+# Benchmarks do gráfico de evolução: nome -> (fonte, código)
+# 'sgs' = série do Banco Central | 'preco' = histórico local em R$ | 'dolar' = histórico em US$ convertido pelo câmbio
+BENCHMARKS = {
+    "CDI": ("sgs", "CDI"),
+    "IBOV": ("preco", "^BVSP"),
+    "IFIX": ("preco", "XFIX11"),   # ETF que replica o IFIX (o índice não tem histórico no Yahoo)
+    "S&P 500": ("dolar", "^GSPC"),
+}
+TICKER_DOLAR = "USDBRL=X"
+# Cor de cada benchmark no gráfico de evolução
+CORES_BENCHMARKS = {"CDI": '#7f7f7f', "IBOV": '#1f77b4', "IFIX": '#9467bd', "S&P 500": '#d62728'}
+
+# Gráficos: períodos do seletor (dias, None = tudo) e limites da redução das séries diárias
+PERIODOS_GRAFICO = {"6M": 182, "1A": 365, "3A": 1095, "5A": 1826, "Tudo": None}
+MAX_PONTOS_GRAFICO = 1000       # Pontos por série enviados ao navegador
+DIAS_LTTB = 730                 # Até 2 anos: LTTB nos pontos diários
+DIAS_AGREGACAO_SEMANAL = 3650   # Até 10 anos: último valor da semana; acima disso, do mês
+LIMITE_WEBGL = 2000             # Acima disso (somando as linhas da figura), usa Scattergl
+
+# Imposto de renda sobre vendas (apuração mensal)
+LIMITE_ISENCAO_ACOES = 20000.0     # Vendas de ações no mês (swing trade)
+LIMITE_ISENCAO_CRIPTO = 35000.0    # Vendas de criptoativos no mês
+DARF_MINIMO = 10.0                 # Abaixo disso o imposto acumula para o mês seguinte
+PASSO_SIMULACAO_VENDAS = 5         # Passo (em %) das frações vendidas e dos choques de preço do simulador
+
+# Tarefas pesadas em segundo plano (tarefas.py)
+MAX_PROCESSOS_TAREFAS = None        # Processos do pool (None = um por núcleo)
+INTERVALO_PROGRESSO = 2             # Segundos entre as atualizações do painel de tarefas
+ESTADOS_TAREFA_ATIVOS = ["pendente", "executando", "cancelando"]
+
+# Monte Carlo das metas (quando o histórico de valor_diario é curto demais para estimar)
+RETORNO_PADRAO_MC = 0.08            # Retorno anual esperado
+VOLATILIDADE_PADRAO_MC = 0.15       # Volatilidade anual
+SIMULACOES_MC = 10000
+HORIZONTE_MC_MESES = 120            # Metas sem prazo: chance de chegar lá em até 10 anos
+
+# Agendador dos dados externos (agendador.py): pregões e intervalos de atualização
+# Pregão: fuso, abertura e fechamento (feriados não entram; num feriado só se perde uma busca à toa)
+PREGOES = {
+    "B3": ("America/Sao_Paulo", "10:00", "17:00"),
+    "EUA": ("America/New_York", "09:30", "16:00"),
+}
+FUSO_PADRAO = "America/Sao_Paulo"
+INTERVALO_COTACOES_MIN = 15     # Cotações durante o pregão
+FOLGA_FECHAMENTO_MIN = 30       # Depois do fechamento, para o Yahoo consolidar o preço final
+INTERVALO_NOTICIAS_H = 3        # Notícias e descrição dos ativos
+INTERVALO_AGENDADOR_S = 60      # Cada volta do laço do agendador
+
+# Inicialização do app (benchmark_inicio.py e aquecimento.py)
+ORCAMENTO_IMPORTACAO_MS = 1500  # Importar o que o app.py importa, num processo novo (mediana)
+# Bibliotecas de rede/gráfico que só podem ser importadas no primeiro uso, nunca no topo dos módulos do app
+MODULOS_SOB_DEMANDA = ["yfinance", "bcb", "plotly.express"]
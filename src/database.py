@@ -1,12 +1,21 @@
+import contextvars
+import difflib
+import gzip
 import json
 import os
+import re
+import shutil
 import sqlite3
-from datetime import datetime
+import threading
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
 from constants import *
 
 DIRETORIO_ATUAL = os.path.dirname(os.path.abspath(__file__))
 CAMINHO_DB = os.path.join(DIRETORIO_ATUAL, '..', 'db', 'maindata.db')
+DIRETORIO_CARTEIRAS = os.path.join(DIRETORIO_ATUAL, '..', 'db', 'carteiras')
 
 
 # Aqui estão as funções que mexem com o banco de dados
@@ -14,43 +23,103 @@ CAMINHO_DB = os.path.join(DIRETORIO_ATUAL, '..', 'db', 'maindata.db')
 # Funções que gerenciam o maindata.db
 
 def conectar():
-    """Conecta ao banco de dados e retorna a conexão."""
-    return sqlite3.connect(CAMINHO_DB)
+    """
+    Conecta ao banco da carteira ativa e retorna a conexão.
+    A conexão vem do pool: o conn.close() de sempre devolve ela para ser reaproveitada.
+    """
+    caminho = caminho_banco()
+    with _trava_pool:
+        livres = _pool.get(caminho)
+        if livres:
+            return livres.pop()
+    conn = sqlite3.connect(caminho, factory=_ConexaoPool, check_same_thread=False)
+    conn.caminho = caminho
+    return conn
 
-def inicializar_tabela_transacoes():
-    """Cria a tabela de transações se ela não existir."""
-    conn = conectar()
-    cursor = conn.cursor()
-    
-    sql_criar_tabela = """
-    CREATE TABLE IF NOT EXISTS transacoes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        data TEXT NOT NULL,
-        ativo TEXT NOT NULL,
-        tipo TEXT NOT NULL,
-        quantidade REAL,
-        preco_unitario REAL,
-        valor_total REAL NOT NULL,
-        corretora TEXT NOT NULL,
-        moeda TEXT DEFAULT 'BRL',
-        taxa_cambio REAL DEFAULT 1.0,
-        observacao TEXT,
-        categoria TEXT DEFAULT 'Outros',
-        classe TEXT,
-        
-        CHECK(tipo IN (
-            'Compra', 'Venda', 'Dividendo', 'JCP', 'Taxa', 'Bonificacao', 'Cambio',
-            'Aporte', 'Resgate', 'Reinvestimento'
-        ))
-    );
+# Funções de carteiras (um arquivo .db por carteira) e do pool de conexões
+# A carteira ativa fica numa ContextVar: cada sessão do Streamlit, requisição da API ou
+# thread da visão consolidada enxerga a sua, sem trocar o CAMINHO_DB global.
+# A carteira padrão continua sendo o db/maindata.db; as outras ficam em db/carteiras/<nome>.db.
+
+_carteira_ativa = contextvars.ContextVar("carteira_ativa", default=CARTEIRA_PADRAO)
+_pool = {}                      # { caminho: [conexões livres] }
+_trava_pool = threading.Lock()
+
+class _ConexaoPool(sqlite3.Connection):
+    """Conexão do pool: close() desfaz o que ficou sem commit e devolve a conexão."""
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+        with _trava_pool:
+            livres = _pool.setdefault(self.caminho, [])
+            if len(livres) < TAMANHO_POOL:
+                livres.append(self)
+                return
+        sqlite3.Connection.close(self)
+
+def fechar_conexoes(caminho=None):
+    """Fecha de verdade as conexões livres do pool (de um banco ou de todos)."""
+    with _trava_pool:
+        caminhos = [caminho] if caminho else list(_pool)
+        conexoes = [conn for c in caminhos for conn in _pool.pop(c, [])]
+    for conn in conexoes:
+        sqlite3.Connection.close(conn)
+
+def _nome_valido(nome):
+    return bool(re.fullmatch(r"[\w\- ]{1,40}", nome or "")) and nome.strip() == nome
+
+def caminho_carteira(nome):
+    """Arquivo .db da carteira (a padrão é o maindata.db)."""
+    if nome == CARTEIRA_PADRAO:
+        return CAMINHO_DB
+    if not _nome_valido(nome):
+        raise ValueError(f"Nome de carteira inválido: {nome!r}")
+    return os.path.join(DIRETORIO_CARTEIRAS, f"{nome}.db")
+
+def caminho_banco():
+    """Arquivo .db da carteira ativa no contexto atual."""
+    return caminho_carteira(_carteira_ativa.get())
+
+def carteira_atual():
+    return _carteira_ativa.get()
+
+def listar_carteiras():
+    """Carteira padrão + uma por arquivo em db/carteiras, em ordem alfabética."""
+    outras = []
+    if os.path.isdir(DIRETORIO_CARTEIRAS):
+        outras = sorted(os.path.splitext(f)[0] for f in os.listdir(DIRETORIO_CARTEIRAS) if f.endswith(".db"))
+    return [CARTEIRA_PADRAO] + [nome for nome in outras if _nome_valido(nome)]
+
+def criar_carteira(nome):
+    """
+    Cria o arquivo vazio de uma carteira nova (as tabelas vêm do migracoes.migrar()).
+    Retorna True se criou.
     """
+    nome = (nome or "").strip()
+    if not _nome_valido(nome) or nome in listar_carteiras():
+        print(f"❌ Nome de carteira inválido ou já existente: {nome!r}")
+        return False
+    os.makedirs(DIRETORIO_CARTEIRAS, exist_ok=True)
+    sqlite3.connect(caminho_carteira(nome)).close()
+    print(f"✅ Carteira {nome} criada!")
+    return True
+
+def selecionar_carteira(nome):
+    """Troca a carteira ativa no contexto atual (ex: no topo de cada rerun do Streamlit)."""
+    if nome not in listar_carteiras():
+        raise ValueError(f"Carteira não encontrada: {nome!r}")
+    _carteira_ativa.set(nome)
+
+@contextmanager
+def usar_carteira(nome):
+    """Usa outra carteira só dentro do bloco 'with' (volta para a anterior no fim)."""
+    if nome not in listar_carteiras():
+        raise ValueError(f"Carteira não encontrada: {nome!r}")
+    token = _carteira_ativa.set(nome)
     try:
-        cursor.execute("ALTER TABLE transacoes ADD COLUMN classe TEXT")
-    except sqlite3.OperationalError:
-        pass # A coluna já existe, vida que segue.
-    cursor.execute(sql_criar_tabela)
-    conn.commit()
-    conn.close()
+        yield
+    finally:
+        _carteira_ativa.reset(token)
 
 def add_transacao(data, ativo, tipo, quantidade, preco, corretora, categoria, classe, moeda='BRL', cambio=1.0, obs=''):
     conn = conectar()
@@ -67,6 +136,7 @@ def add_transacao(data, ativo, tipo, quantidade, preco, corretora, categoria, cl
     valores = (data, ativo.upper(), tipo, quantidade, preco, valor_total, corretora, categoria, classe, moeda, cambio, obs)    
     try:
         cursor.execute(sql, valores)
+        _descartar_refazer(cursor)
         conn.commit()
         print(f"✅ Transação de {ativo} adicionada com sucesso!")
     except sqlite3.Error as e:
@@ -78,26 +148,66 @@ def del_transacao(id_transacao):
     """
     Remove uma transação baseada no ID.
     Isso é essencial para corrigir erros de lançamento.
+    A exclusão é lógica (excluido = 1): fica no log e pode ser desfeita.
     """
     conn = conectar()
     cursor = conn.cursor()
     
     try:
-        cursor.execute("DELETE FROM transacoes WHERE id = ?", (id_transacao,))
+        cursor.execute("UPDATE transacoes SET excluido = 1 WHERE id = ? AND excluido = 0", (id_transacao,))
+        if cursor.rowcount == 0:
+            print(f"❌ Transação ID {id_transacao} não encontrada.")
+            return False
+        _descartar_refazer(cursor)
         conn.commit()
         print(f"✅ Transação ID {id_transacao} removida.")
+        return True
     except sqlite3.Error as e:
         print(f"❌ Erro ao remover: {e}")
+        return False
     finally:
         conn.close()
 
-def consultar_extrato():
+def editar_transacao(id_transacao, data, ativo, tipo, quantidade, preco, corretora, categoria, classe, moeda='BRL', cambio=1.0, obs=''):
+    """
+    Corrige uma transação no lugar (sem apagar e lançar de novo).
+    Os gatilhos registram o antes/depois no log e marcam o valor diário a partir da data mais antiga.
+    """
+    conn = conectar()
+    cursor = conn.cursor()
+
+    qtd_final = quantidade if quantidade else 1
+    try:
+        cursor.execute("""
+        UPDATE transacoes
+        SET data = ?, ativo = ?, tipo = ?, quantidade = ?, preco_unitario = ?, valor_total = ?,
+            corretora = ?, categoria = ?, classe = ?, moeda = ?, taxa_cambio = ?, observacao = ?
+        WHERE id = ? AND excluido = 0
+        """, (str(data), ativo.upper(), tipo, quantidade, preco, preco * qtd_final,
+              corretora, categoria, classe, moeda, cambio, obs, id_transacao))
+        if cursor.rowcount == 0:
+            print(f"❌ Transação ID {id_transacao} não encontrada.")
+            return False
+        _descartar_refazer(cursor)
+        conn.commit()
+        print(f"✅ Transação ID {id_transacao} atualizada.")
+        return True
+    except sqlite3.Error as e:
+        print(f"❌ Erro ao editar: {e}")
+        return False
+    finally:
+        conn.close()
+
+def consultar_extrato(ativos=None):
     """
     Retorna TODAS as transações ordenadas por data.
+    Se 'ativos' for informado, retorna apenas as transações desses ativos.
     """
     conn = conectar()
     cursor = conn.cursor()
-    sql = """
+    params = list(ativos or [])
+    filtro = f"AND ativo IN ({', '.join('?' for _ in params)})" if params else ""
+    sql = f"""
     SELECT 
         id, 
         data, 
@@ -112,12 +222,13 @@ def consultar_extrato():
         taxa_cambio, 
         observacao,
         classe
-    FROM transacoes 
+    FROM transacoes
+    WHERE excluido = 0 {filtro}
     ORDER BY data DESC
     """
     
     try:
-        cursor.execute(sql)
+        cursor.execute(sql, params)
         resultado = cursor.fetchall()
         return resultado
     except sqlite3.Error as e:
@@ -126,6 +237,123 @@ def consultar_extrato():
     finally:
         conn.close()
 
+def consultar_extrato_paginado(pagina=1, por_pagina=50, ativo=None, tipo=None):
+    """
+    Retorna uma página do extrato (mais recentes primeiro) e o total de linhas do filtro.
+    """
+    condicoes = ["excluido = 0"]
+    params = []
+    if ativo:
+        condicoes.append("ativo = ?")
+        params.append(ativo.upper())
+    if tipo:
+        condicoes.append("tipo = ?")
+        params.append(tipo)
+    where = f"WHERE {' AND '.join(condicoes)}"
+
+    conn = conectar()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM transacoes {where}", params)
+        total = cursor.fetchone()[0]
+        cursor.execute(f"""
+        SELECT id, data, ativo, tipo, quantidade, preco_unitario, valor_total,
+               corretora, categoria, moeda, taxa_cambio, observacao, classe
+        FROM transacoes {where}
+        ORDER BY data DESC, id DESC
+        LIMIT ? OFFSET ?
+        """, params + [por_pagina, (max(pagina, 1) - 1) * por_pagina])
+        return cursor.fetchall(), total
+    except sqlite3.Error as e:
+        print(f"Erro ao consultar: {e}")
+        return [], 0
+    finally:
+        conn.close()
+
+# Funções da busca no extrato (índice FTS5 sobre ativo, observação, corretora e categoria)
+# O índice é uma tabela FTS5 de conteúdo externo: guarda só os termos e aponta para transacoes.id.
+# Gatilhos em transacoes mantêm o índice em dia; as linhas excluídas (excluido = 1) continuam
+# indexadas e saem no filtro da consulta, como no resto do extrato. Índice e gatilhos: migração 6 (migracoes.py).
+
+def _termos_busca(texto):
+    """Palavras do texto, em minúsculas e sem acento (igual ao tokenizador do índice)."""
+    sem_acento = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return re.findall(r"\w+", sem_acento.lower())
+
+def _expressao_fts(grupos):
+    """
+    Monta a expressão MATCH: cada grupo é uma lista de termos alternativos (OR), os grupos
+    precisam aparecer todos (AND) e cada termo vale como prefixo ("petr" acha PETR4).
+    """
+    return " AND ".join("(" + " OR ".join(f'"{termo}"*' for termo in grupo) + ")" for grupo in grupos)
+
+def _termos_aproximados(cursor, termos, limite=3, corte=0.7):
+    """Para cada termo, os termos do vocabulário do índice mais parecidos (erros de digitação)."""
+    vocabulario = [linha[0] for linha in cursor.execute("SELECT term FROM transacoes_busca_vocab")]
+    grupos = []
+    for termo in termos:
+        # O próprio termo fica: ele pode casar como prefixo mesmo sem estar no vocabulário
+        parecidos = difflib.get_close_matches(termo, vocabulario, n=limite, cutoff=corte)
+        grupos.append([termo] + [p for p in parecidos if p != termo])
+    return grupos
+
+def buscar_transacoes(texto="", pagina=1, por_pagina=50, data_inicio=None, data_fim=None, tipos=None, aproximada=True):
+    """
+    Busca no extrato por ativo, observação, corretora e categoria (prefixo: "petr" acha PETR4),
+    com filtros de data e tipo e paginação (mais recentes primeiro). Sem texto, só filtra.
+    Se a busca exata não acha nada e 'aproximada' for True, tenta de novo com os termos
+    do índice mais parecidos com os digitados ("itasa" -> itsa4).
+    Retorna (linhas na ordem de COLUNAS_DB, total de linhas do filtro, termos usados na busca aproximada ou []).
+    """
+    condicoes = ["t.excluido = 0"]
+    params = []
+    if data_inicio:
+        condicoes.append("t.data >= ?")
+        params.append(str(data_inicio))
+    if data_fim:
+        condicoes.append("t.data <= ?")
+        params.append(str(data_fim))
+    if tipos is not None:
+        condicoes.append(f"t.tipo IN ({', '.join('?' for _ in tipos)})")
+        params.extend(tipos)
+
+    def consultar(cursor, expressao):
+        filtro = list(condicoes)
+        valores = list(params)
+        if expressao:
+            filtro.append("t.id IN (SELECT rowid FROM transacoes_busca WHERE transacoes_busca MATCH ?)")
+            valores.append(expressao)
+        where = f"WHERE {' AND '.join(filtro)}"
+        total = cursor.execute(f"SELECT COUNT(*) FROM transacoes t {where}", valores).fetchone()[0]
+        if not total:
+            return [], 0
+        linhas = cursor.execute(f"""
+        SELECT t.id, t.data, t.ativo, t.tipo, t.quantidade, t.preco_unitario, t.valor_total,
+               t.corretora, t.categoria, t.moeda, t.taxa_cambio, t.observacao, t.classe
+        FROM transacoes t {where}
+        ORDER BY t.data DESC, t.id DESC
+        LIMIT ? OFFSET ?
+        """, valores + [por_pagina, (max(pagina, 1) - 1) * por_pagina]).fetchall()
+        return linhas, total
+
+    termos = _termos_busca(texto)
+    conn = conectar()
+    cursor = conn.cursor()
+    try:
+        linhas, total = consultar(cursor, _expressao_fts([[t] for t in termos]) if termos else None)
+        if total or not termos or not aproximada:
+            return linhas, total, []
+        grupos = _termos_aproximados(cursor, termos)
+        if all(len(grupo) == 1 for grupo in grupos):
+            return [], 0, []
+        linhas, total = consultar(cursor, _expressao_fts(grupos))
+        return linhas, total, [termo for grupo in grupos for termo in grupo[1:]]
+    except sqlite3.Error as e:
+        print(f"Erro ao buscar: {e}")
+        return [], 0, []
+    finally:
+        conn.close()
+
 def identificar_classe(categoria):
     """
     Recebe a categoria (ex: 'Ações', 'CDB') e retorna a Classe Macro.
@@ -140,6 +368,112 @@ def identificar_classe(categoria):
 
     return "Outros"
 
+# Funções de auditoria (log das transações, desfazer e refazer)
+
+COLUNAS_LOG = ["data", "ativo", "tipo", "quantidade", "preco_unitario", "valor_total", "corretora",
+               "categoria", "moeda", "taxa_cambio", "observacao", "classe", "excluido"]
+
+def _descartar_refazer(cursor):
+    """Uma ação nova do usuário esvazia a pilha de refazer."""
+    try:
+        cursor.execute("UPDATE transacoes_log SET estado = 'descartado' WHERE estado = 'desfeito'")
+    except sqlite3.OperationalError:
+        pass # Banco ainda sem log
+
+def _aplicar_estado(cursor, transacao_id, linha_json):
+    """Grava na transação o estado salvo no log (None = a transação não existia: exclui)."""
+    if linha_json is None:
+        cursor.execute("UPDATE transacoes SET excluido = 1 WHERE id = ?", (transacao_id,))
+        return
+    linha = json.loads(linha_json)
+    cursor.execute(
+        f"UPDATE transacoes SET {', '.join(f'{c} = ?' for c in COLUNAS_LOG)} WHERE id = ?",
+        [linha[c] for c in COLUNAS_LOG] + [transacao_id]
+    )
+
+def _mover_pilha(estado_origem, ordem, coluna_estado, estado_destino, origem):
+    """Desfaz (aplica 'antes') ou refaz (aplica 'depois') a ação do topo da pilha."""
+    conn = conectar()
+    cursor = conn.cursor()
+    try:
+        alvo = cursor.execute(f"""
+        SELECT id, transacao_id, operacao, {coluna_estado} FROM transacoes_log
+        WHERE origem = 'usuario' AND estado = ? AND operacao != 'PURGE'
+        ORDER BY id {ordem} LIMIT 1
+        """, (estado_origem,)).fetchone()
+        if not alvo:
+            return None
+        id_log, transacao_id, operacao, linha_json = alvo
+        ultimo_log = cursor.execute("SELECT MAX(id) FROM transacoes_log").fetchone()[0]
+
+        _aplicar_estado(cursor, transacao_id, linha_json)
+        # As linhas que o gatilho acabou de gravar não entram na pilha
+        cursor.execute("UPDATE transacoes_log SET origem = ? WHERE id > ?", (origem, ultimo_log))
+        cursor.execute("UPDATE transacoes_log SET estado = ? WHERE id = ?", (estado_destino, id_log))
+        conn.commit()
+        return transacao_id, operacao
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Erro ao {origem}: {e}")
+        return None
+    finally:
+        conn.close()
+
+def desfazer_ultima_acao():
+    """Desfaz a última ação do usuário. Retorna (transacao_id, operacao) ou None se a pilha está vazia."""
+    return _mover_pilha('ativo', 'DESC', 'antes', 'desfeito', 'desfazer')
+
+def refazer_acao():
+    """Refaz a última ação desfeita. Retorna (transacao_id, operacao) ou None."""
+    return _mover_pilha('desfeito', 'ASC', 'depois', 'ativo', 'refazer')
+
+def resumo_pilha():
+    """Retorna (ações que dá para desfazer, ações que dá para refazer)."""
+    conn = conectar()
+    try:
+        dados = dict(conn.execute("""
+        SELECT estado, COUNT(*) FROM transacoes_log
+        WHERE origem = 'usuario' AND operacao != 'PURGE' GROUP BY estado
+        """).fetchall())
+        return dados.get('ativo', 0), dados.get('desfeito', 0)
+    except sqlite3.OperationalError:
+        return 0, 0
+    finally:
+        conn.close()
+
+def listar_log(limite=100, transacao_id=None):
+    """Últimas entradas do log: [(id, momento, transacao_id, operacao, antes, depois, origem, estado), ...]."""
+    sql = "SELECT id, momento, transacao_id, operacao, antes, depois, origem, estado FROM transacoes_log"
+    params = []
+    if transacao_id is not None:
+        sql += " WHERE transacao_id = ?"
+        params.append(transacao_id)
+    conn = conectar()
+    dados = conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limite]).fetchall()
+    conn.close()
+    return dados
+
+def transacoes_alteradas(desde_log_id=None):
+    """
+    (último id do log, ids das transações escritas depois de 'desde_log_id', tickers dessas escritas).
+    Os tickers vêm do antes e do depois de cada escrita (uma edição pode trocar o ativo).
+    Com desde_log_id=None, só o último id (os conjuntos vêm vazios).
+    """
+    conn = conectar()
+    try:
+        ultimo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transacoes_log").fetchone()[0]
+        if desde_log_id is None:
+            return ultimo, set(), set()
+        linhas = conn.execute("""
+        SELECT transacao_id, json_extract(antes, '$.ativo'), json_extract(depois, '$.ativo')
+        FROM transacoes_log WHERE id > ? AND id <= ?
+        """, (desde_log_id, ultimo)).fetchall()
+    finally:
+        conn.close()
+    ids = {linha[0] for linha in linhas}
+    tickers = {ticker for linha in linhas for ticker in linha[1:] if ticker}
+    return ultimo, ids, tickers
+
 # Funções de backup
 
 def obter_caminho_db(nome_arquivo):
@@ -151,103 +485,201 @@ def obter_caminho_db(nome_arquivo):
     pasta_raiz = os.path.dirname(pasta_src)
     return os.path.join(pasta_raiz, 'db', nome_arquivo)
 
-def obter_arquivo_banco():
-    """Lê o arquivo binário do banco de dados para download."""
-    caminho_db = obter_caminho_db('maindata.db')
-    
-    if os.path.exists(caminho_db):
-        with open(caminho_db, 'rb') as f:
+def _nome_base_banco():
+    """Nome do arquivo da carteira ativa sem extensão ('maindata' na padrão)."""
+    return os.path.splitext(os.path.basename(caminho_banco()))[0]
+
+def _arquivo_log_backup():
+    """Cada carteira tem o próprio log (o da padrão continua sendo backup_log.json)."""
+    if carteira_atual() == CARTEIRA_PADRAO:
+        return obter_caminho_db('backup_log.json')
+    return obter_caminho_db(f'backup_log_{_nome_base_banco()}.json')
+
+def _ler_log_backup():
+    """Lê o backup_log.json (ou devolve um log vazio)."""
+    caminho_log = _arquivo_log_backup()
+    if os.path.exists(caminho_log):
+        try:
+            with open(caminho_log, 'r', encoding='utf-8') as f:
+                log = json.load(f)
+            log.setdefault("snapshots", [])
+            return log
+        except (OSError, ValueError):
+            pass
+    return {"snapshots": []}
+
+def _salvar_log_backup(log):
+    with open(_arquivo_log_backup(), 'w', encoding='utf-8') as f:
+        json.dump(log, f, indent=2)
+
+def criar_backup(manter=BACKUPS_MANTIDOS, paginas_por_passo=PAGINAS_POR_PASSO):
+    """
+    Cria um snapshot consistente do banco usando a API de backup do SQLite.
+    A cópia é feita em passos (sem travar quem está escrevendo), depois
+    comprimida em gzip dentro de db/backups. Mantém apenas os 'manter' mais recentes.
+    Retorna o caminho do snapshot.
+    """
+    pasta = obter_caminho_db('backups')
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{_nome_base_banco()}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db"
+    caminho_tmp = os.path.join(pasta, nome + '.tmp')
+    caminho_final = os.path.join(pasta, nome + '.gz')
+
+    origem = conectar()
+    destino = sqlite3.connect(caminho_tmp)
+    try:
+        # Se alguém escrever no meio, o SQLite reinicia a cópia: o resultado é sempre consistente
+        origem.backup(destino, pages=paginas_por_passo, sleep=0.005)
+    finally:
+        destino.close()
+        origem.close()
+
+    with open(caminho_tmp, 'rb') as f_in, gzip.open(caminho_final, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(caminho_tmp)
+
+    log = _ler_log_backup()
+    log["snapshots"].append({
+        "arquivo": os.path.basename(caminho_final),
+        "data": datetime.now().strftime("%d/%m/%Y às %H:%M:%S"),
+        "tamanho": os.path.getsize(caminho_final)
+    })
+    log["snapshots"] = _rotacionar_backups(log["snapshots"], pasta, manter)
+    _salvar_log_backup(log)
+    print(f"✅ Backup criado: {caminho_final}")
+    return caminho_final
+
+def _rotacionar_backups(snapshots, pasta, manter):
+    """Apaga os snapshots mais antigos, mantendo apenas os 'manter' últimos."""
+    excedentes = snapshots[:-manter] if manter > 0 else []
+    for item in excedentes:
+        caminho = os.path.join(pasta, item["arquivo"])
+        if os.path.exists(caminho):
+            os.remove(caminho)
+    return snapshots[len(excedentes):]
+
+def listar_backups():
+    """Retorna os snapshots registrados no backup_log.json (mais recente por último)."""
+    return _ler_log_backup()["snapshots"]
+
+def obter_arquivo_banco(caminho_snapshot=None):
+    """
+    Retorna os bytes (gzip) de um snapshot consistente para download.
+    Se nenhum snapshot for informado, cria um novo na hora.
+    """
+    caminho = caminho_snapshot or criar_backup()
+    if os.path.exists(caminho):
+        with open(caminho, 'rb') as f:
             return f.read()
     return None
 
 def registrar_data_backup():
-    """Salva a data e hora do backup na tabela de config."""
+    """Salva a data e hora do backup na tabela de config e no backup_log.json."""
     agora = datetime.now().strftime("%d/%m/%Y às %H:%M:%S")
     salvar_config("ultimo_backup", agora)
+    log = _ler_log_backup()
+    log["ultimo_backup"] = agora
+    _salvar_log_backup(log)
 
 # Funções para modificar variáveis
 
-def inicializar_tabela_config():
-    """Cria tabela e insere valores default se estiver vazia."""
-    conn = conectar()
-    cursor = conn.cursor()
-    
-    # 1. Cria a tabela
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS config (
-        chave TEXT PRIMARY KEY,
-        valor TEXT
-    )
-    """)
-    
-    # 2. SEED DATA: Verifica se já existem metas. Se não, insere as padrão.
-    cursor.execute("SELECT chave FROM config WHERE chave = 'meta_alocacao'")
-    existe = cursor.fetchone()
-    
-    if not existe:
-        print("Configuração inicial não encontrada. Criando metas padrão no banco...")
-        # Converte o dict para JSON (Texto)
-        valor_json = json.dumps(METAS_PADRAO)
-        cursor.execute("INSERT INTO config (chave, valor) VALUES (?, ?)", ('meta_alocacao', valor_json))
-        conn.commit()
-        
-    conn.close()
-    print("Tabela 'config' verificada com sucesso.")
+# A tabela config inteira fica em memória no processo. Cada leitura só confere a versão
+# 'config' (gatilhos da tabela versoes) numa conexão que fica aberta; se outra sessão ou
+# processo salvou algo, recarrega tudo de uma vez. salvar_config grava e atualiza a memória.
+_cache_config = {}     # { caminho do banco: {"conexao", "versao", "valores"} }
+_trava_config = threading.Lock()
+
+def _converter_config(chave, valor):
+    """Converte o valor lido do banco para o tipo do ESQUEMA_CONFIG (chaves fora do esquema ficam como estão)."""
+    if chave not in ESQUEMA_CONFIG or valor is None:
+        return valor
+    tipo, padrao = ESQUEMA_CONFIG[chave]
+    try:
+        if tipo is dict:
+            return {str(k): float(v) for k, v in dict(valor).items()}
+        return tipo(valor)
+    except (TypeError, ValueError):
+        print(f"❌ Configuração '{chave}' inválida ({valor!r}), usando o padrão.")
+        return padrao
+
+def _memoria_config():
+    """Memória de config da carteira ativa (uma conexão aberta por banco)."""
+    caminho = caminho_banco()
+    if caminho not in _cache_config:
+        _cache_config[caminho] = {
+            "conexao": sqlite3.connect(caminho, check_same_thread=False), "versao": None, "valores": {}
+        }
+    return _cache_config[caminho]
+
+def _versao_config(conn):
+    try:
+        # fetchall encerra o comando: a conexão aberta não fica segurando leitura no banco
+        resultado = conn.execute("SELECT versao FROM versoes WHERE escopo = 'config'").fetchall()
+        return resultado[0][0] if resultado else None
+    except sqlite3.OperationalError:
+        return None # Banco sem versionamento: recarrega sempre
+
+def _ler_todas_configs(conn):
+    valores = {}
+    try:
+        linhas = conn.execute("SELECT chave, valor FROM config").fetchall()
+    except sqlite3.OperationalError:
+        return valores # Tabela ainda não criada
+    for chave, valor_str in linhas:
+        try:
+            valor = json.loads(valor_str)
+        except (TypeError, ValueError):
+            valor = valor_str
+        valores[chave] = _converter_config(chave, valor)
+    return valores
 
 def salvar_config(chave, valor):
     """
     Salva uma configuração. 
     Se o valor for lista/dicionário, converte para texto (JSON) automaticamente.
+    A memória do processo é atualizada junto (write-through).
     """
     conn = conectar()
     cursor = conn.cursor()
 
-    if isinstance(valor, (dict, list)):
-        valor = json.dumps(valor)
+    valor_texto = json.dumps(valor) if isinstance(valor, (dict, list)) else str(valor)
     cursor.execute("""
     INSERT OR REPLACE INTO config (chave, valor) VALUES (?, ?)
-    """, (chave, str(valor)))
-    
+    """, (chave, valor_texto))
+    # Ainda dentro da transação: a versão lida é exatamente a desta escrita
+    versao = _versao_config(conn)
     conn.commit()
     conn.close()
 
+    with _trava_config:
+        memoria = _memoria_config()
+        if memoria["versao"] is not None and versao == memoria["versao"] + 1:
+            memoria["valores"][chave] = _converter_config(chave, valor)
+            memoria["versao"] = versao
+        else:
+            memoria["versao"] = None # Alguém mais escreveu no meio: recarrega na próxima leitura
+
 def ler_config(chave, valor_padrao=None):
     """
     Lê uma configuração. Tenta converter de volta para JSON se parecer um.
+    Chaves do ESQUEMA_CONFIG voltam no tipo certo (e com o padrão de lá, se não houver outro).
     """
-    conn = conectar()
-    cursor = conn.cursor()
-    cursor.execute("SELECT valor FROM config WHERE chave = ?", (chave,))
-    resultado = cursor.fetchone()
-    conn.close()
-    
-    if resultado:
-        valor_str = resultado[0]
-        try:
-            return json.loads(valor_str)
-        except:
-            return valor_str 
-            
-    return valor_padrao
+    if valor_padrao is None and chave in ESQUEMA_CONFIG:
+        valor_padrao = ESQUEMA_CONFIG[chave][1]
 
-# Funções de meta
+    with _trava_config:
+        memoria = _memoria_config()
+        versao = _versao_config(memoria["conexao"])
+        if versao is None or versao != memoria["versao"]:
+            memoria["valores"] = _ler_todas_configs(memoria["conexao"])
+            memoria["versao"] = versao
+        valor = memoria["valores"].get(chave)
 
-def inicializar_tabela_metas():
-    """Cria a tabela de metas se não existir."""
-    conn = conectar()
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS metas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        tipo TEXT NOT NULL,          -- Ex: 'Patrimônio Total', 'Categoria', 'Renda Passiva'
-        filtro TEXT,                 -- Ex: 'Renda Fixa', 'FII', ou vazio se for geral
-        valor_alvo REAL NOT NULL,
-        data_limite TEXT,            -- Opcional
-        descricao TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
+    valor = valor_padrao if valor is None else valor
+    # Cópia: quem alterar o dict devolvido não mexe na memória compartilhada
+    return dict(valor) if isinstance(valor, dict) else valor
+
+# Funções de meta
 
 def criar_meta(tipo, filtro, valor_alvo, data_limite, descricao):
     conn = conectar()
@@ -273,3 +705,477 @@ def excluir_meta(id_meta):
     cursor.execute("DELETE FROM metas WHERE id = ?", (id_meta,))
     conn.commit()
     conn.close()
+
+# Funções do histórico de rebalanceamentos
+# Cada cálculo do rebalanceador vira uma linha: metas, alocação da hora e operações sugeridas (JSON).
+# 'realizado_em' marca os que o usuário executou; o último deles é o "último rebalanceamento".
+
+def salvar_rebalanceamento(metas, alocacao, operacoes, aporte=0.0, cotacao_dolar=None, reserva=0.0, patrimonio=None):
+    """Grava um cálculo do rebalanceador e retorna o id."""
+    conn = conectar()
+    cursor = conn.execute("""
+    INSERT INTO rebalanceamentos (data, aporte, cotacao_dolar, reserva, patrimonio, metas, alocacao, operacoes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), aporte, cotacao_dolar, reserva, patrimonio,
+          json.dumps(metas, ensure_ascii=False), json.dumps(alocacao, ensure_ascii=False),
+          json.dumps(operacoes, ensure_ascii=False)))
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+def marcar_rebalanceamento_realizado(data_realizado, metas):
+    """
+    Marca o último cálculo ainda não realizado como realizado em 'data_realizado' (AAAA-MM-DD).
+    Sem cálculo pendente, grava um registro só com as metas. Retorna o id.
+    """
+    conn = conectar()
+    pendente = conn.execute("""
+    SELECT id FROM rebalanceamentos WHERE id = (SELECT MAX(id) FROM rebalanceamentos) AND realizado_em IS NULL
+    """).fetchone()
+    if pendente:
+        conn.execute("UPDATE rebalanceamentos SET realizado_em = ? WHERE id = ?", (data_realizado, pendente[0]))
+        id_rebal = pendente[0]
+    else:
+        id_rebal = conn.execute("""
+        INSERT INTO rebalanceamentos (data, metas, realizado_em) VALUES (?, ?, ?)
+        """, (f"{data_realizado} 00:00:00", json.dumps(metas, ensure_ascii=False), data_realizado)).lastrowid
+    conn.commit()
+    conn.close()
+    return id_rebal
+
+def listar_rebalanceamentos(limite=None, apenas_realizados=False):
+    """
+    Retorna [(id, data, aporte, cotacao_dolar, reserva, patrimonio, metas, alocacao, operacoes, realizado_em), ...],
+    do mais recente para o mais antigo, com metas/alocacao/operacoes já convertidos do JSON.
+    """
+    where = "WHERE realizado_em IS NOT NULL" if apenas_realizados else ""
+    ordem = "realizado_em DESC, id DESC" if apenas_realizados else "id DESC"
+    limite_sql = "LIMIT ?" if limite else ""
+    conn = conectar()
+    try:
+        linhas = conn.execute(f"""
+        SELECT id, data, aporte, cotacao_dolar, reserva, patrimonio, metas, alocacao, operacoes, realizado_em
+        FROM rebalanceamentos {where} ORDER BY {ordem} {limite_sql}
+        """, (limite,) if limite else ()).fetchall()
+    except sqlite3.OperationalError:
+        return []  # Banco ainda sem a tabela
+    finally:
+        conn.close()
+    return [(*linha[:6], json.loads(linha[6]), json.loads(linha[7]), json.loads(linha[8]), linha[9]) for linha in linhas]
+
+def ultimo_rebalanceamento():
+    """Data (AAAA-MM-DD) do último rebalanceamento marcado como realizado, ou None."""
+    realizados = listar_rebalanceamentos(limite=1, apenas_realizados=True)
+    return realizados[0][9] if realizados else None
+
+# Funções de renda fixa (séries do BCB e indexador de cada título)
+
+def salvar_serie_sgs(serie, linhas):
+    """Grava (ou atualiza) os pontos [(data, valor), ...] de uma série."""
+    conn = conectar()
+    conn.executemany(
+        "INSERT OR REPLACE INTO series_sgs (serie, data, valor) VALUES (?, ?, ?)",
+        [(serie, data, valor) for data, valor in linhas]
+    )
+    conn.commit()
+    conn.close()
+
+def ler_serie_sgs(serie):
+    """Retorna [(data, valor), ...] da série, em ordem de data."""
+    conn = conectar()
+    dados = conn.execute("SELECT data, valor FROM series_sgs WHERE serie = ? ORDER BY data", (serie,)).fetchall()
+    conn.close()
+    return dados
+
+def ultima_data_serie(serie):
+    """Última data gravada da série (ou None se ainda estiver vazia)."""
+    conn = conectar()
+    resultado = conn.execute("SELECT MAX(data) FROM series_sgs WHERE serie = ?", (serie,)).fetchone()
+    conn.close()
+    return resultado[0] if resultado else None
+
+def salvar_indexador(ativo, indexador, percentual=100.0, taxa=0.0):
+    conn = conectar()
+    conn.execute("""
+    INSERT OR REPLACE INTO indexadores_rf (ativo, indexador, percentual, taxa) VALUES (?, ?, ?, ?)
+    """, (ativo.upper(), indexador, percentual, taxa))
+    conn.commit()
+    conn.close()
+
+def excluir_indexador(ativo):
+    conn = conectar()
+    conn.execute("DELETE FROM indexadores_rf WHERE ativo = ?", (ativo,))
+    conn.commit()
+    conn.close()
+
+def listar_indexadores():
+    """Retorna { ativo: (indexador, percentual, taxa) }."""
+    conn = conectar()
+    dados = conn.execute("SELECT ativo, indexador, percentual, taxa FROM indexadores_rf").fetchall()
+    conn.close()
+    return {ativo: (indexador, percentual, taxa) for ativo, indexador, percentual, taxa in dados}
+
+# Funções do histórico de preços e do valor diário (tabela materializada)
+
+def salvar_precos(linhas):
+    """
+    Grava o histórico de fechamento [(ativo, data, fechamento), ...].
+    A versão 'precos' é incrementada uma vez por lote (e não por linha, como nos gatilhos).
+    """
+    if not linhas:
+        return
+    conn = conectar()
+    conn.executemany("INSERT OR REPLACE INTO precos_historicos (ativo, data, fechamento) VALUES (?, ?, ?)", linhas)
+    conn.execute("UPDATE versoes SET versao = versao + 1 WHERE escopo = 'precos'")
+    conn.commit()
+    conn.close()
+
+def ultimas_datas_precos():
+    """Retorna { ativo: última data com preço gravado }."""
+    conn = conectar()
+    dados = conn.execute("SELECT ativo, MAX(data) FROM precos_historicos GROUP BY ativo").fetchall()
+    conn.close()
+    return dict(dados)
+
+def ler_precos(ativos, data_inicio=None):
+    """Retorna [(ativo, data, fechamento), ...] dos ativos pedidos."""
+    if not ativos:
+        return []
+    marcadores = ', '.join('?' for _ in ativos)
+    sql = f"SELECT ativo, data, fechamento FROM precos_historicos WHERE ativo IN ({marcadores})"
+    params = list(ativos)
+    if data_inicio:
+        sql += " AND data >= ?"
+        params.append(str(data_inicio))
+    conn = conectar()
+    dados = conn.execute(sql + " ORDER BY data", params).fetchall()
+    conn.close()
+    return dados
+
+def ler_pendencias_valor_diario():
+    """Retorna { ativo: data_minima } dos ativos que precisam ser recalculados."""
+    conn = conectar()
+    dados = conn.execute("SELECT ativo, data_minima FROM valor_diario_pendente").fetchall()
+    conn.close()
+    return dict(dados)
+
+def marcar_valor_diario_pendente(ativos, data_minima='0000-00-00'):
+    """Força o recálculo dos ativos a partir de data_minima."""
+    conn = conectar()
+    conn.executemany("""
+    INSERT INTO valor_diario_pendente (ativo, data_minima) VALUES (?, ?)
+    ON CONFLICT(ativo) DO UPDATE SET data_minima = MIN(data_minima, excluded.data_minima)
+    """, [(ativo, data_minima) for ativo in ativos])
+    conn.commit()
+    conn.close()
+
+def gravar_valor_diario(pendencias, linhas):
+    """
+    Substitui o trecho recalculado de cada ativo (data >= data_minima) e limpa a pendência.
+    A pendência só é removida se não mudou durante o cálculo.
+    linhas: [(data, ativo, quantidade, custo, preco, valor), ...]
+    """
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM valor_diario WHERE ativo = ? AND data >= ?", list(pendencias.items()))
+        cursor.executemany("""
+        INSERT OR REPLACE INTO valor_diario (data, ativo, quantidade, custo, preco, valor)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """, linhas)
+        cursor.executemany("DELETE FROM valor_diario_pendente WHERE ativo = ? AND data_minima = ?", list(pendencias.items()))
+        cursor.execute("UPDATE versoes SET versao = versao + 1 WHERE escopo = 'valor_diario'")
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Erro ao gravar valor diário: {e}")
+    finally:
+        conn.close()
+
+def ultimo_dia_valor_diario():
+    """Retorna (última data, [ativos com posição nessa data]) da tabela valor_diario."""
+    conn = conectar()
+    ultima = conn.execute("SELECT MAX(data) FROM valor_diario").fetchone()[0]
+    ativos = [linha[0] for linha in conn.execute("SELECT ativo FROM valor_diario WHERE data = ?", (ultima,))]
+    conn.close()
+    return ultima, ativos
+
+def contar_valor_diario():
+    conn = conectar()
+    total = conn.execute("SELECT COUNT(*) FROM valor_diario").fetchone()[0]
+    conn.close()
+    return total
+
+def ler_valor_diario(data_inicio=None, data_fim=None, ativos=None):
+    """Retorna [(data, ativo, quantidade, custo, preco, valor), ...] em ordem de data."""
+    condicoes = []
+    params = []
+    if data_inicio:
+        condicoes.append("data >= ?")
+        params.append(str(data_inicio))
+    if data_fim:
+        condicoes.append("data <= ?")
+        params.append(str(data_fim))
+    if ativos:
+        condicoes.append(f"ativo IN ({', '.join('?' for _ in ativos)})")
+        params.extend(ativos)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    conn = conectar()
+    dados = conn.execute(f"""
+    SELECT data, ativo, quantidade, custo, preco, valor FROM valor_diario {where} ORDER BY data, ativo
+    """, params).fetchall()
+    conn.close()
+    return dados
+
+# Funções de eventos corporativos (desdobramento, grupamento e mudança de ticker)
+# Os gatilhos (migração 1) marcam só os ativos do evento no valor_diario_pendente, mas sobem a
+# versão de 'transacoes' e 'precos' de toda a carteira: o evento muda quantidades e tickers do
+# extrato ajustado lido por carregar_transacoes, do qual dependem todos os caches e snapshots da
+# carteira (posições, rentabilidade, IR). Eventos são raros, então a invalidação global é aceita.
+# A validação do extrato refaz apenas os ativos dos eventos (nucleo/validacao.py).
+
+def add_evento(data, ativo, tipo, fator=1.0, novo_ativo=None):
+    conn = conectar()
+    try:
+        conn.execute("""
+        INSERT INTO eventos_corporativos (data, ativo, tipo, fator, novo_ativo) VALUES (?, ?, ?, ?, ?)
+        """, (str(data), ativo.upper(), tipo, fator, novo_ativo.upper() if novo_ativo else None))
+        conn.commit()
+        print(f"✅ Evento de {ativo} registrado!")
+    except sqlite3.Error as e:
+        print(f"❌ Erro ao registrar evento: {e}")
+    finally:
+        conn.close()
+
+def excluir_evento(id_evento):
+    conn = conectar()
+    conn.execute("DELETE FROM eventos_corporativos WHERE id = ?", (id_evento,))
+    conn.commit()
+    conn.close()
+
+def listar_eventos():
+    """Retorna [(id, data, ativo, tipo, fator, novo_ativo), ...] em ordem de data."""
+    conn = conectar()
+    try:
+        return conn.execute("""
+        SELECT id, data, ativo, tipo, fator, novo_ativo FROM eventos_corporativos ORDER BY data, id
+        """).fetchall()
+    except sqlite3.OperationalError:
+        # Banco antigo, ainda sem a tabela
+        return []
+    finally:
+        conn.close()
+
+# Funções de versionamento (carimbo que muda a cada escrita, usado para invalidar caches)
+# A tabela versoes e os gatilhos por tabela são criados pelas migrações (migracoes.py).
+
+def obter_versao(escopo='transacoes'):
+    """Retorna a versão atual de uma tabela (0 se ainda não existir)."""
+    conn = conectar()
+    try:
+        resultado = conn.execute("SELECT versao FROM versoes WHERE escopo = ?", (escopo,)).fetchone()
+        return resultado[0] if resultado else 0
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+def obter_versoes():
+    """Retorna {escopo: versao} de todas as tabelas versionadas."""
+    conn = conectar()
+    try:
+        return dict(conn.execute("SELECT escopo, versao FROM versoes").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+# Funções das tarefas em segundo plano e dos snapshots (resultados guardados das tarefas)
+# As tarefas rodam em outros processos (tarefas.py): o progresso e o pedido de cancelamento
+# passam por estas tabelas, que todos os processos enxergam.
+
+def criar_tarefa(tipo, parametros="{}"):
+    """Registra uma tarefa pendente e retorna o id."""
+    conn = conectar()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO tarefas (tipo, parametros) VALUES (?, ?)", (tipo, parametros))
+    conn.commit()
+    id_tarefa = cursor.lastrowid
+    conn.close()
+    return id_tarefa
+
+def iniciar_tarefa(id_tarefa):
+    """Passa a tarefa de 'pendente' para 'executando'. Retorna False se ela foi cancelada antes."""
+    conn = conectar()
+    cursor = conn.cursor()
+    cursor.execute("""
+    UPDATE tarefas SET estado = 'executando', iniciada_em = datetime('now', 'localtime')
+    WHERE id = ? AND estado = 'pendente'
+    """, (id_tarefa,))
+    conn.commit()
+    iniciou = cursor.rowcount > 0
+    conn.close()
+    return iniciou
+
+def registrar_progresso(id_tarefa, progresso, mensagem=None):
+    """
+    Grava o progresso da tarefa e retorna True se o cancelamento foi pedido
+    (a própria tarefa decide onde parar).
+    """
+    conn = conectar()
+    conn.execute("UPDATE tarefas SET progresso = ?, mensagem = COALESCE(?, mensagem) WHERE id = ?",
+                 (float(progresso), mensagem, id_tarefa))
+    conn.commit()
+    estado = conn.execute("SELECT estado FROM tarefas WHERE id = ?", (id_tarefa,)).fetchall()
+    conn.close()
+    return bool(estado) and estado[0][0] == 'cancelando'
+
+def finalizar_tarefa(id_tarefa, estado, mensagem=None):
+    """Fecha a tarefa como 'concluida', 'cancelada' ou 'erro'."""
+    conn = conectar()
+    conn.execute("""
+    UPDATE tarefas SET estado = ?, mensagem = COALESCE(?, mensagem), concluida_em = datetime('now', 'localtime'),
+        progresso = CASE WHEN ? = 'concluida' THEN 1 ELSE progresso END
+    WHERE id = ?
+    """, (estado, mensagem, estado, id_tarefa))
+    conn.commit()
+    conn.close()
+
+def pedir_cancelamento(id_tarefa):
+    """
+    Cancela na hora a tarefa que ainda não começou; a que está rodando passa a 'cancelando'.
+    Retorna o novo estado (ou None se a tarefa já tinha terminado).
+    """
+    conn = conectar()
+    cursor = conn.cursor()
+    cursor.execute("""
+    UPDATE tarefas SET estado = 'cancelada', concluida_em = datetime('now', 'localtime')
+    WHERE id = ? AND estado = 'pendente'
+    """, (id_tarefa,))
+    novo_estado = 'cancelada' if cursor.rowcount else None
+    if not novo_estado:
+        cursor.execute("UPDATE tarefas SET estado = 'cancelando' WHERE id = ? AND estado = 'executando'", (id_tarefa,))
+        novo_estado = 'cancelando' if cursor.rowcount else None
+    conn.commit()
+    conn.close()
+    return novo_estado
+
+def marcar_tarefas_interrompidas():
+    """Fecha como 'erro' as tarefas que ficaram abertas (o processo que as rodava não existe mais)."""
+    conn = conectar()
+    try:
+        conn.execute("""
+        UPDATE tarefas SET estado = 'erro', mensagem = 'Interrompida (o servidor reiniciou).',
+            concluida_em = datetime('now', 'localtime')
+        WHERE estado IN ('pendente', 'executando', 'cancelando')
+        """)
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        conn.close()
+
+def listar_tarefas(limite=20, estados=None):
+    """Retorna [(id, tipo, parametros, estado, progresso, mensagem, criada_em, iniciada_em, concluida_em), ...]."""
+    sql = "SELECT id, tipo, parametros, estado, progresso, mensagem, criada_em, iniciada_em, concluida_em FROM tarefas"
+    params = []
+    if estados:
+        sql += f" WHERE estado IN ({', '.join('?' for _ in estados)})"
+        params.extend(estados)
+    conn = conectar()
+    try:
+        return conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limite]).fetchall()
+    except sqlite3.OperationalError:
+        # Banco ainda sem a tabela
+        return []
+    finally:
+        conn.close()
+
+def salvar_snapshot(tipo, chave, conteudo, versao_transacoes):
+    """Grava (ou substitui) o resultado JSON de uma tarefa, com a versão do extrato usada no cálculo."""
+    conn = conectar()
+    conn.execute("""
+    INSERT OR REPLACE INTO snapshots (tipo, chave, versao_transacoes, conteudo) VALUES (?, ?, ?, ?)
+    """, (tipo, str(chave), versao_transacoes, conteudo))
+    conn.commit()
+    conn.close()
+
+def ler_snapshot(tipo, chave=''):
+    """Retorna (versao_transacoes, gerado_em, conteudo) ou None."""
+    conn = conectar()
+    try:
+        dados = conn.execute("""
+        SELECT versao_transacoes, gerado_em, conteudo FROM snapshots WHERE tipo = ? AND chave = ?
+        """, (tipo, str(chave))).fetchall()
+        return dados[0] if dados else None
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+# Funções do cache persistente de dados de mercado (cotações, notícias e execuções do agendador)
+# O agendador.py enche estas tabelas fora do carregamento da página; o app só lê daqui.
+
+def _agora_utc():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def salvar_cotacoes(cotacoes):
+    """Grava {ativo: preço} e incrementa a versão 'cotacoes' (uma vez por lote)."""
+    if not cotacoes:
+        return
+    agora = _agora_utc()
+    conn = conectar()
+    conn.executemany("INSERT OR REPLACE INTO cotacoes_cache (ativo, preco, atualizado_em) VALUES (?, ?, ?)",
+                     [(ativo, float(preco), agora) for ativo, preco in cotacoes.items()])
+    conn.execute("UPDATE versoes SET versao = versao + 1 WHERE escopo = 'cotacoes'")
+    conn.commit()
+    conn.close()
+
+def ler_cotacoes(ativos):
+    """Retorna {ativo: preço} das cotações guardadas (só dos ativos pedidos)."""
+    if not ativos:
+        return {}
+    conn = conectar()
+    try:
+        return dict(conn.execute(f"""
+        SELECT ativo, preco FROM cotacoes_cache WHERE ativo IN ({', '.join('?' for _ in ativos)})
+        """, list(ativos)).fetchall())
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+def salvar_detalhes_ativo(ativo, detalhes):
+    conn = conectar()
+    conn.execute("INSERT OR REPLACE INTO detalhes_ativos (ativo, conteudo, atualizado_em) VALUES (?, ?, ?)",
+                 (ativo, json.dumps(detalhes, default=str), _agora_utc()))
+    conn.commit()
+    conn.close()
+
+def ler_detalhes_ativo(ativo):
+    """Retorna o dict de detalhes/notícias guardado do ativo, ou None."""
+    conn = conectar()
+    try:
+        dados = conn.execute("SELECT conteudo FROM detalhes_ativos WHERE ativo = ?", (ativo,)).fetchall()
+        return json.loads(dados[0][0]) if dados else None
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+def registrar_execucao_agendador(tarefa, momento=None):
+    conn = conectar()
+    conn.execute("INSERT OR REPLACE INTO agendador_execucoes (tarefa, ultima_execucao) VALUES (?, ?)",
+                 (tarefa, momento or _agora_utc()))
+    conn.commit()
+    conn.close()
+
+def ler_execucoes_agendador():
+    """Retorna {tarefa: última execução (ISO, UTC)}."""
+    conn = conectar()
+    try:
+        return dict(conn.execute("SELECT tarefa, ultima_execucao FROM agendador_execucoes").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
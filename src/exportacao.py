@@ -0,0 +1,295 @@
+import argparse
+import csv
+import sys
+
+from constants import *
+from database import conectar
+
+# Exportação em streaming do extrato e dos relatórios derivados.
+# Tudo é lido do SQLite em lotes (fetchmany), então a memória fica estável
+# independente do tamanho do histórico. Não depende do Streamlit, pode rodar no cron.
+
+TAMANHO_LOTE = 5000
+
+TIPOS_PROVENTO = ['Dividendo', 'JCP', 'Bonificacao']
+
+# Funções de filtro e leitura
+
+def _montar_filtros(data_inicio=None, data_fim=None, ativos=None):
+    """
+    Monta o WHERE (e os parâmetros) para os filtros de data e ativos.
+    As datas vêm no formato do banco (AAAA-MM-DD).
+    """
+    condicoes = ["excluido = 0"]   # Transações excluídas (exclusão lógica) não entram
+    params = []
+    if data_inicio:
+        condicoes.append("data >= ?")
+        params.append(str(data_inicio))
+    if data_fim:
+        # Datas podem ter hora no banco, então compara só o dia
+        condicoes.append("substr(data, 1, 10) <= ?")
+        params.append(str(data_fim))
+    if ativos:
+        ativos = [a.upper() for a in ativos]
+        condicoes.append(f"ativo IN ({', '.join('?' for _ in ativos)})")
+        params.extend(ativos)
+
+    where = f"WHERE {' AND '.join(condicoes)}"
+    return where, params
+
+def _ler_em_lotes(cursor, tamanho_lote):
+    """Gera listas de linhas do cursor, no máximo tamanho_lote por vez."""
+    while True:
+        lote = cursor.fetchmany(tamanho_lote)
+        if not lote:
+            break
+        yield lote
+
+def _iterar_fluxo(data_fim=None, ativos=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Percorre as transações em ordem cronológica, linha a linha.
+    Usado pelos relatórios que precisam reconstruir o preço médio.
+    """
+    where, params = _montar_filtros(None, data_fim, ativos)
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT data, ativo, tipo, quantidade, valor_total
+        FROM transacoes {where}
+        ORDER BY data, id
+        """, params)
+        for lote in _ler_em_lotes(cursor, tamanho_lote):
+            yield from lote
+    finally:
+        conn.close()
+
+def _aplicar_movimento(carteira, ativo, tipo, qtd, total):
+    """
+    Aplica uma transação na carteira (mesma regra de preço médio do _processar_fluxo_caixa).
+    Retorna o valor que conta como aporte no mês.
+    """
+    qtd = qtd or 0.0
+    total = total or 0.0
+    dados = carteira.setdefault(ativo, [0.0, 0.0])   # [qtd, custo_total]
+
+    if tipo in TIPOS_ENTRADA:
+        dados[0] += qtd
+        dados[1] += total
+        return total if tipo in ['Compra', 'Aporte'] else 0.0
+
+    if tipo in TIPOS_SAIDA:
+        if dados[0] > 0:
+            pm = dados[1] / dados[0]
+            dados[0] -= qtd
+            dados[1] -= pm * qtd
+        return -total if tipo == 'Resgate' else 0.0
+
+    return 0.0
+
+# Relatórios (cada um é um gerador de lotes de tuplas)
+
+def iterar_transacoes(data_inicio=None, data_fim=None, ativos=None, tamanho_lote=TAMANHO_LOTE):
+    """Extrato bruto da tabela transacoes, em lotes."""
+    where, params = _montar_filtros(data_inicio, data_fim, ativos)
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT id, data, ativo, tipo, quantidade, preco_unitario, valor_total,
+               corretora, categoria, moeda, taxa_cambio, observacao, classe
+        FROM transacoes {where}
+        ORDER BY data, id
+        """, params)
+        yield from _ler_em_lotes(cursor, tamanho_lote)
+    finally:
+        conn.close()
+
+def iterar_posicoes(data_inicio=None, data_fim=None, ativos=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Posição (Qtd, PM e Custo) de cada ativo na data_fim.
+    A posição é sempre acumulada desde o início, então data_inicio é ignorada.
+    Só a carteira (um item por ativo) fica em memória.
+    """
+    carteira = {}
+    for data, ativo, tipo, qtd, total in _iterar_fluxo(data_fim, ativos, tamanho_lote):
+        _aplicar_movimento(carteira, ativo, tipo, qtd, total)
+
+    lote = []
+    for ativo in sorted(carteira):
+        qtd, custo = carteira[ativo]
+        if qtd > 0.000001:
+            lote.append((ativo, qtd, custo / qtd, custo))
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+    if lote:
+        yield lote
+
+def iterar_proventos(data_inicio=None, data_fim=None, ativos=None, tamanho_lote=TAMANHO_LOTE):
+    """Soma de proventos por mês, ativo e tipo (agrupado direto no SQLite)."""
+    where, params = _montar_filtros(data_inicio, data_fim, ativos)
+    filtro_tipo = f"tipo IN ({', '.join('?' for _ in TIPOS_PROVENTO)})"
+    where = f"{where} AND {filtro_tipo}"
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT substr(data, 1, 7) AS mes, ativo, tipo, SUM(valor_total), COUNT(*)
+        FROM transacoes {where}
+        GROUP BY mes, ativo, tipo
+        ORDER BY mes, ativo, tipo
+        """, params + TIPOS_PROVENTO)
+        yield from _ler_em_lotes(cursor, tamanho_lote)
+    finally:
+        conn.close()
+
+def _proximo_mes(mes):
+    ano, m = int(mes[:4]), int(mes[5:7])
+    ano, m = (ano + 1, 1) if m == 12 else (ano, m + 1)
+    return f"{ano:04d}-{m:02d}"
+
+def iterar_serie_mensal(data_inicio=None, data_fim=None, ativos=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Série mensal de aportes e total investido (custo), igual ao gráfico de evolução.
+    Meses sem movimento repetem o acumulado com aporte zero.
+    """
+    mes_inicio = str(data_inicio)[:7] if data_inicio else None
+    carteira = {}
+    custo_total = 0.0
+    mes_atual = None
+    aporte_mes = 0.0
+    lote = []
+
+    def fechar_mes(mes, aporte):
+        if mes_inicio is None or mes >= mes_inicio:
+            lote.append((mes, aporte, custo_total))
+
+    for data, ativo, tipo, qtd, total in _iterar_fluxo(data_fim, ativos, tamanho_lote):
+        mes = str(data)[:7]
+        if mes != mes_atual:
+            if mes_atual is not None:
+                fechar_mes(mes_atual, aporte_mes)
+                # Preenche os meses sem transações
+                vazio = _proximo_mes(mes_atual)
+                while vazio < mes:
+                    fechar_mes(vazio, 0.0)
+                    vazio = _proximo_mes(vazio)
+            mes_atual = mes
+            aporte_mes = 0.0
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+
+        custo_antes = carteira.get(ativo, [0.0, 0.0])[1]
+        aporte_mes += _aplicar_movimento(carteira, ativo, tipo, qtd, total)
+        custo_total += carteira[ativo][1] - custo_antes
+
+    if mes_atual is not None:
+        fechar_mes(mes_atual, aporte_mes)
+    if lote:
+        yield lote
+
+# Cabeçalho, tipos (para o Parquet) e gerador de cada relatório
+RELATORIOS = {
+    "transacoes": (
+        [("ID", "inteiro"), ("Data", "texto"), ("Ativo", "texto"), ("Tipo", "texto"),
+         ("Qtd", "real"), ("Preço", "real"), ("Total", "real"), ("Corretora", "texto"),
+         ("Categoria", "texto"), ("Moeda", "texto"), ("Cambio", "real"), ("Obs", "texto"),
+         ("Classe", "texto")],
+        iterar_transacoes,
+    ),
+    "posicoes": (
+        [("Ativo", "texto"), ("Quantidade", "real"), ("Preço Médio", "real"), ("Total Investido", "real")],
+        iterar_posicoes,
+    ),
+    "proventos": (
+        [("Mês", "texto"), ("Ativo", "texto"), ("Tipo", "texto"), ("Total", "real"), ("Lançamentos", "inteiro")],
+        iterar_proventos,
+    ),
+    "mensal": (
+        [("Mês", "texto"), ("Aporte Mensal", "real"), ("Total Investido", "real")],
+        iterar_serie_mensal,
+    ),
+}
+
+# Funções de escrita
+
+def exportar_csv(relatorio, destino, data_inicio=None, data_fim=None, ativos=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Escreve o relatório em CSV, lote a lote.
+    destino pode ser um caminho ou um arquivo já aberto (ex: sys.stdout).
+    Retorna a quantidade de linhas escritas.
+    """
+    colunas, gerador = RELATORIOS[relatorio]
+    abriu = isinstance(destino, str)
+    arquivo = open(destino, 'w', newline='', encoding='utf-8') if abriu else destino
+    linhas = 0
+    try:
+        writer = csv.writer(arquivo)
+        writer.writerow([nome for nome, _ in colunas])
+        for lote in gerador(data_inicio, data_fim, ativos, tamanho_lote):
+            writer.writerows(lote)
+            linhas += len(lote)
+    finally:
+        if abriu:
+            arquivo.close()
+    return linhas
+
+def exportar_parquet(relatorio, destino, data_inicio=None, data_fim=None, ativos=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Escreve o relatório em Parquet, um row group por lote.
+    Retorna a quantidade de linhas escritas.
+    """
+    # Import aqui dentro: pyarrow só é necessário para quem exporta Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos_arrow = {"texto": pa.string(), "real": pa.float64(), "inteiro": pa.int64()}
+    colunas, gerador = RELATORIOS[relatorio]
+    schema = pa.schema([(nome, tipos_arrow[tipo]) for nome, tipo in colunas])
+
+    linhas = 0
+    with pq.ParquetWriter(destino, schema) as writer:
+        for lote in gerador(data_inicio, data_fim, ativos, tamanho_lote):
+            arrays = [
+                pa.array([str(v) if v is not None and campo.type == pa.string() else v for v in valores], type=campo.type)
+                for valores, campo in zip(zip(*lote), schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            linhas += len(lote)
+    return linhas
+
+def exportar(relatorio, destino, formato="csv", **filtros):
+    """Atalho que escolhe o escritor pelo formato ('csv' ou 'parquet')."""
+    if formato == "parquet":
+        return exportar_parquet(relatorio, destino, **filtros)
+    return exportar_csv(relatorio, destino, **filtros)
+
+# Linha de comando (para rodar no cron sem o Streamlit)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta o extrato e relatórios do maindata.db.")
+    parser.add_argument("relatorio", choices=sorted(RELATORIOS))
+    parser.add_argument("-f", "--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("-o", "--saida", help="Arquivo de saída (padrão: stdout, apenas CSV)")
+    parser.add_argument("--inicio", help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--fim", help="Data final (AAAA-MM-DD)")
+    parser.add_argument("-a", "--ativo", action="append", help="Filtra por ativo (pode repetir)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="Linhas lidas por vez do banco")
+    args = parser.parse_args(argv)
+
+    if args.formato == "parquet" and not args.saida:
+        parser.error("Para Parquet informe o arquivo de saída com -o.")
+
+    from migracoes import migrar
+    migrar()
+
+    linhas = exportar(
+        args.relatorio, args.saida or sys.stdout, args.formato,
+        data_inicio=args.inicio, data_fim=args.fim, ativos=args.ativo, tamanho_lote=args.lote
+    )
+    print(f"✅ {linhas} linhas exportadas ({args.relatorio}).", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from constants import *
+
+# Camada de dados dos gráficos (sem Streamlit)
+# As séries longas são reduzidas no servidor antes de virar figura: período curto usa LTTB
+# (mantém picos e vales com poucos pontos), período longo agrega por semana/mês.
+# Quando a figura ainda tem muitos pontos, as linhas saem em WebGL (Scattergl).
+# As figuras prontas são guardadas em JSON pelo utils.py, com a versão dos dados na chave.
+
+MARGEM_PADRAO = dict(t=20, b=20, l=20, r=20)
+
+# Funções de redução das séries
+
+def lttb(x, y, n_pontos):
+    """
+    Largest-Triangle-Three-Buckets: escolhe n_pontos de (x, y) preservando a forma da curva.
+    x precisa ser numérico e crescente. Retorna os índices escolhidos.
+    """
+    total = len(y)
+    if n_pontos >= total or n_pontos < 3:
+        return np.arange(total)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Baldes entre o primeiro e o último ponto (que sempre ficam)
+    limites = np.linspace(1, total - 1, n_pontos - 1).astype(np.int64)
+    escolhidos = np.empty(n_pontos, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, total - 1
+
+    anterior = 0
+    for i in range(n_pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        # Média do próximo balde (ou o último ponto, no fim)
+        prox_fim = limites[i + 2] if i + 2 < len(limites) else total
+        media_x = x[fim:prox_fim].mean() if prox_fim > fim else x[-1]
+        media_y = y[fim:prox_fim].mean() if prox_fim > fim else y[-1]
+        # Área do triângulo (ponto anterior, candidato, média do próximo balde), vetorizada no balde
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+def regra_agregacao(inicio, fim):
+    """Como reduzir uma série diária pelo tamanho do período visível: None (LTTB), 'W' ou 'ME'."""
+    dias = (pd.Timestamp(fim) - pd.Timestamp(inicio)).days
+    if dias <= DIAS_LTTB:
+        return None
+    return 'W' if dias <= DIAS_AGREGACAO_SEMANAL else 'ME'
+
+def reduzir_serie(serie, max_pontos=MAX_PONTOS_GRAFICO):
+    """
+    Reduz uma série indexada por data para no máximo ~max_pontos.
+    O método sai do intervalo visível (ver regra_agregacao); a agregação usa o último valor do período.
+    """
+    serie = serie.dropna()
+    if len(serie) <= max_pontos:
+        return serie
+    regra = regra_agregacao(serie.index[0], serie.index[-1])
+    if regra:
+        serie = serie.resample(regra).last().dropna()
+        if len(serie) <= max_pontos:
+            return serie
+    x = serie.index.asi8 if isinstance(serie.index, pd.DatetimeIndex) else np.arange(len(serie))
+    return serie.iloc[lttb(x, serie.to_numpy(), max_pontos)]
+
+def recortar_periodo(dados, periodo, hoje=None):
+    """Filtra Series/DataFrame indexados por data para o período escolhido (chave de PERIODOS_GRAFICO)."""
+    dias = PERIODOS_GRAFICO.get(periodo)
+    if dias is None or len(dados) == 0:
+        return dados
+    inicio = pd.Timestamp(hoje or pd.Timestamp.now()).normalize() - pd.Timedelta(days=dias)
+    return dados[dados.index >= inicio]
+
+def intervalo_ticks(inicio, fim):
+    """Espaçamento dos rótulos do eixo X: mensal só em períodos curtos."""
+    meses = (pd.Timestamp(fim).year - pd.Timestamp(inicio).year) * 12 + pd.Timestamp(fim).month - pd.Timestamp(inicio).month
+    if meses <= 12:
+        return "M1"
+    if meses <= 36:
+        return "M3"
+    return "M6" if meses <= 96 else "M12"
+
+def _linha(x, y, quantidade_pontos, **kwargs):
+    """Scatter comum ou Scattergl (WebGL) conforme o total de pontos da figura."""
+    classe = go.Scattergl if quantidade_pontos > LIMITE_WEBGL else go.Scatter
+    return classe(x=x, y=y, **kwargs)
+
+# Funções que montam as figuras
+
+def figura_pizza(df, valores, nomes, cores, legenda_lateral=False):
+    """Rosca de alocação com o layout padrão do dashboard (go.Pie: o plotly.express não é importado)."""
+    fig = go.Figure(go.Pie(
+        labels=df[nomes], values=df[valores], hole=0.5, marker=dict(colors=list(cores)),
+        hovertemplate=f"{nomes}=%{{label}}<br>{valores}=%{{value}}<extra></extra>"
+    ))
+    if legenda_lateral:
+        fig.update_layout(
+            showlegend=True,
+            margin=dict(t=20, b=20, l=0, r=0),
+            legend=dict(orientation="v", yanchor="top", y=1, xanchor="left", x=1.05)
+        )
+    else:
+        fig.update_layout(margin=MARGEM_PADRAO)
+    return fig
+
+def figura_evolucao(df_sorted, df_diario, df_bench, periodo="Tudo", cores_bench=None, hoje=None):
+    """
+    Gráfico de evolução: aporte mensal (barras), custo acumulado, valor de mercado diário
+    e os benchmarks, recortados no período e com as séries diárias reduzidas.
+    """
+    from nucleo.evolucao import calcular_evolucao_patrimonial, montar_intervalo_meses
+
+    eixo_datas, eixo_aportes, eixo_acumulado = calcular_evolucao_patrimonial(df_sorted, montar_intervalo_meses(df_sorted))
+    mensal = pd.DataFrame({'Aporte': eixo_aportes, 'Custo': eixo_acumulado}, index=pd.DatetimeIndex(eixo_datas))
+    mensal = recortar_periodo(mensal, periodo, hoje)
+
+    # nome da linha -> (série reduzida, estilo)
+    diarias = {}
+    if not df_diario.empty:
+        diarias['Valor de Mercado (Diário)'] = (
+            reduzir_serie(recortar_periodo(df_diario['Valor'], periodo, hoje)), dict(color='#f1ab4e', width=2)
+        )
+        for nome in df_bench.columns:
+            diarias[f'Se fosse {nome}'] = (
+                reduzir_serie(recortar_periodo(df_bench[nome], periodo, hoje)),
+                dict(color=(cores_bench or {}).get(nome), width=1.5, dash='dot')
+            )
+    series = [serie for serie, _ in diarias.values()]
+    pontos = sum(len(serie) for serie in series)
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=mensal.index, y=mensal['Aporte'], name='Aporte Mensal', marker_color='#114c0e'))
+    fig.add_trace(go.Scatter(
+        x=mensal.index, y=mensal['Custo'], name='Total Investido (Custo)',
+        mode='lines+markers', line=dict(color='#447a37', width=3)
+    ))
+    for nome, (serie, estilo) in diarias.items():
+        fig.add_trace(_linha(serie.index, serie.to_numpy(), pontos, name=nome, mode='lines', line=estilo))
+
+    inicios = [s.index.min() for s in [mensal, *series] if len(s)]
+    fins = [s.index.max() for s in [mensal, *series] if len(s)]
+    dtick = intervalo_ticks(min(inicios), max(fins)) if inicios else "M1"
+    fig.update_layout(
+        hovermode="x unified",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=MARGEM_PADRAO,
+        xaxis=dict(tickformat="%b/%Y", dtick=dtick)
+    )
+    return fig
+
+def figura_linhas(df, titulo_y="%", cores=None, area=False, mostrar_legenda=True):
+    """Linhas (ou área) de um DataFrame datas x colunas, cada coluna reduzida separadamente."""
+    series = {coluna: reduzir_serie(df[coluna]) for coluna in df.columns}
+    pontos = sum(len(s) for s in series.values())
+    fig = go.Figure()
+    for i, (coluna, serie) in enumerate(series.items()):
+        cor = cores[i % len(cores)] if cores else None
+        extra = dict(fill='tozeroy') if area else {}
+        fig.add_trace(_linha(serie.index, serie.to_numpy(), pontos, name=str(coluna), mode='lines',
+                             line=dict(color=cor), **extra))
+    fig.update_layout(
+        hovermode="x unified", showlegend=mostrar_legenda, margin=MARGEM_PADRAO,
+        yaxis_title=titulo_y, legend_title_text="Grupo"
+    )
+    return fig
+
+def figura_projecao(percentis):
+    """Leque do patrimônio projetado pelo Monte Carlo: faixa P10-P90 e a mediana."""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=percentis.index, y=percentis['P90'], name='P90', mode='lines',
+                             line=dict(width=0, color='#447a37')))
+    fig.add_trace(go.Scatter(x=percentis.index, y=percentis['P10'], name='P10', mode='lines', fill='tonexty',
+                             fillcolor='rgba(68, 122, 55, 0.25)', line=dict(width=0, color='#447a37')))
+    fig.add_trace(go.Scatter(x=percentis.index, y=percentis['P50'], name='Mediana', mode='lines',
+                             line=dict(color='#114c0e', width=2)))
+    fig.update_layout(hovermode="x unified", margin=MARGEM_PADRAO, yaxis_title="R$",
+                      legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    return fig
+
+def figura_calendario_proventos(projecao):
+    """Mapa de calor ativo x mês dos proventos projetados, com a linha 'Total' por cima."""
+    tabela = projecao.pivot_table(index='Ativo', columns='Mês', values='Valor', aggfunc='sum').fillna(0.0)
+    tabela = tabela.loc[tabela.sum(axis=1).sort_values().index]
+    tabela.loc['Total'] = tabela.sum()
+    meses = [pd.Timestamp(m).strftime('%b/%y') for m in tabela.columns]
+    fig = go.Figure(go.Heatmap(
+        z=tabela.to_numpy(), x=meses, y=tabela.index.tolist(),
+        colorscale=[[0, '#f4f7f3'], [1, '#114c0e']], hoverongaps=False,
+        text=[[f"R$ {v:,.0f}" if v else "" for v in linha] for linha in tabela.to_numpy()],
+        texttemplate="%{text}", hovertemplate="%{y} · %{x}: R$ %{z:,.2f}<extra></extra>",
+        showscale=False
+    ))
+    fig.update_layout(margin=MARGEM_PADRAO, height=max(250, 28 * len(tabela) + 80), xaxis=dict(side='top'))
+    return fig
+
+def figura_correlacao(correlacao):
+    """Mapa de calor da matriz de correlação (-1 a 1), com a 1ª linha em cima como no px.imshow."""
+    fig = go.Figure(go.Heatmap(
+        z=correlacao.to_numpy(), x=correlacao.columns.tolist(), y=correlacao.index.tolist(),
+        zmin=-1, zmax=1, colorscale='RdBu_r'
+    ))
+    fig.update_layout(margin=MARGEM_PADRAO, yaxis=dict(autorange='reversed'))
+    return fig
+
+def figura_simulacao_vendas(matriz, fracoes, choques, rotulo):
+    """Mapa de calor fração vendida (linhas) x choque de preço (colunas) de uma métrica do simulador de vendas."""
+    x = [f"{c * 100:+.0f}%" for c in choques]
+    y = [f"{f * 100:.0f}%" for f in fracoes]
+    fig = go.Figure(go.Heatmap(
+        z=matriz, x=x, y=y, colorscale=[[0, '#f4f7f3'], [1, '#114c0e']],
+        hovertemplate=f"Vender %{{y}} com preço %{{x}}<br>{rotulo}: R$ %{{z:,.2f}}<extra></extra>",
+        colorbar=dict(title="R$")
+    ))
+    fig.update_layout(margin=MARGEM_PADRAO, height=max(300, 22 * len(y) + 120),
+                      xaxis_title="Choque no preço", yaxis_title="Fração vendida")
+    return fig
+
+def figura_desvio_alocacao(desvio, limite_pp, datas_realizadas=()):
+    """Desvio das metas (p.p.) por categoria ao longo do tempo, com a faixa de tolerância e os rebalanceamentos realizados."""
+    fig = figura_linhas(desvio, titulo_y="Desvio da meta (p.p.)")
+    fig.add_hrect(y0=-limite_pp, y1=limite_pp, fillcolor='#114c0e', opacity=0.08, line_width=0)
+    fig.add_hline(y=0, line=dict(color='#888888', width=1))
+    for data in datas_realizadas:
+        fig.add_vline(x=data, line=dict(color='#4222d7', width=1, dash='dot'))
+    fig.update_layout(legend_title_text="Categoria")
+    return fig
@@ -0,0 +1,458 @@
+import sqlite3
+import sys
+
+import database
+
+# Migrações do esquema do maindata.db
+# A versão do esquema fica no próprio arquivo (PRAGMA user_version). Cada migração roda uma vez
+# por banco, em ordem, e a versão é gravada logo depois. No processo, o caminho do banco já migrado
+# fica guardado: os reruns do Streamlit não fazem nenhum DDL (nem abrem conexão).
+# Para mudar o esquema, acrescente uma função no fim de MIGRACOES (nunca edite uma que já saiu).
+# Por isso o SQL de cada migração fica escrito aqui, por extenso: nada de constantes ou funções de
+# outros módulos, que podem mudar depois. Um banco novo passa sempre pelos mesmos passos.
+
+_bancos_migrados = set()
+
+def _adicionar_coluna(conn, tabela, coluna, definicao):
+    """ALTER TABLE ... ADD COLUMN só se a coluna ainda não existir (bancos de antes das migrações)."""
+    colunas = {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+    if coluna not in colunas:
+        conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+
+def _gatilhos_versao(conn, tabelas):
+    """Linha em 'versoes' e gatilhos de INSERT/UPDATE/DELETE que incrementam a versão de cada tabela."""
+    for tabela in tabelas:
+        conn.execute("INSERT OR IGNORE INTO versoes (escopo, versao) VALUES (?, 0)", (tabela,))
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_versao_{tabela}_{evento.lower()}
+            AFTER {evento} ON {tabela}
+            BEGIN
+                UPDATE versoes SET versao = versao + 1 WHERE escopo = '{tabela}';
+            END
+            """)
+
+# Migrações (o número de cada uma é a posição na lista, começando em 1)
+
+# Linha de transacoes em JSON, gravada no transacoes_log (colunas de quando a migração 1 saiu)
+_JSON_LOG = ("json_object('data', {p}.data, 'ativo', {p}.ativo, 'tipo', {p}.tipo, 'quantidade', {p}.quantidade, "
+             "'preco_unitario', {p}.preco_unitario, 'valor_total', {p}.valor_total, 'corretora', {p}.corretora, "
+             "'categoria', {p}.categoria, 'moeda', {p}.moeda, 'taxa_cambio', {p}.taxa_cambio, "
+             "'observacao', {p}.observacao, 'classe', {p}.classe, 'excluido', {p}.excluido)")
+
+def _m001_esquema_base(conn):
+    """Tabelas e gatilhos que antes eram criados a cada rerun pelos inicializar_* do database.py."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS transacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        ativo TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        quantidade REAL,
+        preco_unitario REAL,
+        valor_total REAL NOT NULL,
+        corretora TEXT NOT NULL,
+        moeda TEXT DEFAULT 'BRL',
+        taxa_cambio REAL DEFAULT 1.0,
+        observacao TEXT,
+        categoria TEXT DEFAULT 'Outros',
+        classe TEXT,
+        excluido INTEGER NOT NULL DEFAULT 0,   -- Exclusão lógica: a linha fica no banco e no log
+        
+        CHECK(tipo IN (
+            'Compra', 'Venda', 'Dividendo', 'JCP', 'Taxa', 'Bonificacao', 'Cambio',
+            'Aporte', 'Resgate', 'Reinvestimento'
+        ))
+    );
+    """)
+    # Bancos antigos: a tabela já existia sem estas colunas
+    _adicionar_coluna(conn, "transacoes", "classe", "TEXT")
+    _adicionar_coluna(conn, "transacoes", "excluido", "INTEGER NOT NULL DEFAULT 0")
+
+    # Auditoria: log somente inclusão com o antes/depois de cada escrita em transacoes.
+    # A pilha de desfazer/refazer é o próprio log:
+    # 'estado' = ativo | desfeito | descartado, 'origem' = usuario | desfazer | refazer
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS transacoes_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        momento TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+        transacao_id INTEGER NOT NULL,
+        operacao TEXT NOT NULL,      -- INSERT, UPDATE, DELETE (lógico), RESTORE ou PURGE (DELETE físico)
+        antes TEXT,                  -- Linha em JSON antes da escrita
+        depois TEXT,                 -- Linha em JSON depois da escrita
+        origem TEXT NOT NULL DEFAULT 'usuario',
+        estado TEXT NOT NULL DEFAULT 'ativo'
+    )
+    """)
+    novo, antigo = _JSON_LOG.format(p="NEW"), _JSON_LOG.format(p="OLD")
+    gatilhos = {
+        "trg_log_transacoes_insert": ("AFTER INSERT ON transacoes", f"""
+            INSERT INTO transacoes_log (transacao_id, operacao, depois) VALUES (NEW.id, 'INSERT', {novo});
+        """),
+        "trg_log_transacoes_update": ("AFTER UPDATE ON transacoes", f"""
+            INSERT INTO transacoes_log (transacao_id, operacao, antes, depois) VALUES (
+                NEW.id,
+                CASE WHEN NEW.excluido = 1 AND OLD.excluido = 0 THEN 'DELETE'
+                     WHEN NEW.excluido = 0 AND OLD.excluido = 1 THEN 'RESTORE'
+                     ELSE 'UPDATE' END,
+                {antigo}, {novo}
+            );
+        """),
+        "trg_log_transacoes_delete": ("AFTER DELETE ON transacoes", f"""
+            INSERT INTO transacoes_log (transacao_id, operacao, antes) VALUES (OLD.id, 'PURGE', {antigo});
+        """),
+        # Somente inclusão: o conteúdo gravado não muda e nada é apagado
+        "trg_log_imutavel_update": ("BEFORE UPDATE OF id, momento, transacao_id, operacao, antes, depois ON transacoes_log", """
+            SELECT RAISE(ABORT, 'transacoes_log é somente inclusão');
+        """),
+        "trg_log_imutavel_delete": ("BEFORE DELETE ON transacoes_log", """
+            SELECT RAISE(ABORT, 'transacoes_log é somente inclusão');
+        """),
+    }
+
+    # Configurações, com as metas de alocação padrão de quando a migração saiu
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS config (
+        chave TEXT PRIMARY KEY,
+        valor TEXT
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO config (chave, valor) VALUES ('meta_alocacao', ?)", (
+        '{"Renda Fixa": 30.0, "A\\u00e7\\u00f5es": 20.0, "FIIs": 20.0, "Stocks": 15.0, '
+        '"ETF Internacional": 10.0, "Criptomoedas": 5.0}',
+    ))
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS metas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,          -- Ex: 'Patrimônio Total', 'Categoria', 'Renda Passiva'
+        filtro TEXT,                 -- Ex: 'Renda Fixa', 'FII', ou vazio se for geral
+        valor_alvo REAL NOT NULL,
+        data_limite TEXT,            -- Opcional
+        descricao TEXT
+    )
+    """)
+
+    # Renda fixa: séries SGS (CDI/SELIC/IPCA) e indexador de cada título
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS series_sgs (
+        serie TEXT NOT NULL,         -- Ex: 'CDI', 'SELIC', 'IPCA'
+        data TEXT NOT NULL,          -- AAAA-MM-DD
+        valor REAL NOT NULL,         -- Em % (a.d. para CDI/SELIC, a.m. para IPCA)
+        PRIMARY KEY (serie, data)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS indexadores_rf (
+        ativo TEXT PRIMARY KEY,
+        indexador TEXT NOT NULL,     -- 'CDI', 'SELIC', 'IPCA' ou 'PRE'
+        percentual REAL DEFAULT 100, -- % do indexador (Ex: 110 para 110% do CDI)
+        taxa REAL DEFAULT 0,         -- Taxa fixa em % a.a. (Ex: IPCA + 6, prefixado 12)
+        CHECK(indexador IN ('CDI', 'SELIC', 'IPCA', 'PRE'))
+    )
+    """)
+
+    # Histórico de preços, valor_diario (data x ativo) e a fila 'valor_diario_pendente',
+    # alimentada por gatilhos, com a data mais antiga afetada de cada ativo
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS precos_historicos (
+        ativo TEXT NOT NULL,
+        data TEXT NOT NULL,          -- AAAA-MM-DD
+        fechamento REAL NOT NULL,
+        PRIMARY KEY (ativo, data)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS valor_diario (
+        data TEXT NOT NULL,
+        ativo TEXT NOT NULL,
+        quantidade REAL NOT NULL,
+        custo REAL NOT NULL,
+        preco REAL NOT NULL,         -- Fechamento, valor na curva (RF) ou PM quando não há preço
+        valor REAL NOT NULL,         -- quantidade * preco
+        PRIMARY KEY (data, ativo)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_valor_diario_ativo ON valor_diario (ativo, data)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS valor_diario_pendente (
+        ativo TEXT PRIMARY KEY,
+        data_minima TEXT NOT NULL    -- Recalcular o ativo a partir desta data
+    )
+    """)
+    # Cada escrita marca o ativo como pendente a partir da data mais antiga afetada
+    upsert = """
+        INSERT INTO valor_diario_pendente (ativo, data_minima) VALUES ({ativo}, substr({data}, 1, 10))
+        ON CONFLICT(ativo) DO UPDATE SET data_minima = MIN(data_minima, excluded.data_minima);
+    """
+    gatilhos.update({
+        "trg_vd_transacoes_insert": ("AFTER INSERT ON transacoes", upsert.format(ativo="NEW.ativo", data="NEW.data")),
+        "trg_vd_transacoes_delete": ("AFTER DELETE ON transacoes", upsert.format(ativo="OLD.ativo", data="OLD.data")),
+        "trg_vd_transacoes_update": ("AFTER UPDATE ON transacoes",
+                                     upsert.format(ativo="OLD.ativo", data="OLD.data") + upsert.format(ativo="NEW.ativo", data="NEW.data")),
+        "trg_vd_precos_insert": ("AFTER INSERT ON precos_historicos", upsert.format(ativo="NEW.ativo", data="NEW.data")),
+        # Trocar o indexador muda todo o histórico do título
+        "trg_vd_indexador_insert": ("AFTER INSERT ON indexadores_rf", upsert.format(ativo="NEW.ativo", data="'0000-00-00'")),
+        "trg_vd_indexador_delete": ("AFTER DELETE ON indexadores_rf", upsert.format(ativo="OLD.ativo", data="'0000-00-00'")),
+        # Dia novo de CDI/SELIC/IPCA afeta todos os títulos com indexador
+        "trg_vd_series_insert": ("AFTER INSERT ON series_sgs", """
+        INSERT INTO valor_diario_pendente (ativo, data_minima)
+            SELECT ativo, NEW.data FROM indexadores_rf WHERE true
+        ON CONFLICT(ativo) DO UPDATE SET data_minima = MIN(data_minima, excluded.data_minima);
+        """),
+    })
+
+    # Eventos corporativos: aplicados na leitura (o extrato não é reescrito). Cada escrita marca o
+    # ativo para recalcular o valor_diario desde o início, apaga o histórico de preços (baixado de
+    # novo já ajustado) e muda a versão do extrato
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS eventos_corporativos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,          -- Data "ex": transações anteriores a ela são ajustadas
+        ativo TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        fator REAL NOT NULL DEFAULT 1,   -- Multiplicador da quantidade (desdobramento 1:2 = 2, grupamento 10:1 = 0.1)
+        novo_ativo TEXT,             -- Só na mudança de ticker
+        CHECK(tipo IN ('Desdobramento', 'Grupamento', 'Mudança de Ticker'))
+    )
+    """)
+    marcar = """
+        INSERT INTO valor_diario_pendente (ativo, data_minima) VALUES ({ativo}, '0000-00-00')
+        ON CONFLICT(ativo) DO UPDATE SET data_minima = '0000-00-00';
+    """
+    for evento, linha in (("INSERT", "NEW"), ("DELETE", "OLD")):
+        gatilhos[f"trg_eventos_{evento.lower()}"] = (f"AFTER {evento} ON eventos_corporativos", f"""
+            {marcar.format(ativo=f"{linha}.ativo")}
+            {marcar.format(ativo=f"COALESCE({linha}.novo_ativo, {linha}.ativo)")}
+            DELETE FROM precos_historicos WHERE ativo IN ({linha}.ativo, {linha}.novo_ativo);
+            UPDATE versoes SET versao = versao + 1 WHERE escopo IN ('transacoes', 'precos');
+        """)
+
+    for nome, (evento, corpo) in gatilhos.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} {evento} BEGIN {corpo} END")
+
+    # Versionamento: carimbo que muda a cada escrita, usado para invalidar caches.
+    # 'precos' e 'valor_diario' são incrementadas pelo código, uma vez por lote
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS versoes (
+        escopo TEXT PRIMARY KEY,    -- Nome da tabela versionada
+        versao INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.executemany("INSERT OR IGNORE INTO versoes (escopo, versao) VALUES (?, 0)", [("precos",), ("valor_diario",)])
+    _gatilhos_versao(conn, ["transacoes", "metas", "config", "series_sgs", "indexadores_rf", "eventos_corporativos"])
+
+def _m002_indices(conn):
+    """Índices das consultas mais frequentes (extrato por data, por ativo e pilha de desfazer)."""
+    conn.executescript("""
+    CREATE INDEX IF NOT EXISTS idx_transacoes_data ON transacoes (excluido, data);
+    CREATE INDEX IF NOT EXISTS idx_transacoes_ativo ON transacoes (ativo, data);
+    CREATE INDEX IF NOT EXISTS idx_transacoes_log_pilha ON transacoes_log (origem, estado);
+    CREATE INDEX IF NOT EXISTS idx_transacoes_log_transacao ON transacoes_log (transacao_id);
+    CREATE INDEX IF NOT EXISTS idx_eventos_ativo ON eventos_corporativos (ativo, data);
+    """)
+
+def _m003_validacoes(conn):
+    """
+    Regras que o CHECK da tabela não cobre (o SQLite não deixa acrescentar CHECK com ALTER TABLE):
+    quantidade e preço não negativos e 'excluido' só 0 ou 1.
+    """
+    for evento in ("INSERT", "UPDATE"):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_valida_transacoes_{evento.lower()}
+        BEFORE {evento} ON transacoes
+        WHEN NEW.quantidade < 0 OR NEW.preco_unitario < 0 OR NEW.excluido NOT IN (0, 1)
+        BEGIN
+            SELECT RAISE(ABORT, 'Transação inválida: quantidade/preço negativos ou excluido fora de 0/1');
+        END
+        """)
+
+def _m004_tarefas(conn):
+    """Fila das tarefas em segundo plano (tarefas.py) e snapshots dos resultados (tipo + chave -> JSON)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS tarefas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        parametros TEXT NOT NULL DEFAULT '{}',   -- JSON
+        estado TEXT NOT NULL DEFAULT 'pendente', -- pendente | executando | cancelando | concluida | cancelada | erro
+        progresso REAL NOT NULL DEFAULT 0,       -- 0 a 1
+        mensagem TEXT,
+        criada_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+        iniciada_em TEXT,
+        concluida_em TEXT
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_estado ON tarefas (estado, id)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS snapshots (
+        tipo TEXT NOT NULL,
+        chave TEXT NOT NULL DEFAULT '',
+        versao_transacoes INTEGER NOT NULL,      -- Versão do extrato usada no cálculo
+        gerado_em TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+        conteudo TEXT NOT NULL,                  -- JSON
+        PRIMARY KEY (tipo, chave)
+    )
+    """)
+
+def _m005_cache_mercado(conn):
+    """Cache persistente de cotações e notícias (preenchido pelo agendador.py) e a versão 'cotacoes'."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cotacoes_cache (
+        ativo TEXT PRIMARY KEY,
+        preco REAL NOT NULL,
+        atualizado_em TEXT NOT NULL     -- ISO 8601 em UTC
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS detalhes_ativos (
+        ativo TEXT PRIMARY KEY,
+        conteudo TEXT NOT NULL,         -- JSON (nome, setor, descrição e notícias)
+        atualizado_em TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS agendador_execucoes (
+        tarefa TEXT PRIMARY KEY,
+        ultima_execucao TEXT NOT NULL   -- ISO 8601 em UTC
+    )
+    """)
+    # Incrementada pelo código a cada lote de cotações salvas
+    conn.execute("INSERT OR IGNORE INTO versoes (escopo, versao) VALUES ('cotacoes', 0)")
+
+def _m006_busca_extrato(conn):
+    """
+    Índice FTS5 da busca no extrato (ativo, observação, corretora e categoria), a tabela de vocabulário
+    (busca aproximada) e os gatilhos de sincronia; o 'rebuild' indexa as transações que já existiam.
+    """
+    # remove_diacritics: 'acao' encontra 'Ação'
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS transacoes_busca USING fts5(
+        ativo, observacao, corretora, categoria, content='transacoes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """)
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS transacoes_busca_vocab USING fts5vocab(transacoes_busca, 'row')")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_busca_transacoes_insert AFTER INSERT ON transacoes BEGIN
+        INSERT INTO transacoes_busca (rowid, ativo, observacao, corretora, categoria)
+        VALUES (NEW.id, NEW.ativo, NEW.observacao, NEW.corretora, NEW.categoria);
+    END
+    """)
+    # Só quando muda um campo indexado (a exclusão lógica não mexe no índice)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_busca_transacoes_update AFTER UPDATE OF ativo, observacao, corretora, categoria ON transacoes BEGIN
+        INSERT INTO transacoes_busca (transacoes_busca, rowid, ativo, observacao, corretora, categoria)
+        VALUES ('delete', OLD.id, OLD.ativo, OLD.observacao, OLD.corretora, OLD.categoria);
+        INSERT INTO transacoes_busca (rowid, ativo, observacao, corretora, categoria)
+        VALUES (NEW.id, NEW.ativo, NEW.observacao, NEW.corretora, NEW.categoria);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_busca_transacoes_delete AFTER DELETE ON transacoes BEGIN
+        INSERT INTO transacoes_busca (transacoes_busca, rowid, ativo, observacao, corretora, categoria)
+        VALUES ('delete', OLD.id, OLD.ativo, OLD.observacao, OLD.corretora, OLD.categoria);
+    END
+    """)
+    conn.execute("INSERT INTO transacoes_busca (transacoes_busca) VALUES ('rebuild')")
+
+def _m007_rebalanceamentos(conn):
+    """
+    Histórico de rebalanceamentos (versionado): cada cálculo do rebalanceador com metas, alocação
+    da hora e operações sugeridas (JSON); 'realizado_em' marca os que o usuário executou.
+    A data que ficava em config.ultimo_rebalanceamento vira um registro realizado, com as metas da época.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rebalanceamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,              -- AAAA-MM-DD HH:MM:SS do cálculo
+        aporte REAL NOT NULL DEFAULT 0,
+        cotacao_dolar REAL,
+        reserva REAL NOT NULL DEFAULT 0,
+        patrimonio REAL,                 -- Patrimônio sem a reserva (NULL nos registros antigos)
+        metas TEXT NOT NULL,             -- JSON {categoria: % meta}
+        alocacao TEXT NOT NULL DEFAULT '{}',    -- JSON {categoria: % atual}
+        operacoes TEXT NOT NULL DEFAULT '[]',   -- JSON [{"Categoria", "Diferença (R$)"}, ...] (+ compra, - venda)
+        realizado_em TEXT                -- AAAA-MM-DD, quando o usuário marcou como realizado
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rebalanceamentos_realizado ON rebalanceamentos (realizado_em)")
+    _gatilhos_versao(conn, ["rebalanceamentos"])
+    antigos = dict(conn.execute(
+        "SELECT chave, valor FROM config WHERE chave IN ('ultimo_rebalanceamento', 'meta_alocacao')"
+    ).fetchall())
+    data = antigos.get('ultimo_rebalanceamento')
+    if data and data != 'None':
+        conn.execute(
+            "INSERT INTO rebalanceamentos (data, metas, realizado_em) VALUES (?, ?, ?)",
+            (f"{data} 00:00:00", antigos.get('meta_alocacao') or '{}', data)
+        )
+    conn.execute("DELETE FROM config WHERE chave = 'ultimo_rebalanceamento'")
+
+def _m008_validacao_exclusao(conn):
+    """
+    A regra de quantidade/preço não negativos da migração 3 passa a valer só para linhas que
+    continuam no extrato: a exclusão lógica (excluido = 1) de uma linha antiga com valor negativo,
+    justamente as que a validação do extrato aponta, era barrada. 'excluido' só 0 ou 1 segue em todo UPDATE.
+    """
+    conn.execute("DROP TRIGGER IF EXISTS trg_valida_transacoes_update")
+    conn.execute("""
+    CREATE TRIGGER trg_valida_transacoes_update
+    BEFORE UPDATE ON transacoes
+    WHEN NEW.excluido NOT IN (0, 1) OR (NEW.excluido = 0 AND (NEW.quantidade < 0 OR NEW.preco_unitario < 0))
+    BEGIN
+        SELECT RAISE(ABORT, 'Transação inválida: quantidade/preço negativos ou excluido fora de 0/1');
+    END
+    """)
+
+MIGRACOES = [
+    _m001_esquema_base,
+    _m002_indices,
+    _m003_validacoes,
+    _m004_tarefas,
+    _m005_cache_mercado,
+    _m006_busca_extrato,
+    _m007_rebalanceamentos,
+    _m008_validacao_exclusao,
+]
+
+# Funções de execução
+
+def versao_esquema(conn=None):
+    """Versão atual do esquema (PRAGMA user_version) do banco."""
+    fechar = conn is None
+    conn = conn or database.conectar()
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        if fechar:
+            conn.close()
+
+def migrar(forcar=False):
+    """
+    Aplica as migrações pendentes do banco da carteira ativa.
+    Roda uma vez por processo e por banco; as chamadas seguintes voltam na hora.
+    Todas as migrações são idempotentes (IF NOT EXISTS), então dois processos
+    migrando ao mesmo tempo não quebram nada. Retorna quantas migrações rodaram.
+    """
+    caminho = database.caminho_banco()
+    if caminho in _bancos_migrados and not forcar:
+        return 0
+
+    conn = database.conectar()
+    aplicadas = 0
+    try:
+        versao = versao_esquema(conn)
+        for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+            migracao(conn)
+            # PRAGMA não aceita parâmetro; o número vem da lista, não de fora
+            conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+            aplicadas += 1
+            print(f"✅ Migração {numero} aplicada ({migracao.__name__}).", file=sys.stderr)
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Erro na migração {versao + aplicadas + 1}: {e}", file=sys.stderr)
+        raise
+    finally:
+        conn.close()
+
+    _bancos_migrados.add(caminho)
+    return aplicadas
@@ -0,0 +1,18 @@
+# Núcleo de cálculos da carteira, sem dependência do Streamlit.
+# Pode ser usado pelo app, pela linha de comando (cli.py) ou por scripts agendados.
+from nucleo.benchmarks import *
+from nucleo.consolidacao import *
+from nucleo.cotacoes import *
+from nucleo.dados import *
+from nucleo.eventos import *
+from nucleo.evolucao import *
+from nucleo.impostos import *
+from nucleo.metas import *
+from nucleo.posicoes import *
+from nucleo.precos import *
+from nucleo.proventos import *
+from nucleo.rebalanceamento import *
+from nucleo.renda_fixa import *
+from nucleo.risco import *
+from nucleo.validacao import *
+from nucleo.valor_diario import *
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+from constants import *
+from nucleo.precos import atualizar_historico_precos, carregar_precos
+from nucleo.renda_fixa import carregar_series_sgs
+
+# Funções de comparação com benchmarks (CDI, IBOV, IFIX, S&P 500)
+# Cada benchmark vira um índice diário a partir do histórico local (preços ou SGS).
+# A simulação aplica os mesmos aportes da carteira, nas mesmas datas, no índice:
+# cotas = aporte / I(data) acumuladas, valor(t) = cotas(t) * I(t).
+
+def tickers_benchmarks(nomes=None):
+    """Tickers do histórico de preços usados pelos benchmarks pedidos (inclui o dólar se precisar)."""
+    tickers = []
+    for nome in nomes or BENCHMARKS:
+        fonte, codigo = BENCHMARKS[nome]
+        if fonte == "dolar":
+            tickers += [codigo, TICKER_DOLAR]
+        elif fonte == "preco":
+            tickers.append(codigo)
+    return list(dict.fromkeys(tickers))
+
+def atualizar_benchmarks(inicio, nomes=None, hoje=None):
+    """Baixa os fechamentos que faltam dos índices (desde 'inicio'). Retorna a quantidade de preços novos."""
+    return atualizar_historico_precos({ticker: inicio for ticker in tickers_benchmarks(nomes)}, hoje)
+
+def fluxos_aportes(df_transacoes):
+    """
+    Aportes líquidos por dia, com a mesma regra do gráfico de evolução:
+    Compra/Aporte entram, Saque/Resgate saem, Vendas ficam na carteira.
+    """
+    sinal = df_transacoes['Tipo'].map({'Compra': 1.0, 'Aporte': 1.0, 'Saque': -1.0, 'Resgate': -1.0})
+    fluxos = df_transacoes['Total'].astype(np.float64) * sinal
+    datas = pd.to_datetime(df_transacoes['Data']).dt.normalize()
+    return fluxos.groupby(datas).sum().loc[lambda s: s != 0]
+
+def indice_benchmark(nome, precos, series):
+    """
+    Série de nível do benchmark (índice em R$), indexada por data.
+    CDI: produto acumulado das taxas diárias | S&P 500: pontos x câmbio do dia.
+    """
+    fonte, codigo = BENCHMARKS[nome]
+    if fonte == "sgs":
+        taxa = series.get(codigo, pd.Series(dtype=np.float64))
+        # A taxa do dia rende para quem já estava aplicado no início do dia
+        return (1 + taxa / 100).cumprod().shift(1, fill_value=1.0)
+
+    if codigo not in precos.columns:
+        return pd.Series(dtype=np.float64, index=pd.DatetimeIndex([]))
+    indice = precos[codigo].dropna()
+    if fonte == "dolar":
+        if TICKER_DOLAR not in precos.columns:
+            return pd.Series(dtype=np.float64, index=pd.DatetimeIndex([]))
+        dolar = precos[TICKER_DOLAR].dropna()
+        calendario = indice.index.union(dolar.index)
+        indice = (indice.reindex(calendario).ffill() * dolar.reindex(calendario).ffill()).dropna()
+    return indice
+
+def simular_benchmark(fluxos, indice, datas):
+    """
+    Valor em cada data se os aportes tivessem ido para o benchmark (vetorizado).
+    Aportes antes do primeiro ponto do índice entram no primeiro preço disponível.
+    """
+    datas = pd.DatetimeIndex(datas)
+    if indice.empty or fluxos.empty:
+        return pd.Series(np.nan, index=datas)
+
+    calendario = indice.index.union(fluxos.index).union(datas)
+    nivel = indice.reindex(calendario).ffill().bfill()
+    cotas = (fluxos.reindex(calendario, fill_value=0.0) / nivel).cumsum()
+    # Resgates maiores que o saldo simulado não deixam o valor negativo
+    valor = (cotas * nivel).clip(lower=0.0)
+    return valor.reindex(datas)
+
+def serie_benchmarks(df_transacoes, nomes, datas, series=None):
+    """DataFrame datas x benchmarks com o valor simulado dos aportes em cada um."""
+    datas = pd.DatetimeIndex(datas)
+    fluxos = fluxos_aportes(df_transacoes)
+    if any(BENCHMARKS[n][0] == "sgs" for n in nomes) and series is None:
+        series = carregar_series_sgs()
+    precos = carregar_precos(tickers_benchmarks(nomes))
+
+    return pd.DataFrame(
+        {nome: simular_benchmark(fluxos, indice_benchmark(nome, precos, series or {}), datas) for nome in nomes},
+        index=datas
+    )
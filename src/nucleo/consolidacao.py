@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from constants import *
+from database import listar_carteiras, ultimo_dia_valor_diario, usar_carteira
+from nucleo.dados import carregar_transacoes
+from nucleo.posicoes import calcular_resumo_ativos, mapa_categorias
+from nucleo.valor_diario import atualizar_valor_diario, carregar_valor_diario
+
+# Funções da visão consolidada (todas as carteiras juntas)
+# Cada carteira é um arquivo .db separado, então a leitura de cada uma roda numa thread
+# própria (o SQLite e boa parte do pandas soltam o GIL). A carteira de cada thread
+# é escolhida com usar_carteira, que só vale dentro daquela thread.
+
+COLUNAS_CONSOLIDADO = ['Carteira', 'Ativo', 'Categoria', 'Quantidade', 'Total Investido', 'Valor de Mercado']
+
+def posicoes_carteira(nome):
+    """Posição atual de uma carteira (custo e valor de mercado do último dia de valor_diario)."""
+    from migracoes import migrar
+
+    with usar_carteira(nome):
+        migrar()
+        df = carregar_transacoes()
+        posicoes = calcular_resumo_ativos(df)
+        if posicoes.empty:
+            return pd.DataFrame(columns=COLUNAS_CONSOLIDADO)
+        atualizar_valor_diario()
+        valor_dia = carregar_valor_diario(ultimo_dia_valor_diario())
+        categorias = mapa_categorias(df)
+
+    posicoes = posicoes[posicoes['Quantidade'] > 1e-6].copy()
+    posicoes['Carteira'] = nome
+    posicoes['Categoria'] = posicoes['Ativo'].map(categorias).fillna('Outros')
+    # Sem valor diário (ex: carteira nova), o valor de mercado fica no custo
+    valores = dict(zip(valor_dia['Ativo'], valor_dia['Valor']))
+    posicoes['Valor de Mercado'] = posicoes['Ativo'].map(valores).fillna(posicoes['Total Investido'])
+    return posicoes[COLUNAS_CONSOLIDADO]
+
+def consolidar_carteiras(carteiras=None, max_threads=4):
+    """
+    Junta as posições de várias carteiras (todas, por padrão), lendo as carteiras em paralelo.
+    Retorna dict com:
+      - resumo: uma linha por carteira (Ativos, Total Investido, Valor de Mercado, % do Total)
+      - posicoes: uma linha por ativo somando todas as carteiras
+      - detalhado: carteira x ativo
+    """
+    carteiras = list(carteiras or listar_carteiras())
+    with ThreadPoolExecutor(max_workers=max(1, min(max_threads, len(carteiras)))) as executor:
+        partes = list(executor.map(posicoes_carteira, carteiras))
+    partes = [parte for parte in partes if not parte.empty]
+    detalhado = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_CONSOLIDADO)
+
+    resumo = detalhado.groupby('Carteira', sort=False).agg(
+        **{'Ativos': ('Ativo', 'nunique'), 'Total Investido': ('Total Investido', 'sum'),
+           'Valor de Mercado': ('Valor de Mercado', 'sum')}
+    ).reindex(carteiras, fill_value=0).reset_index()
+    total = resumo['Valor de Mercado'].sum()
+    resumo['% do Total'] = resumo['Valor de Mercado'] / total * 100 if total > 0 else 0.0
+
+    posicoes = detalhado.groupby('Ativo', as_index=False).agg(
+        **{'Categoria': ('Categoria', 'last'), 'Quantidade': ('Quantidade', 'sum'),
+           'Total Investido': ('Total Investido', 'sum'), 'Valor de Mercado': ('Valor de Mercado', 'sum'),
+           'Carteiras': ('Carteira', lambda nomes: ", ".join(sorted(set(nomes))))}
+    ).sort_values('Valor de Mercado', ascending=False, ignore_index=True)
+
+    return {"resumo": resumo, "posicoes": posicoes, "detalhado": detalhado}
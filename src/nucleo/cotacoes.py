@@ -0,0 +1,135 @@
+import pandas as pd
+
+# Funções que puxam dados externos (yfinance é importado só na hora da busca)
+
+CRIPTOS_CONHECIDAS = ["BTC", "ETH", "USDT", "BNB", "SOL", "XRP", "ADA", "DOGE", "AVAX"]
+
+def normalizar_ticker(ticker):
+    """
+    Converte o ticker do extrato para o formato do Yahoo.
+    Ex: 'BTC' -> 'BTC-BRL', 'PETR4' -> 'PETR4.SA'
+    """
+    t_str = str(ticker).upper().strip()
+    if t_str in CRIPTOS_CONHECIDAS:
+        return f"{t_str}-BRL"
+    if len(t_str) >= 5 and t_str[-1].isdigit() and ".SA" not in t_str:
+        return f"{t_str}.SA"
+    return t_str
+
+def buscar_cotacoes(lista_tickers):
+    """
+    Busca cotação online via yfinance.
+    Tenta em lote primeiro. Se falhar, tenta individualmente.
+    Sem cache: quem chama decide (st.cache_data no app, ETag na API...).
+    """
+    import yfinance as yf
+
+    if not lista_tickers:
+        return {}
+    
+    # Dicionário de resultados
+    cotacoes = {}
+    
+    # 1. Tratamento inicial de tickers
+    mapa_tickers = {} # { 'BTC': 'BTC-BRL', 'PETR4': 'PETR4.SA' }
+    
+    for t in lista_tickers:
+        mapa_tickers[t] = normalizar_ticker(t)
+
+    lista_para_yahoo = list(mapa_tickers.values())
+    try:
+        dados = yf.download(lista_para_yahoo, period="1d", progress=False)['Close']
+        if not dados.empty:
+            if isinstance(dados, pd.Series):
+                 val = dados.iloc[-1]
+                 if not pd.isna(val):
+                     tk_unico = list(mapa_tickers.keys())[0]
+                     cotacoes[tk_unico] = float(val)
+            elif isinstance(dados, pd.DataFrame):
+                for t_orig, t_yahoo in mapa_tickers.items():
+                    if t_yahoo in dados.columns:
+                        val = dados[t_yahoo].iloc[-1]
+                        if not pd.isna(val):
+                            cotacoes[t_orig] = float(val)
+    except Exception as e:
+        print(f"Erro no download em lote: {e}") # Changed st.write to print to avoid UI clutter in cache func
+    # Fallback: Verifica quem ficou sem cotação e tenta individualmente
+    faltantes = [t for t in lista_tickers if t not in cotacoes]
+    if faltantes:
+        for t in faltantes:
+            t_yahoo = mapa_tickers[t]
+            val = _buscar_ticker_individual(t_yahoo)
+            # Se falhou e era cripto BRL, tenta USD
+            if val is None and t_yahoo.endswith("-BRL"):
+                t_usd = t_yahoo.replace("-BRL", "-USD")
+                val_usd = _buscar_ticker_individual(t_usd)
+                if val_usd is not None:
+                     # Converte para BRL (pega dolar hoje aprox ou do yahoo)
+                     dolar = _buscar_ticker_individual("BRL=X") # Yahoo: BRL=X é USD/BRL? Não, USDBRL=X
+                     if not dolar: dolar = _buscar_ticker_individual("USDBRL=X")
+                     val = val_usd * dolar
+            
+            if val is not None:
+                cotacoes[t] = val
+                
+    return cotacoes
+
+def cotacoes_locais(lista_tickers, buscar_faltantes=True):
+    """
+    Cotações do cache local (tabela cotacoes_cache, mantida pelo agendador.py).
+    Só os ativos que ainda não têm nenhuma cotação guardada são buscados online (e gravados).
+    """
+    from database import ler_cotacoes, salvar_cotacoes
+
+    cotacoes = ler_cotacoes(lista_tickers)
+    faltantes = [t for t in lista_tickers if t not in cotacoes]
+    if faltantes and buscar_faltantes:
+        novas = buscar_cotacoes(faltantes)
+        salvar_cotacoes(novas)
+        cotacoes.update(novas)
+    return cotacoes
+
+def buscar_detalhes_ativo(ticker):
+    """
+    Busca informações detalhadas e notícias de um ativo.
+    Retorna dict com summary, sector, news, etc.
+    """
+    import yfinance as yf
+
+    t_final = normalizar_ticker(ticker)
+            
+    try:
+        t = yf.Ticker(t_final)
+        info = t.info
+        news = t.news
+        
+        return {
+            "longName": info.get("longName", t_final),
+            "sector": info.get("sector", "Desconhecido"),
+            "industry": info.get("industry", "-"),
+            "longBusinessSummary": info.get("longBusinessSummary", "Sem descrição disponível."),
+            "news": news[:3] if news else [] # Top 3 noticias
+        }
+    except Exception as e:
+        return {
+            "longName": t_final,
+            "sector": "-",
+            "industry": "-",
+            "longBusinessSummary": f"Erro ao buscar detalhes: {str(e)}",
+            "news": [],
+            "erro": True
+        }
+
+def _buscar_ticker_individual(ticker):
+    """Helper para buscar 1 ticker específico"""
+    import yfinance as yf
+
+    try:
+        t = yf.Ticker(ticker)
+        hist = t.history(period="1d")
+        if not hist.empty:
+            return float(hist['Close'].iloc[-1])
+    except:
+        return None
+    return None
+
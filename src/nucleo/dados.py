@@ -0,0 +1,22 @@
+import pandas as pd
+from constants import *
+from database import consultar_extrato, listar_eventos
+from nucleo.eventos import aplicar_eventos_corporativos, eventos_para_dataframe, nomes_antigos
+
+# Leitura do extrato direto do maindata.db (sem Streamlit)
+
+def carregar_transacoes(ativos=None, ajustar_eventos=True):
+    """
+    Lê as transações do banco (todas, ou só as dos 'ativos') e devolve o DataFrame
+    no formato do app (colunas COLUNAS_DB, 'Data' já convertida para datetime).
+    Por padrão já aplica os eventos corporativos (desdobramentos, grupamentos e tickers novos).
+    """
+    eventos = eventos_para_dataframe(listar_eventos()) if ajustar_eventos else None
+    if ativos and eventos is not None:
+        # O histórico de um ativo renomeado ainda está gravado com o ticker antigo
+        ativos = list(ativos) + nomes_antigos(ativos, eventos)
+    df = pd.DataFrame(consultar_extrato(ativos), columns=COLUNAS_DB)
+    df['Data'] = pd.to_datetime(df['Data'])
+    if eventos is not None:
+        df = aplicar_eventos_corporativos(df, eventos)
+    return df
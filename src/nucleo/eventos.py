@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from constants import *
+
+# Funções de eventos corporativos (desdobramento, grupamento e mudança de ticker)
+# O extrato gravado nunca é reescrito: os eventos são aplicados na leitura, antes do preço médio.
+# Mudança de ticker é um map dos nomes; desdobramento/grupamento multiplicam a Qtd das
+# transações anteriores à data do evento pelo produto dos fatores posteriores (merge_asof).
+
+COLUNAS_EVENTOS = ['ID', 'Data', 'Ativo', 'Tipo', 'Fator', 'Novo Ativo']
+
+def eventos_para_dataframe(eventos):
+    """Converte as linhas de listar_eventos() em DataFrame (Data em datetime)."""
+    df = pd.DataFrame(eventos, columns=COLUNAS_EVENTOS)
+    df['Data'] = pd.to_datetime(df['Data'])
+    return df
+
+def mapa_tickers(df_eventos):
+    """
+    { ticker antigo: ticker atual } seguindo as mudanças em cadeia (A -> B -> C vira A -> C e B -> C).
+    """
+    trocas = df_eventos[df_eventos['Tipo'] == 'Mudança de Ticker']
+    mapa = dict(zip(trocas['Ativo'], trocas['Novo Ativo']))
+    for antigo in list(mapa):
+        destino, vistos = mapa[antigo], {antigo}
+        while destino in mapa and destino not in vistos:
+            vistos.add(destino)
+            destino = mapa[destino]
+        mapa[antigo] = destino
+    return mapa
+
+def nomes_antigos(ativos, df_eventos):
+    """Tickers antigos que hoje correspondem aos 'ativos' (para ler o extrato completo de cada um)."""
+    alvo = set(ativos)
+    return [antigo for antigo, atual in mapa_tickers(df_eventos).items() if atual in alvo]
+
+def aplicar_eventos_corporativos(df_transacoes, eventos):
+    """
+    Devolve uma cópia do extrato ajustada pelos eventos:
+      - Ativo: ticker antigo trocado pelo atual
+      - Qtd: multiplicada pelos fatores de desdobramento/grupamento com data posterior à transação
+      - Preço: dividido pelo mesmo fator (o Total não muda, então o custo também não)
+    """
+    df_eventos = eventos if isinstance(eventos, pd.DataFrame) else eventos_para_dataframe(eventos)
+    if df_transacoes.empty or df_eventos.empty:
+        return df_transacoes
+
+    df = df_transacoes.copy()
+    mapa = mapa_tickers(df_eventos)
+    if mapa:
+        df['Ativo'] = df['Ativo'].replace(mapa)
+
+    fatores = df_eventos[df_eventos['Tipo'] != 'Mudança de Ticker'].copy()
+    if fatores.empty:
+        return df
+    fatores['Ativo'] = fatores['Ativo'].replace(mapa)
+    fatores = fatores.sort_values('Data', kind='stable')
+    # Produto dos fatores deste evento em diante (de trás para frente, por ativo)
+    fatores['Acumulado'] = (
+        fatores.iloc[::-1].groupby('Ativo')['Fator'].cumprod().iloc[::-1].astype(np.float64)
+    )
+
+    datas = pd.to_datetime(df['Data'])
+    ordem = np.argsort(datas.to_numpy(), kind='stable')
+    base = pd.DataFrame({'Data': datas.to_numpy()[ordem], 'Ativo': df['Ativo'].to_numpy()[ordem], 'Linha': ordem})
+    # Para cada transação, o primeiro evento do mesmo ativo estritamente depois dela
+    casado = pd.merge_asof(
+        base, fatores[['Data', 'Ativo', 'Acumulado']],
+        on='Data', by='Ativo', direction='forward', allow_exact_matches=False
+    )
+    fator = np.ones(len(df))
+    fator[casado['Linha'].to_numpy()] = casado['Acumulado'].fillna(1.0).to_numpy()
+
+    df['Qtd'] = df['Qtd'].astype(np.float64) * fator
+    df['Preço'] = df['Preço'].astype(np.float64) / fator
+    return df
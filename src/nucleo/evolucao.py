@@ -0,0 +1,80 @@
+import pandas as pd
+
+# Funções da evolução patrimonial
+
+def montar_intervalo_meses(df_sorted):
+    """
+    Monta o intervalo mensal do gráfico de evolução:
+    do primeiro mês com transação até hoje, com pelo menos 12 meses de visão.
+    """
+    data_inicio = df_sorted['Data'].min().replace(day=1)
+    data_hoje = pd.Timestamp.now().replace(day=1)
+    data_futura_minima = data_inicio + pd.DateOffset(months=12) # Garante pelo menos 12 meses de visão
+    data_fim = max(data_hoje, data_futura_minima)
+    return pd.date_range(start=data_inicio, end=data_fim, freq='MS')
+
+def calcular_evolucao_patrimonial(df_sorted, date_range):
+    """
+    Calcula a evolução patrimonial mensal.
+    Retorna eixos X (datas), Y1 (aportes mensais) e Y2 (total acumulado).
+    """
+    eixo_datas = []
+    eixo_aportes = []
+    eixo_acumulado = [] 
+    carteira_temp = {} 
+
+    for data_mes in date_range:
+        # Filtra transações deste mes específico
+        mask_mes = (df_sorted['Data'].dt.year == data_mes.year) & (df_sorted['Data'].dt.month == data_mes.month)
+        transacoes_mes = df_sorted[mask_mes]
+        
+        aporte_do_mes = 0.0
+        
+        # Processa cada transação do mês
+        for _, row in transacoes_mes.iterrows():
+            ativo = row['Ativo']
+            tipo = row['Tipo']
+            qtd = row['Qtd']
+            total = row['Total']
+            
+            if ativo not in carteira_temp:
+                carteira_temp[ativo] = {'qtd': 0.0, 'custo_total': 0.0}
+            
+            if tipo in ['Compra', 'Aporte']:
+                carteira_temp[ativo]['qtd'] += qtd
+                carteira_temp[ativo]['custo_total'] += total
+                aporte_do_mes += total 
+            
+            elif tipo == 'Reinvestimento':
+                carteira_temp[ativo]['qtd'] += qtd
+                carteira_temp[ativo]['custo_total'] += total 
+                
+            elif tipo == 'Bonificacao':
+                carteira_temp[ativo]['qtd'] += qtd
+                carteira_temp[ativo]['custo_total'] += total
+                
+            elif tipo == 'Venda':
+                if carteira_temp[ativo]['qtd'] > 0:
+                    pm = carteira_temp[ativo]['custo_total'] / carteira_temp[ativo]['qtd']
+                    custo_da_venda = pm * qtd
+                    carteira_temp[ativo]['qtd'] -= qtd
+                    carteira_temp[ativo]['custo_total'] -= custo_da_venda
+
+            elif tipo in ['Saque', 'Resgate']:
+                if carteira_temp[ativo]['qtd'] > 0:
+                    pm = carteira_temp[ativo]['custo_total'] / carteira_temp[ativo]['qtd']
+                    custo_saque = pm * qtd
+                    carteira_temp[ativo]['qtd'] -= qtd
+                    carteira_temp[ativo]['custo_total'] -= custo_saque
+                
+                # Desconta do aporte do mês
+                aporte_do_mes -= total
+
+        total_investido_mes = sum(item['custo_total'] for item in carteira_temp.values())
+        
+        eixo_datas.append(data_mes)
+        eixo_aportes.append(aporte_do_mes)
+        eixo_acumulado.append(total_investido_mes)
+        
+    return eixo_datas, eixo_aportes, eixo_acumulado
+
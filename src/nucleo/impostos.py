@@ -0,0 +1,368 @@
+import numpy as np
+import pandas as pd
+from constants import *
+from nucleo.posicoes import mapa_categorias
+
+# Funções de imposto de renda (apuração mensal, DARF e "Bens e Direitos")
+# Uma única passada pelo extrato, agregado por ativo e dia, gera o resultado de cada venda
+# (separando day trade de operação comum). O resto é groupby por mês e grupo de tributação,
+# com uma varredura curta (meses x grupos) para compensar os prejuízos.
+
+# Grupo de tributação -> (alíquota, código do DARF, compensa prejuízo)
+GRUPOS_IR = {
+    "Swing Trade": (0.15, "6015", True),
+    "Day Trade": (0.20, "6015", True),
+    "FIIs": (0.20, "6015", True),
+    "Criptomoedas": (0.15, "4600", False),   # Ganho de capital: prejuízo não compensa
+}
+CATEGORIAS_BOLSA = ["Ações", "ETF", "BDR", "FIIs"]
+CATEGORIAS_SWING = ["Ações", "ETF", "BDR"]
+
+# IRRF retido na fonte ("dedo-duro"), descontado do imposto do mês
+IRRF_SWING = 0.00005      # 0,005% sobre o valor das vendas
+IRRF_DAY_TRADE = 0.01     # 1% sobre o resultado positivo
+
+# Código da ficha "Bens e Direitos" por categoria (vazio = conferir no programa da Receita)
+CODIGOS_BENS = {
+    "Ações": "03 - 01",
+    "FIIs": "07 - 03",
+    "Tesouro Direto": "04 - 02",
+    "CDB": "04 - 02",
+    "Debêntures": "04 - 02",
+    "LCI/LCA": "04 - 03",
+}
+
+def _agregar_por_dia(df):
+    """Soma Qtd/Total de compras, outras entradas, vendas e outras saídas por (dia, ativo)."""
+    df = df.assign(Dia=pd.to_datetime(df['Data']).dt.normalize())
+    movimento = np.select(
+        [df['Tipo'] == 'Compra', df['Tipo'].isin(TIPOS_ENTRADA), df['Tipo'] == 'Venda', df['Tipo'].isin(TIPOS_SAIDA)],
+        ['compra', 'entrada', 'venda', 'saida'],
+        default=''
+    )
+    df = df.assign(Movimento=movimento)[movimento != '']
+    dia = df.pivot_table(index=['Dia', 'Ativo'], columns='Movimento', values=['Qtd', 'Total'],
+                         aggfunc='sum', fill_value=0.0, sort=True)
+    dia.columns = [f"{valor}_{mov}" for valor, mov in dia.columns]
+    for valor in ['Qtd', 'Total']:
+        for mov in ['compra', 'entrada', 'venda', 'saida']:
+            if f"{valor}_{mov}" not in dia.columns:
+                dia[f"{valor}_{mov}"] = 0.0
+    return dia.reset_index()
+
+def resultados_vendas(df_transacoes):
+    """
+    Resultado de cada venda pelo preço médio (uma linha por ativo/dia/tipo de operação).
+    Day trade (compra e venda do mesmo ativo no mesmo dia, em bolsa) é apurado à parte,
+    pelo preço médio das compras do dia, e essas compras não entram no PM da carteira.
+    Retorna (vendas, posicoes):
+      - vendas: Data/Mês/Ativo/Categoria/Operação/Qtd/Valor Venda/Custo/Resultado
+      - posicoes: Data/Ativo/Qtd/Custo ao fim de cada dia com movimento (para "Bens e Direitos")
+    """
+    colunas = ['Data', 'Mês', 'Ativo', 'Categoria', 'Operação', 'Qtd', 'Valor Venda', 'Custo', 'Resultado']
+    if df_transacoes.empty:
+        return pd.DataFrame(columns=colunas), pd.DataFrame(columns=['Data', 'Ativo', 'Qtd', 'Custo'])
+
+    categorias = mapa_categorias(df_transacoes)
+    dia = _agregar_por_dia(df_transacoes)
+    codigos, ativos = pd.factorize(dia['Ativo'])
+    em_bolsa = np.isin(np.asarray([categorias.get(a) for a in ativos], dtype=object), CATEGORIAS_BOLSA)
+    qtd = [0.0] * len(ativos)
+    custo = [0.0] * len(ativos)
+
+    vendas = []
+    qtd_apos = []
+    custo_apos = []
+    colunas_dia = zip(
+        dia['Dia'], codigos.tolist(),
+        dia['Qtd_compra'].tolist(), dia['Total_compra'].tolist(),
+        dia['Qtd_entrada'].tolist(), dia['Total_entrada'].tolist(),
+        dia['Qtd_venda'].tolist(), dia['Total_venda'].tolist(),
+        dia['Qtd_saida'].tolist()
+    )
+    for data, i, q_compra, t_compra, q_entrada, t_entrada, q_venda, t_venda, q_saida in colunas_dia:
+        # Day trade: a parte casada entre compras e vendas do dia
+        q_dt = min(q_compra, q_venda) if em_bolsa[i] else 0.0
+        if q_dt > 0:
+            pm_compra, pm_venda = t_compra / q_compra, t_venda / q_venda
+            vendas.append((data, ativos[i], 'Day Trade', q_dt, q_dt * pm_venda, q_dt * pm_compra))
+            q_compra, t_compra = q_compra - q_dt, t_compra - q_dt * pm_compra
+            q_venda, t_venda = q_venda - q_dt, t_venda - q_dt * pm_venda
+
+        qtd[i] += q_compra + q_entrada
+        custo[i] += t_compra + t_entrada
+
+        if q_venda > 0 and qtd[i] > 0:
+            custo_venda = custo[i] / qtd[i] * q_venda
+            vendas.append((data, ativos[i], 'Comum', q_venda, t_venda, custo_venda))
+            qtd[i] -= q_venda
+            custo[i] -= custo_venda
+
+        # Resgates/Saques reduzem a posição sem gerar resultado tributável aqui
+        if q_saida > 0 and qtd[i] > 0:
+            custo[i] -= custo[i] / qtd[i] * q_saida
+            qtd[i] -= q_saida
+
+        qtd_apos.append(qtd[i])
+        custo_apos.append(custo[i])
+
+    df_vendas = pd.DataFrame(vendas, columns=['Data', 'Ativo', 'Operação', 'Qtd', 'Valor Venda', 'Custo'])
+    df_vendas['Resultado'] = df_vendas['Valor Venda'] - df_vendas['Custo']
+    df_vendas['Mês'] = df_vendas['Data'].dt.strftime('%Y-%m')
+    df_vendas['Categoria'] = df_vendas['Ativo'].map(categorias).fillna('Outros')
+
+    df_posicoes = pd.DataFrame({
+        'Data': dia['Dia'].to_numpy(),
+        'Ativo': dia['Ativo'].to_numpy(),
+        'Qtd': np.asarray(qtd_apos, dtype=np.float64),
+        'Custo': np.asarray(custo_apos, dtype=np.float64)
+    }, copy=False)
+    return df_vendas[colunas], df_posicoes
+
+def _grupo_ir(df_vendas):
+    """Grupo de tributação de cada venda (None = fora da apuração mensal, ex: exterior e Renda Fixa)."""
+    return pd.Series(np.select(
+        [df_vendas['Operação'] == 'Day Trade', df_vendas['Categoria'] == 'FIIs',
+         df_vendas['Categoria'].isin(CATEGORIAS_SWING), df_vendas['Categoria'] == 'Criptomoedas'],
+        ['Day Trade', 'FIIs', 'Swing Trade', 'Criptomoedas'],
+        default=''
+    ), index=df_vendas.index).replace('', None)
+
+def apurar_ir_mensal(df_transacoes):
+    """
+    Apuração mensal por grupo (Swing Trade, Day Trade, FIIs, Criptomoedas).
+    - Ações: isentas se as vendas de ações do mês não passam de R$ 20 mil (prejuízo continua compensável)
+    - Cripto: isenta se as vendas do mês não passam de R$ 35 mil
+    - Prejuízos acumulam por grupo e abatem os lucros dos meses seguintes
+    Retorna DataFrame Mês/Grupo/Vendas/Resultado/Isento/Prejuízo Compensado/Base/Imposto/IRRF/Imposto Devido/Prejuízo a Compensar.
+    """
+    colunas = ['Mês', 'Grupo', 'Vendas', 'Resultado', 'Isento', 'Prejuízo Compensado', 'Base',
+               'Imposto', 'IRRF', 'Imposto Devido', 'Prejuízo a Compensar']
+    df_vendas, _ = resultados_vendas(df_transacoes)
+    df_vendas = df_vendas.assign(Grupo=_grupo_ir(df_vendas)).dropna(subset=['Grupo'])
+    if df_vendas.empty:
+        return pd.DataFrame(columns=colunas)
+
+    acoes = (df_vendas['Grupo'] == 'Swing Trade') & (df_vendas['Categoria'] == 'Ações')
+    df_vendas = df_vendas.assign(
+        Vendas_Acoes=df_vendas['Valor Venda'].where(acoes, 0.0),
+        Resultado_Acoes=df_vendas['Resultado'].where(acoes, 0.0),
+        Lucro_DT=df_vendas['Resultado'].where(df_vendas['Operação'] == 'Day Trade', 0.0).clip(lower=0.0)
+    )
+    mensal = df_vendas.groupby(['Mês', 'Grupo'], sort=True).agg(
+        Vendas=('Valor Venda', 'sum'),
+        Resultado=('Resultado', 'sum'),
+        Vendas_Acoes=('Vendas_Acoes', 'sum'),
+        Resultado_Acoes=('Resultado_Acoes', 'sum'),
+        Lucro_DT=('Lucro_DT', 'sum')
+    ).reset_index()
+
+    # Isenções do mês (vetorizado)
+    isento_acoes = np.where(mensal['Vendas_Acoes'] <= LIMITE_ISENCAO_ACOES, mensal['Resultado_Acoes'].clip(lower=0.0), 0.0)
+    cripto = (mensal['Grupo'] == 'Criptomoedas').to_numpy()
+    isento_cripto = np.where(cripto & (mensal['Vendas'] <= LIMITE_ISENCAO_CRIPTO), mensal['Resultado'].clip(lower=0.0), 0.0)
+    mensal['Isento'] = isento_acoes + isento_cripto
+    tributavel = (mensal['Resultado'] - mensal['Isento']).to_numpy()
+
+    # IRRF: 0,005% das vendas comuns e 1% do lucro de day trade
+    mensal['IRRF'] = np.select(
+        [mensal['Grupo'].isin(['Swing Trade', 'FIIs']), mensal['Grupo'] == 'Day Trade'],
+        [mensal['Vendas'] * IRRF_SWING, mensal['Lucro_DT'] * IRRF_DAY_TRADE],
+        default=0.0
+    )
+
+    # Compensação de prejuízo: varredura mês a mês dentro de cada grupo
+    compensado = np.zeros(len(mensal))
+    saldo_prejuizo = np.zeros(len(mensal))
+    base = np.zeros(len(mensal))
+    for grupo, posicoes in mensal.groupby('Grupo').indices.items():
+        compensa = GRUPOS_IR[grupo][2]
+        prejuizo = 0.0
+        for k in posicoes:
+            resultado = tributavel[k]
+            if resultado < 0:
+                prejuizo += -resultado if compensa else 0.0
+            else:
+                abatido = min(prejuizo, resultado)
+                prejuizo -= abatido
+                compensado[k] = abatido
+                base[k] = resultado - abatido
+            saldo_prejuizo[k] = prejuizo
+
+    mensal['Prejuízo Compensado'] = compensado
+    mensal['Base'] = base
+    mensal['Imposto'] = base * mensal['Grupo'].map(lambda g: GRUPOS_IR[g][0]).to_numpy(dtype=np.float64)
+    mensal['Imposto Devido'] = (mensal['Imposto'] - mensal['IRRF']).clip(lower=0.0)
+    mensal['Prejuízo a Compensar'] = saldo_prejuizo
+    return mensal[colunas]
+
+def calcular_darfs(apuracao):
+    """
+    DARFs a pagar por mês e código (6015 = bolsa, 4600 = cripto).
+    Valores abaixo de R$ 10 acumulam para o mês seguinte. Vencimento: último dia útil do mês seguinte.
+    Retorna DataFrame Mês/Código/Imposto do Mês/Acumulado Anterior/Valor DARF/Vencimento.
+    """
+    colunas = ['Mês', 'Código', 'Imposto do Mês', 'Acumulado Anterior', 'Valor DARF', 'Vencimento']
+    if apuracao.empty:
+        return pd.DataFrame(columns=colunas)
+
+    codigos = apuracao['Grupo'].map(lambda g: GRUPOS_IR[g][1])
+    por_mes = apuracao.groupby(['Mês', codigos.rename('Código')], sort=True)['Imposto Devido'].sum().reset_index()
+
+    linhas = []
+    for codigo, grupo in por_mes.groupby('Código'):
+        pendente = 0.0
+        for mes, imposto in zip(grupo['Mês'], grupo['Imposto Devido']):
+            if imposto <= 0 and pendente <= 0:
+                continue
+            total = imposto + pendente
+            pagar = total if total >= DARF_MINIMO else 0.0
+            vencimento = (pd.Period(mes, 'M') + 1).to_timestamp() + pd.offsets.BMonthEnd(0)
+            linhas.append((mes, codigo, imposto, pendente, pagar, vencimento.date()))
+            pendente = 0.0 if pagar else total
+    return pd.DataFrame(linhas, columns=colunas).sort_values(['Mês', 'Código'], ignore_index=True)
+
+def bens_e_direitos(df_transacoes, ano):
+    """
+    Ficha "Bens e Direitos" do IRPF: custo de aquisição de cada ativo em 31/12 do ano anterior e do ano.
+    Usa o mesmo preço médio da apuração (compras de day trade fora do PM).
+    """
+    colunas = ['Código', 'Ativo', 'Categoria', 'Discriminação', f'Situação em 31/12/{ano - 1}', f'Situação em 31/12/{ano}']
+    _, posicoes = resultados_vendas(df_transacoes)
+    if posicoes.empty:
+        return pd.DataFrame(columns=colunas)
+
+    def situacao(fim):
+        ate = posicoes[posicoes['Data'] <= pd.Timestamp(fim)]
+        return ate.drop_duplicates('Ativo', keep='last').set_index('Ativo')[['Qtd', 'Custo']]
+
+    anterior = situacao(f"{ano - 1}-12-31")
+    atual = situacao(f"{ano}-12-31")
+    tabela = atual.join(anterior, how='outer', lsuffix='', rsuffix='_anterior').fillna(0.0)
+    tabela = tabela[(tabela['Custo'] > 0.01) | (tabela['Custo_anterior'] > 0.01)].reset_index()
+
+    categorias = mapa_categorias(df_transacoes)
+    ultimos = df_transacoes.sort_values('Data', kind='stable').drop_duplicates('Ativo', keep='last')
+    corretoras = dict(zip(ultimos['Ativo'], ultimos['Corretora']))
+
+    tabela['Categoria'] = tabela['Ativo'].map(categorias).fillna('Outros')
+    codigo_cripto = np.where(tabela['Ativo'] == 'BTC', '08 - 01', '08 - 02')
+    tabela['Código'] = np.where(tabela['Categoria'] == 'Criptomoedas', codigo_cripto,
+                                tabela['Categoria'].map(CODIGOS_BENS).fillna(''))
+    pm = np.divide(tabela['Custo'], tabela['Qtd'], out=np.zeros(len(tabela)), where=tabela['Qtd'] > 0)
+    tabela['Discriminação'] = [
+        f"{q:g} de {a} ({c}), custo médio R$ {p:,.2f}, custódia {corretoras.get(a, '-')}"
+        for q, a, c, p in zip(tabela['Qtd'], tabela['Ativo'], tabela['Categoria'], pm)
+    ]
+    tabela[f'Situação em 31/12/{ano - 1}'] = tabela['Custo_anterior']
+    tabela[f'Situação em 31/12/{ano}'] = tabela['Custo']
+    return tabela.sort_values(['Código', 'Ativo'], ignore_index=True)[colunas]
+
+# Funções de simulação de vendas ("e se eu vender?")
+# Toda a grade (ativo x fração vendida x choque de preço) é um único array NumPy montado por
+# broadcast; o imposto de cada ponto é o do mês corrente com a venda menos o do mês sem ela,
+# com as mesmas regras da apuração (isenções e prejuízo a compensar), sem laço por cenário.
+
+# Parcelas do mês que entram no cálculo do imposto (a venda simulada soma a cada uma)
+PARCELAS_MES = ['vendas_acoes', 'resultado_acoes', 'resultado_swing', 'resultado_fii', 'vendas_cripto', 'resultado_cripto']
+
+def _parcelas_venda(categoria):
+    """(parcela das vendas, parcela do resultado) de uma categoria; (None, None) fora da apuração mensal."""
+    if categoria == 'Ações':
+        return 'vendas_acoes', 'resultado_acoes'
+    if categoria in CATEGORIAS_SWING:
+        return None, 'resultado_swing'
+    if categoria == 'FIIs':
+        return None, 'resultado_fii'
+    if categoria == 'Criptomoedas':
+        return 'vendas_cripto', 'resultado_cripto'
+    return None, None
+
+def situacao_mes_ir(df_transacoes, hoje=None):
+    """
+    O que já aconteceu no mês corrente (vendas comuns e resultados por parcela de PARCELAS_MES)
+    e o prejuízo a compensar trazido dos meses anteriores ('prejuizo_swing', 'prejuizo_fii').
+    """
+    mes = pd.Timestamp(hoje or pd.Timestamp.today()).strftime('%Y-%m')
+    situacao = dict.fromkeys(PARCELAS_MES + ['prejuizo_swing', 'prejuizo_fii'], 0.0)
+    if df_transacoes.empty:
+        return situacao
+
+    df_vendas, _ = resultados_vendas(df_transacoes)
+    do_mes = df_vendas[(df_vendas['Mês'] == mes) & (df_vendas['Operação'] != 'Day Trade')]
+    for categoria, linhas in do_mes.groupby('Categoria'):
+        vendas, resultado = _parcelas_venda(categoria)
+        if vendas:
+            situacao[vendas] += float(linhas['Valor Venda'].sum())
+        if resultado:
+            situacao[resultado] += float(linhas['Resultado'].sum())
+
+    apuracao = apurar_ir_mensal(df_transacoes)
+    anteriores = apuracao[apuracao['Mês'] < mes].drop_duplicates('Grupo', keep='last').set_index('Grupo')
+    situacao['prejuizo_swing'] = float(anteriores['Prejuízo a Compensar'].get('Swing Trade', 0.0))
+    situacao['prejuizo_fii'] = float(anteriores['Prejuízo a Compensar'].get('FIIs', 0.0))
+    return situacao
+
+def _imposto_mes(parcelas, prejuizo_swing, prejuizo_fii):
+    """Imposto (antes do IRRF) dos grupos Swing Trade, FIIs e Criptomoedas; aceita arrays de qualquer formato."""
+    isento_acoes = np.where(parcelas['vendas_acoes'] <= LIMITE_ISENCAO_ACOES, np.maximum(parcelas['resultado_acoes'], 0.0), 0.0)
+    tributavel_swing = parcelas['resultado_acoes'] + parcelas['resultado_swing'] - isento_acoes
+    swing = np.maximum(tributavel_swing - prejuizo_swing, 0.0) * GRUPOS_IR['Swing Trade'][0]
+    fii = np.maximum(parcelas['resultado_fii'] - prejuizo_fii, 0.0) * GRUPOS_IR['FIIs'][0]
+    cripto = np.where(parcelas['vendas_cripto'] <= LIMITE_ISENCAO_CRIPTO, 0.0,
+                      np.maximum(parcelas['resultado_cripto'], 0.0) * GRUPOS_IR['Criptomoedas'][0])
+    return swing + fii + cripto
+
+def simular_vendas(posicoes, fracoes, choques, situacao=None):
+    """
+    Grade de vendas simuladas de todas as posições de uma vez.
+    'posicoes': DataFrame Ativo/Categoria/Qtd/PM/Preço (preço de hoje); 'fracoes': frações vendidas
+    (0 a 1); 'choques': variações do preço (ex: -0.2 = cai 20%); 'situacao': de situacao_mes_ir
+    (sem ela, o mês começa zerado e sem prejuízo a compensar).
+    Retorna um dict com arrays (ativo x fração x choque) 'receita', 'resultado' e 'imposto' (imposto
+    do ativo vendido sozinho) e (fração x choque) 'receita_total', 'resultado_total', 'imposto_total'
+    (todos os ativos vendidos juntos no mês), 'liquido_total' (receita - imposto) e
+    'lucro_liquido_total' (resultado - imposto).
+    Exterior e Renda Fixa ficam com imposto zero: não entram no DARF mensal.
+    """
+    situacao = situacao or dict.fromkeys(PARCELAS_MES + ['prejuizo_swing', 'prejuizo_fii'], 0.0)
+    fracoes = np.asarray(fracoes, dtype=np.float64)
+    choques = np.asarray(choques, dtype=np.float64)
+    qtd = posicoes['Qtd'].to_numpy(dtype=np.float64)[:, None, None]
+    pm = posicoes['PM'].to_numpy(dtype=np.float64)[:, None, None]
+    preco = posicoes['Preço'].to_numpy(dtype=np.float64)[:, None, None]
+
+    vendida = qtd * fracoes[None, :, None]
+    receita = vendida * (preco * (1.0 + choques[None, None, :]))
+    resultado = receita - vendida * pm
+
+    # Máscara ativo -> parcela (vendas e resultado): cada venda soma só nas parcelas do seu grupo
+    parcelas = [_parcelas_venda(c) for c in posicoes['Categoria']]
+    mascaras = {
+        nome: np.array([nome in par for par in parcelas], dtype=np.float64)[:, None, None]
+        for nome in PARCELAS_MES
+    }
+    contribuicao = {
+        nome: (receita if nome.startswith('vendas') else resultado) * mascaras[nome] for nome in PARCELAS_MES
+    }
+    prejuizos = situacao['prejuizo_swing'], situacao['prejuizo_fii']
+    imposto_base = _imposto_mes({nome: situacao[nome] for nome in PARCELAS_MES}, *prejuizos)
+    isolado = {nome: situacao[nome] + valor for nome, valor in contribuicao.items()}
+    juntos = {nome: situacao[nome] + valor.sum(axis=0) for nome, valor in contribuicao.items()}
+    imposto = _imposto_mes(isolado, *prejuizos) - imposto_base
+    imposto_total = _imposto_mes(juntos, *prejuizos) - imposto_base
+    receita_total = receita.sum(axis=0)
+    resultado_total = resultado.sum(axis=0)
+    return {
+        'ativos': posicoes['Ativo'].tolist(),
+        'fracoes': fracoes,
+        'choques': choques,
+        'receita': receita,
+        'resultado': resultado,
+        'imposto': imposto,
+        'receita_total': receita_total,
+        'resultado_total': resultado_total,
+        'imposto_total': imposto_total,
+        'liquido_total': receita_total - imposto_total,
+        'lucro_liquido_total': resultado_total - imposto_total,
+    }
@@ -0,0 +1,145 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+from constants import *
+from nucleo.posicoes import calcular_carteira_atual, classificar_ativo
+from nucleo.risco import COLUNA_CARTEIRA, DIAS_UTEIS_ANO, retornos_diarios
+
+# Funções de meta
+
+def calcular_progresso_metas(df_transacoes, lista_metas):
+    """
+    Recebe o DataFrame de transações e a lista de metas do banco.
+    Retorna uma lista de dicionários com o progresso calculado.
+    """
+    resultados = []
+    carteira_atual = calcular_carteira_atual(df_transacoes)
+    total_investido = carteira_atual.custo_total()
+    # Classe de cada ativo da carteira (pela primeira categoria registrada)
+    classes = np.array([classificar_ativo(cat).lower() for cat in carteira_atual.categorias(df_transacoes, manter='first')], dtype=object)
+    total_proventos = df_transacoes[df_transacoes['Tipo'].isin(['Dividendo', 'JCP'])]['Total'].sum()
+    for meta in lista_metas:
+        id_meta, tipo, filtro, valor_alvo, data_limite, descricao = meta
+        
+        valor_atual = 0.0
+        if tipo == 'Patrimônio Total':
+            valor_atual = total_investido
+            
+        elif tipo == 'Total em Categoria':
+            valor_atual = float(carteira_atual.custo[classes == filtro.lower()].sum())
+                    
+        elif tipo == 'Renda Passiva (Total)':
+            valor_atual = total_proventos
+        progresso_pct = (valor_atual / valor_alvo) if valor_alvo > 0 else 0
+        if progresso_pct > 1.0: progresso_pct = 1.0
+        
+        falta = valor_alvo - valor_atual
+        if falta < 0: falta = 0
+        
+        resultados.append({
+            "id": id_meta,
+            "titulo": descricao if descricao else f"{tipo} - {filtro}",
+            "tipo": tipo,
+            "valor_atual": valor_atual,
+            "valor_alvo": valor_alvo,
+            "falta": falta,
+            "pct": progresso_pct,
+            "data_limite": data_limite
+        })
+        
+    return resultados
+
+# Funções de simulação das metas (Monte Carlo)
+# Cada cenário sorteia retornos mensais lognormais. Com L = retorno acumulado em log, o valor no mês t
+# é V0 * e^L(t) + aporte * e^L(t) * soma(e^-L(s), s <= t): todas as metas e todos os meses de um lote
+# saem da mesma matriz cenários x meses, sem laço por mês.
+
+TIPOS_SIMULAVEIS = ['Patrimônio Total', 'Total em Categoria']
+COLUNAS_SIMULACAO = ['ID', 'Meta', 'Prazo (meses)', 'Chance (%)', 'Meses até a Meta',
+                     'P10 no Prazo', 'Mediana no Prazo', 'P90 no Prazo']
+
+def estimar_retorno_volatilidade(df_valor, minimo_dias=DIAS_UTEIS_ANO // 4):
+    """
+    Retorno e volatilidade anuais da carteira, pelos retornos diários de valor_diario.
+    Com menos de minimo_dias de histórico, usa RETORNO_PADRAO_MC e VOLATILIDADE_PADRAO_MC.
+    """
+    retornos = retornos_diarios(df_valor)
+    serie = retornos[COLUNA_CARTEIRA].dropna() if not retornos.empty else pd.Series(dtype=float)
+    if len(serie) < minimo_dias:
+        return RETORNO_PADRAO_MC, VOLATILIDADE_PADRAO_MC
+    retorno = float((1 + serie).prod() ** (DIAS_UTEIS_ANO / len(serie)) - 1)
+    return retorno, float(serie.std() * np.sqrt(DIAS_UTEIS_ANO))
+
+def _meses_ate(data_limite, hoje, padrao):
+    prazo = pd.to_datetime(data_limite, errors='coerce')
+    if pd.isna(prazo):
+        return padrao
+    meses = (prazo.year - hoje.year) * 12 + prazo.month - hoje.month
+    return meses if meses > 0 else padrao
+
+def simular_metas(lista_progresso, patrimonio_atual, aporte_mensal=0.0, retorno_anual=RETORNO_PADRAO_MC,
+                  volatilidade_anual=VOLATILIDADE_PADRAO_MC, simulacoes=SIMULACOES_MC,
+                  horizonte_meses=HORIZONTE_MC_MESES, semente=None, hoje=None, progresso=None, lote=2000):
+    """
+    Monte Carlo das metas em valor (lista do calcular_progresso_metas; 'Renda Passiva' fica de fora).
+    O aporte mensal vai inteiro para 'Patrimônio Total' e, nas metas de categoria, na proporção do
+    peso atual da categoria. Metas sem prazo usam horizonte_meses.
+    progresso(fração), se passado, é chamado a cada lote de cenários.
+    Retorna dict com:
+      - metas: chance de chegar ao alvo até o prazo, meses até lá (mediana) e P10/P50/P90 no prazo
+      - percentis: patrimônio total projetado mês a mês (P10, P50, P90)
+    """
+    hoje = pd.Timestamp(hoje or date.today())
+    metas = [m for m in lista_progresso if m['tipo'] in TIPOS_SIMULAVEIS]
+    horizontes = np.array([_meses_ate(m['data_limite'], hoje, horizonte_meses) for m in metas], dtype=np.int64)
+    total_meses = int(max(horizontes.max(initial=0), horizonte_meses))
+
+    peso = lambda m: 1.0 if m['tipo'] == 'Patrimônio Total' else (m['valor_atual'] / patrimonio_atual if patrimonio_atual > 0 else 0.0)
+    # Coluna 0 = patrimônio total (para os percentis), demais = uma por meta
+    iniciais = np.array([patrimonio_atual] + [m['valor_atual'] for m in metas], dtype=np.float64)
+    aportes = np.array([aporte_mensal] + [aporte_mensal * peso(m) for m in metas], dtype=np.float64)
+    alvos = np.array([m['valor_alvo'] for m in metas], dtype=np.float64)
+    colunas_metas = np.arange(1, len(metas) + 1)
+
+    sigma = volatilidade_anual / np.sqrt(12)
+    mu = np.log1p(retorno_anual) / 12 - sigma ** 2 / 2
+    gerador = np.random.default_rng(semente)
+
+    no_prazo, meses_ate, caminhos = [], [], []
+    feitos = 0
+    while feitos < simulacoes:
+        n = min(lote, simulacoes - feitos)
+        log_acumulado = np.cumsum(gerador.normal(mu, sigma, size=(n, total_meses)), axis=1)
+        crescimento = np.exp(log_acumulado)
+        aportes_corrigidos = crescimento * np.cumsum(np.exp(-log_acumulado), axis=1)
+        # cenários x meses x (patrimônio + metas)
+        valores = crescimento[:, :, None] * iniciais + aportes_corrigidos[:, :, None] * aportes
+        caminhos.append(valores[:, :, 0].astype(np.float32))
+        if len(metas):
+            no_prazo.append(valores[:, horizontes - 1, colunas_metas])
+            atingiu = valores[:, :, 1:] >= alvos
+            meses_ate.append(np.where(atingiu.any(axis=1), atingiu.argmax(axis=1) + 1, np.inf))
+        feitos += n
+        if progresso:
+            progresso(feitos / simulacoes)
+
+    datas = pd.date_range(hoje + pd.offsets.MonthEnd(1), periods=total_meses, freq='ME')
+    percentis = pd.DataFrame(np.percentile(np.vstack(caminhos), [10, 50, 90], axis=0).T,
+                             index=datas, columns=['P10', 'P50', 'P90'])
+    if not metas:
+        return {"metas": pd.DataFrame(columns=COLUNAS_SIMULACAO), "percentis": percentis}
+
+    no_prazo = np.vstack(no_prazo)
+    meses_ate = np.vstack(meses_ate)
+    meses_ate[:, iniciais[1:] >= alvos] = 0      # Já atingidas
+    mediana_meses = np.median(meses_ate, axis=0)
+    p10, p50, p90 = np.percentile(no_prazo, [10, 50, 90], axis=0)
+    df_metas = pd.DataFrame({
+        'ID': [m['id'] for m in metas],
+        'Meta': [m['titulo'] for m in metas],
+        'Prazo (meses)': horizontes,
+        'Chance (%)': (meses_ate <= horizontes).mean(axis=0) * 100,
+        'Meses até a Meta': np.where(np.isfinite(mediana_meses), mediana_meses, np.nan),
+        'P10 no Prazo': p10, 'Mediana no Prazo': p50, 'P90 no Prazo': p90,
+    }, columns=COLUNAS_SIMULACAO)
+    return {"metas": df_metas, "percentis": percentis}
@@ -0,0 +1,398 @@
+import numpy as np
+import pandas as pd
+from constants import *
+
+# Funções de posição (preço médio, carteira atual e alocação)
+
+class LivroPosicoes:
+    """
+    Carteira compacta: ativos internados em um array + arrays float64 paralelos de Qtd e Custo.
+    Substitui o antigo dict {'PETR4': {'qtd': ..., 'custo_total': ...}}.
+    É passado por referência entre as funções e vira DataFrame sem copiar os arrays.
+    """
+    __slots__ = ('ativos', 'qtd', 'custo', '_indice')
+
+    def __init__(self, ativos, qtd, custo):
+        self.ativos = np.asarray(ativos, dtype=object)
+        self.qtd = np.asarray(qtd, dtype=np.float64)
+        self.custo = np.asarray(custo, dtype=np.float64)
+        self._indice = None
+
+    def __len__(self):
+        return len(self.ativos)
+
+    def __contains__(self, ativo):
+        return ativo in self.indice
+
+    @property
+    def indice(self):
+        """Mapa ativo -> posição nos arrays (montado só quando alguém precisa)."""
+        if self._indice is None:
+            self._indice = {ativo: i for i, ativo in enumerate(self.ativos)}
+        return self._indice
+
+    @property
+    def pm(self):
+        """Preço médio de cada ativo (0 onde a quantidade é zero)."""
+        return np.divide(self.custo, self.qtd, out=np.zeros_like(self.custo), where=self.qtd > 0)
+
+    def posicao(self, ativo):
+        """Retorna (qtd, custo_total) de um ativo, ou (0.0, 0.0) se não estiver na carteira."""
+        i = self.indice.get(ativo)
+        if i is None:
+            return 0.0, 0.0
+        return float(self.qtd[i]), float(self.custo[i])
+
+    def custo_total(self):
+        return float(self.custo.sum())
+
+    def filtrar(self, mascara):
+        """Novo livro só com as posições onde a máscara é True."""
+        return LivroPosicoes(self.ativos[mascara], self.qtd[mascara], self.custo[mascara])
+
+    def categorias(self, df_transacoes, manter='last'):
+        """Categoria de cada ativo do livro, alinhada aos arrays."""
+        mapa = mapa_categorias(df_transacoes, manter)
+        return np.array([mapa.get(ativo, "Outros") for ativo in self.ativos], dtype=object)
+
+    def para_dataframe(self):
+        """DataFrame Ativo/Quantidade/Preço Médio/Total Investido apontando para os mesmos arrays."""
+        return pd.DataFrame({
+            "Ativo": self.ativos,
+            "Quantidade": self.qtd,
+            "Preço Médio": self.pm,
+            "Total Investido": self.custo
+        }, copy=False)
+
+def mapa_categorias(df_transacoes, manter='last'):
+    """
+    Cria um dict { 'PETR4': 'Ações', 'TESOURO': 'Tesouro Direto' ... }
+    com o último (ou primeiro) registro de categoria de cada ativo.
+    """
+    if df_transacoes.empty or 'Categoria' not in df_transacoes.columns:
+        return {}
+    df_unicos = df_transacoes[['Ativo', 'Categoria']].drop_duplicates('Ativo', keep=manter)
+    return dict(zip(df_unicos['Ativo'], df_unicos['Categoria']))
+
+def calcular_carteira_atual(df):
+    """
+    Retorna apenas o livro da carteira atual (Qtd e Custo de cada ativo).
+    """
+    carteira, _ = _processar_fluxo_caixa(df)
+    return carteira
+
+def calcular_lucro_realizado(df):
+    """
+    Retorna apenas o valor total do Lucro Realizado com vendas.
+    """
+    _, lucro = _processar_fluxo_caixa(df)
+    return lucro
+
+def _processar_fluxo_caixa(df):
+    """
+    Função interna para preço médio.
+    Percorre as transações uma vez (sem iterrows) e devolve (LivroPosicoes, lucro realizado).
+    """
+    if df.empty:
+        return LivroPosicoes([], [], []), 0.0
+
+    df = df.sort_values('Data', kind='stable')
+    codigos, ativos = pd.factorize(df['Ativo'])
+    qtd = [0.0] * len(ativos)
+    custo = [0.0] * len(ativos)
+    lucro_acumulado = 0.0
+
+    colunas = zip(
+        codigos.tolist(),
+        df['Tipo'].tolist(),
+        df['Qtd'].to_numpy(dtype=np.float64, na_value=0.0).tolist(),
+        df['Total'].to_numpy(dtype=np.float64, na_value=0.0).tolist()
+    )
+    for i, tipo, q, total in colunas:
+        if tipo in TIPOS_ENTRADA:
+            qtd[i] += q
+            custo[i] += total
+        elif tipo in TIPOS_SAIDA:
+            if qtd[i] > 0:
+                custo_saida = custo[i] / qtd[i] * q
+
+                if tipo == 'Venda':     # Apenas vendas, lucro do resgate já foi registrado nas bonificações
+                    lucro_acumulado += total - custo_saida
+
+                qtd[i] -= q
+                custo[i] -= custo_saida
+
+    carteira = LivroPosicoes(np.asarray(ativos, dtype=object), qtd, custo)
+    carteira_limpa = carteira.filtrar(carteira.qtd > 0.000001)
+    return carteira_limpa, lucro_acumulado
+
+def historico_posicoes(df):
+    """
+    Qtd e Custo de cada ativo logo após cada transação (mesma regra de preço médio).
+    Retorna DataFrame Data/Ativo/Qtd/Custo com uma linha por transação, em ordem cronológica.
+    Serve de base para as séries diárias (posição 'as-of' de cada data).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['Data', 'Ativo', 'Qtd', 'Custo'])
+
+    df = df.sort_values('Data', kind='stable')
+    codigos, ativos = pd.factorize(df['Ativo'])
+    qtd = [0.0] * len(ativos)
+    custo = [0.0] * len(ativos)
+    qtd_apos = []
+    custo_apos = []
+
+    colunas = zip(
+        codigos.tolist(),
+        df['Tipo'].tolist(),
+        df['Qtd'].to_numpy(dtype=np.float64, na_value=0.0).tolist(),
+        df['Total'].to_numpy(dtype=np.float64, na_value=0.0).tolist()
+    )
+    for i, tipo, q, total in colunas:
+        if tipo in TIPOS_ENTRADA:
+            qtd[i] += q
+            custo[i] += total
+        elif tipo in TIPOS_SAIDA and qtd[i] > 0:
+            custo[i] -= custo[i] / qtd[i] * q
+            qtd[i] -= q
+        qtd_apos.append(qtd[i])
+        custo_apos.append(custo[i])
+
+    return pd.DataFrame({
+        'Data': pd.to_datetime(df['Data']).to_numpy(),
+        'Ativo': np.asarray(ativos, dtype=object)[codigos],
+        'Qtd': np.asarray(qtd_apos, dtype=np.float64),
+        'Custo': np.asarray(custo_apos, dtype=np.float64)
+    }, copy=False)
+
+# Quebras da posição: nome -> colunas usadas como chave
+AGRUPAMENTOS_POSICAO = {
+    "Ativo": ['Ativo'],
+    "Ativo x Corretora": ['Ativo', 'Corretora'],
+    "Ativo x Moeda": ['Ativo', 'Moeda'],
+}
+
+def calcular_posicoes_agrupadas(df, agrupamentos=None):
+    """
+    Qtd, PM e Custo por várias chaves ao mesmo tempo (ex: ativo x corretora, ativo x moeda).
+    Uma única passada pelo extrato atualiza um livro por agrupamento (mesma regra de preço médio).
+    Retorna { nome do agrupamento: DataFrame com as chaves + Quantidade/Preço Médio/Total Investido }.
+    """
+    agrupamentos = agrupamentos or AGRUPAMENTOS_POSICAO
+    colunas_valor = ["Quantidade", "Preço Médio", "Total Investido"]
+    if df.empty:
+        return {nome: pd.DataFrame(columns=chaves + colunas_valor) for nome, chaves in agrupamentos.items()}
+
+    df = df.sort_values('Data', kind='stable')
+    codigos = []
+    chaves_unicas = []
+    for chaves in agrupamentos.values():
+        codigo, unicas = pd.MultiIndex.from_frame(df[chaves].fillna('-')).factorize()
+        codigos.append(codigo.tolist())
+        chaves_unicas.append(unicas)
+    qtd = [[0.0] * len(unicas) for unicas in chaves_unicas]
+    custo = [[0.0] * len(unicas) for unicas in chaves_unicas]
+    livros = range(len(codigos))
+
+    colunas = zip(
+        df['Tipo'].tolist(),
+        df['Qtd'].to_numpy(dtype=np.float64, na_value=0.0).tolist(),
+        df['Total'].to_numpy(dtype=np.float64, na_value=0.0).tolist(),
+        *codigos
+    )
+    for tipo, q, total, *indices in colunas:
+        if tipo in TIPOS_ENTRADA:
+            for k in livros:
+                qtd[k][indices[k]] += q
+                custo[k][indices[k]] += total
+        elif tipo in TIPOS_SAIDA:
+            for k in livros:
+                i = indices[k]
+                if qtd[k][i] > 0:
+                    custo[k][i] -= custo[k][i] / qtd[k][i] * q
+                    qtd[k][i] -= q
+
+    resultado = {}
+    for (nome, chaves), unicas, q, c in zip(agrupamentos.items(), chaves_unicas, qtd, custo):
+        q, c = np.asarray(q, dtype=np.float64), np.asarray(c, dtype=np.float64)
+        tabela = unicas.to_frame(index=False, name=chaves)
+        tabela["Quantidade"] = q
+        tabela["Preço Médio"] = np.divide(c, q, out=np.zeros_like(c), where=q > 0)
+        tabela["Total Investido"] = c
+        resultado[nome] = tabela[q > 0.000001].sort_values(chaves, ignore_index=True)
+    return resultado
+
+def conciliar_custodia(df, posicoes_corretora=None):
+    """
+    Conciliação de custódia por corretora: saldo líquido (entradas - saídas) de cada ativo em cada corretora
+    contra a quantidade do livro 'Ativo x Corretora' (que ignora saídas sem saldo naquela corretora).
+    Divergência indica venda/resgate lançado antes da entrada ou em outra corretora
+    (ex: transferência de custódia não registrada). '% do Ativo' é a fatia da posição total do ativo.
+    """
+    colunas = ['Corretora', 'Ativo', 'Entradas', 'Saídas', 'Saldo', 'Qtd no Livro', '% do Ativo', 'Status']
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+    if posicoes_corretora is None:
+        posicoes_corretora = calcular_posicoes_agrupadas(df, {"Ativo x Corretora": ['Ativo', 'Corretora']})["Ativo x Corretora"]
+
+    sinal = np.select([df['Tipo'].isin(TIPOS_ENTRADA), df['Tipo'].isin(TIPOS_SAIDA)], [1.0, -1.0], default=0.0)
+    qtd = df['Qtd'].to_numpy(dtype=np.float64, na_value=0.0)
+    base = pd.DataFrame({
+        'Corretora': df['Corretora'].fillna('-').to_numpy(),
+        'Ativo': df['Ativo'].to_numpy(),
+        'Entradas': np.where(sinal > 0, qtd, 0.0),
+        'Saídas': np.where(sinal < 0, qtd, 0.0)
+    })
+    tabela = base.groupby(['Corretora', 'Ativo'], sort=True)[['Entradas', 'Saídas']].sum().reset_index()
+    tabela['Saldo'] = tabela['Entradas'] - tabela['Saídas']
+    livro = posicoes_corretora.set_index(['Corretora', 'Ativo'])['Quantidade']
+    tabela['Qtd no Livro'] = livro.reindex(pd.MultiIndex.from_frame(tabela[['Corretora', 'Ativo']])).fillna(0.0).to_numpy()
+    tabela = tabela[(tabela['Saldo'].abs() > 0.000001) | (tabela['Qtd no Livro'] > 0.000001)]
+
+    total_ativo = tabela['Qtd no Livro'].groupby(tabela['Ativo']).transform('sum')
+    tabela['% do Ativo'] = np.where(total_ativo > 0, tabela['Qtd no Livro'] / total_ativo.where(total_ativo > 0, 1.0) * 100, 0.0)
+    tabela['Status'] = np.select(
+        [tabela['Saldo'] < -0.000001, (tabela['Saldo'] - tabela['Qtd no Livro']).abs() > 0.000001],
+        ["⚠️ Saída maior que a custódia", "⚠️ Saída antes da entrada"],
+        default="✅ OK"
+    )
+    return tabela[colunas].reset_index(drop=True)
+
+def calcular_resumo_ativos(df_transacoes):
+    """
+    Calcula Qtd e Preço Médio de cada ativo.
+    Retorna um DataFrame pronto para exibição.
+    """
+    if df_transacoes.empty:
+        return pd.DataFrame()
+
+    df_resumo = calcular_carteira_atual(df_transacoes).para_dataframe()
+    if not df_resumo.empty:
+        df_resumo = df_resumo.sort_values("Ativo")
+        
+    return df_resumo
+
+def calcular_alocacao_por_classe(df):
+    """
+    Agrupa o total investido por Classe de Ativo (Renda Fixa x Variavel).
+    Retorna DataFrame pronto para o gráfico de Pizza.
+    """
+    # Calcula a alocação baseada na carteira ATUAL (Saldo de Compras - Vendas/Resgates)
+    carteira_atual = calcular_carteira_atual(df)
+    carteira_atual = carteira_atual.filtrar(carteira_atual.custo > 0.01)
+    if not len(carteira_atual):
+        return pd.DataFrame(columns=['Classe_Ativo', 'Total'])
+
+    categorias = carteira_atual.categorias(df)
+    df_chart = pd.DataFrame({
+        'Classe_Ativo': np.where(np.isin(categorias, MAPA_CLASSES['Renda Fixa']), 'Renda Fixa', 'Renda Variável'),
+        'Total': carteira_atual.custo
+    }, copy=False)
+    return df_chart.groupby('Classe_Ativo')['Total'].sum().reset_index()
+
+def gerar_tabela_alocacao(carteira, df_transacoes):
+    """
+    Gera a tabela de alocação detalhada por ativo e suas categorias.
+    """
+    carteira = carteira.filtrar(carteira.custo > 0.01)
+    categorias = carteira.categorias(df_transacoes)
+
+    # Tudo que não é Renda Fixa entra como Variável no gráfico macro
+    return pd.DataFrame({
+        'Ativo': carteira.ativos,
+        'Categoria': categorias,
+        'Classe': np.where(np.isin(categorias, MAPA_CLASSES['Renda Fixa']), 'Renda Fixa', 'Renda Variável'),
+        'Total Investido': carteira.custo
+    }, copy=False)
+
+def calcular_cenarios_simulacao(qtd_atual, preco_simulado, pm_atual, fracoes=(0.25, 0.50, 0.75, 1.0)):
+    """
+    Gera cenários de venda parcial de um ativo (padrão 25%, 50%, 75%, 100%).
+    Para a carteira inteira, com choques de preço e imposto, ver impostos.simular_vendas.
+    """
+    fracoes = np.asarray(fracoes, dtype=np.float64)
+    qtd = qtd_atual * fracoes
+    return pd.DataFrame({
+        "Cenário": [f"Vender {p * 100:g}%" for p in fracoes],
+        "Qtd": qtd,
+        "Receba (R$)": qtd * preco_simulado,
+        "Lucro (R$)": qtd * (preco_simulado - pm_atual)
+    })
+
+def classificar_ativo(categoria_input, *args):
+    cat = str(categoria_input).strip()
+
+    # 1. Se for Renda Fixa -> Retorna "Renda Fixa"
+    if cat in MAPA_CLASSES["Renda Fixa"]:
+        return "Renda Fixa"
+
+    # 2. Se for Variável -> Retorna o PRÓPRIO nome (Ex: "Ações", "Stocks")
+    if cat in MAPA_CLASSES["Renda Variável"]:
+        return cat
+
+    # Caso não encontre
+    return "Outros"
+
+def selecionar_ativos_renda_variavel(carteira, df_transacoes):
+    """
+    Retorna os ativos da carteira que são Renda Variável (os que têm cotação de mercado).
+    """
+    return carteira.ativos[_mascara_renda_variavel(carteira, df_transacoes)].tolist()
+
+def _mascara_renda_variavel(carteira, df_transacoes):
+    categorias = carteira.categorias(df_transacoes)
+    return (carteira.qtd >= 0.000001) & np.isin(categorias, MAPA_CLASSES["Renda Variável"])
+
+def gerar_painel_rentabilidade(carteira, df_transacoes, cotacoes, valores_rf=None):
+    """
+    Monta a tabela comparando PM x Cotação Atual.
+    'cotacoes' é o dict {ativo: preço} (quem chama decide de onde vem e como cachear).
+    'valores_rf' é o dict {ativo: valor na curva} da Renda Fixa; títulos sem valor ficam pelo custo.
+    """
+    valores_rf = valores_rf or {}
+    categorias = carteira.categorias(df_transacoes)
+    mascara_rv = _mascara_renda_variavel(carteira, df_transacoes)
+    mascara_rf = (carteira.qtd >= 0.000001) & np.isin(categorias, MAPA_CLASSES["Renda Fixa"])
+    painel = carteira.filtrar(mascara_rv | mascara_rf)
+    eh_rf = mascara_rf[mascara_rv | mascara_rf]
+    pm = painel.pm
+
+    # Renda Variável usa a cotação; Renda Fixa usa o valor na curva dividido pela quantidade
+    cotacao_atual = np.array([
+        valores_rf.get(ativo, np.nan) / qtd if rf else cotacoes.get(ativo, np.nan)
+        for ativo, qtd, rf in zip(painel.ativos, painel.qtd, eh_rf)
+    ], dtype=np.float64)
+    usou_fallback = np.isnan(cotacao_atual)
+    cotacao_atual[usou_fallback] = pm[usou_fallback]
+
+    valor_atual = painel.qtd * cotacao_atual
+    lucro_rs = valor_atual - painel.custo
+    lucro_pct = np.divide(lucro_rs, painel.custo, out=np.zeros_like(lucro_rs), where=painel.custo > 0) * 100
+
+    status_rv = np.where(usou_fallback, "⚠️ Offline", "✅ Online")
+    status_rf = np.where(usou_fallback, "💼 Custo", "📈 Na Curva")
+    df_rent = pd.DataFrame({
+        "Ativo": painel.ativos,
+        "Classe": np.where(eh_rf, "Renda Fixa", "Renda Variável"),
+        "Qtd": painel.qtd,
+        "PM": pm,
+        "Cotação Atual": cotacao_atual,
+        "Valor Atual": valor_atual,
+        "Lucro (R$)": lucro_rs,
+        "Var (%)": lucro_pct,
+        "Status": np.where(eh_rf, status_rf, status_rv)
+    }, copy=False)
+    if not df_rent.empty:
+        df_rent = df_rent.sort_values(by="Var (%)", ascending=False)
+
+    total_custo_carteira = painel.custo_total()
+    total_atual_carteira = float(valor_atual.sum())
+    resumo_geral = {
+        "custo_total": total_custo_carteira,
+        "valor_atual": total_atual_carteira,
+        "valor_renda_fixa": float(valor_atual[eh_rf].sum()),
+        "lucro_total_rs": total_atual_carteira - total_custo_carteira,
+        "lucro_total_pct": ((total_atual_carteira - total_custo_carteira) / total_custo_carteira * 100) if total_custo_carteira > 0 else 0
+    }
+    
+    return df_rent, resumo_geral
@@ -0,0 +1,68 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+from constants import *
+from database import ler_precos, salvar_precos, ultimas_datas_precos
+from nucleo.cotacoes import normalizar_ticker
+
+# Funções do histórico local de preços (fechamento diário via yfinance)
+# Só os dias que ainda não estão no banco são baixados.
+
+def atualizar_historico_precos(inicio_por_ativo, hoje=None):
+    """
+    Baixa o fechamento diário dos ativos e grava no banco.
+    inicio_por_ativo: { 'PETR4': data da primeira transação, ... }
+    Cada ativo é buscado a partir do dia seguinte ao último preço gravado.
+    Retorna a quantidade de preços novos.
+    """
+    import yfinance as yf
+
+    if not inicio_por_ativo:
+        return 0
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    ultimas = ultimas_datas_precos()
+    inicios = {}
+    for ativo, primeira in inicio_por_ativo.items():
+        ultima = ultimas.get(ativo)
+        inicio = pd.Timestamp(ultima) + pd.Timedelta(days=1) if ultima else pd.Timestamp(primeira).normalize()
+        if inicio <= hoje:
+            inicios[ativo] = inicio
+    if not inicios:
+        return 0
+
+    mapa_tickers = {normalizar_ticker(ativo): ativo for ativo in inicios}
+    try:
+        # Um único download em lote, a partir do início mais antigo
+        dados = yf.download(list(mapa_tickers), start=min(inicios.values()).date(),
+                            end=(hoje + pd.Timedelta(days=1)).date(), progress=False, auto_adjust=False)['Close']
+    except Exception as e:
+        print(f"Erro ao baixar histórico de preços: {e}")
+        return 0
+    if isinstance(dados, pd.Series):
+        dados = dados.to_frame(next(iter(mapa_tickers)))
+
+    linhas = []
+    for ticker, ativo in mapa_tickers.items():
+        if ticker not in dados.columns:
+            continue
+        serie = dados[ticker].dropna()
+        serie = serie[serie.index >= inicios[ativo]]
+        linhas.extend((ativo, d.strftime('%Y-%m-%d'), float(v)) for d, v in serie.items())
+    salvar_precos(linhas)
+    return len(linhas)
+
+def carregar_precos(ativos, data_inicio=None):
+    """Histórico de fechamento em formato largo (datas x ativos)."""
+    dados = ler_precos(list(ativos), data_inicio)
+    if not dados:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), dtype=np.float64)
+    df = pd.DataFrame(dados, columns=['Ativo', 'Data', 'Fechamento'])
+    df['Data'] = pd.to_datetime(df['Data'])
+    return df.pivot(index='Data', columns='Ativo', values='Fechamento')
+
+def inicios_renda_variavel(df_transacoes):
+    """{ ativo: data da primeira transação } dos ativos de Renda Variável (os que têm cotação)."""
+    df_rv = df_transacoes[df_transacoes['Categoria'].isin(MAPA_CLASSES["Renda Variável"])]
+    if df_rv.empty:
+        return {}
+    return pd.to_datetime(df_rv['Data']).groupby(df_rv['Ativo']).min().to_dict()
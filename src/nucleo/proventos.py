@@ -0,0 +1,154 @@
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from constants import *
+
+# Funções de proventos (dividendos, JCP e bonificações)
+
+def calcular_total_bonificacoes(df):
+    """
+    Retorna apenas a soma financeira do que entrou como Bonificação.
+    """
+    if df.empty:
+        return 0.0
+    total = df[df['Tipo'] == 'Bonificacao']['Qtd'].sum()
+    return float(total)
+
+def calcular_proventos_ano_atual(df):
+    """
+    Retorna a soma financeira de proventos (Dividendo/JCP) do ano ATUAL.
+    """
+    if df.empty:
+        return 0.0
+    
+    # Garante datetime
+    if not pd.api.types.is_datetime64_any_dtype(df['Data']):
+        df = df.copy()
+        df['Data'] = pd.to_datetime(df['Data'])
+        
+    ano_atual = datetime.now().year
+    mask_ano = df['Data'].dt.year == ano_atual
+    mask_tipo = df['Tipo'].isin(['Dividendo', 'JCP', 'Bonificacao'])
+    
+    total = df.loc[mask_ano & mask_tipo, 'Total'].sum()
+    return float(total)
+
+def calcular_proventos_caixa(df):
+    """
+    Retorna a soma de todos os proventos pagos em dinheiro (Dividendo/JCP).
+    """
+    if df.empty:
+        return 0.0
+    return float(df[df['Tipo'].isin(['Dividendo', 'JCP'])]['Total'].sum())
+
+# Funções de projeção de proventos (calendário dos próximos 12 meses)
+# Os pagamentos passados viram um resumo ativo x mês, corrigido pela posição de hoje (quem dobrou
+# a posição recebe o dobro). A cadência sai do intervalo mediano entre os meses com pagamento:
+# pagador mensal projeta a mediana dos últimos 12 meses em todo mês; os demais repetem a média
+# de cada mês do calendário nos últimos anos (sazonalidade).
+
+TIPOS_PROVENTO_CAIXA = ['Dividendo', 'JCP']
+COLUNAS_PROJECAO = ['Ativo', 'Mês', 'Valor']
+COLUNAS_CADENCIA = ['Ativo', 'Cadência', 'Pagamentos', 'Último Pagamento', 'Projeção 12M']
+
+def _posicao_na_data(df, eventos):
+    """Quantidade de cada ativo na data de cada linha de 'eventos' (Data/Ativo), pelo extrato acumulado."""
+    mov = df[df['Tipo'].isin(TIPOS_ENTRADA + TIPOS_SAIDA)]
+    sinal = np.where(mov['Tipo'].isin(TIPOS_SAIDA), -1.0, 1.0)
+    historico = pd.DataFrame({'Data': mov['Data'], 'Ativo': mov['Ativo'], 'Posição': mov['Qtd'].astype(np.float64) * sinal})
+    historico = historico.sort_values('Data', kind='stable')
+    historico['Posição'] = historico.groupby('Ativo')['Posição'].cumsum()
+    casado = pd.merge_asof(eventos.sort_values('Data', kind='stable'), historico, on='Data', by='Ativo')
+    return casado, historico.groupby('Ativo')['Posição'].last()
+
+def resumo_proventos_mensal(df, hoje=None, anos_historico=2):
+    """
+    Proventos em dinheiro (Dividendo/JCP) dos últimos 'anos_historico' anos somados por ativo e mês,
+    já ajustados para a posição atual. Retorna DataFrame Ativo, Mês (Period), Valor.
+    """
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    pagos = df[df['Tipo'].isin(TIPOS_PROVENTO_CAIXA) & (df['Data'] > hoje - pd.DateOffset(years=anos_historico))
+               & (df['Data'] <= hoje)]
+    if pagos.empty:
+        return pd.DataFrame(columns=['Ativo', 'Mês', 'Valor'])
+
+    casado, posicao_atual = _posicao_na_data(df, pagos[['Data', 'Ativo', 'Total']].reset_index(drop=True))
+    atual = casado['Ativo'].map(posicao_atual).fillna(0.0)
+    # Sem posição conhecida no dia do pagamento, vale o valor pago
+    fator = np.where(casado['Posição'] > 1e-9, atual / casado['Posição'].where(casado['Posição'] > 1e-9), 1.0)
+    casado['Valor'] = casado['Total'].astype(np.float64) * fator
+    casado['Mês'] = casado['Data'].dt.to_period('M')
+    resumo = casado.groupby(['Ativo', 'Mês'], as_index=False)['Valor'].sum()
+    # Só quem ainda está na carteira
+    return resumo[resumo['Ativo'].map(posicao_atual).fillna(0.0) > 1e-6].reset_index(drop=True)
+
+def inferir_cadencia(resumo, minimo_pagamentos=3):
+    """
+    Cadência de cada ativo pelo intervalo mediano (em meses) entre os meses com pagamento.
+    Com menos de 'minimo_pagamentos' meses pagos, ou pagamentos em menos da metade dos meses
+    que a cadência pede (ex: 4 meses colados num ano), o ativo fica como 'Esporádico'.
+    """
+    meses = resumo[['Ativo']].copy()
+    meses['Número'] = resumo['Mês'].dt.year * 12 + resumo['Mês'].dt.month
+    meses = meses.sort_values(['Ativo', 'Número'])
+    por_ativo = meses.groupby('Ativo')['Número']
+    intervalo = por_ativo.diff().groupby(meses['Ativo']).median()
+    pagamentos = por_ativo.size()
+    esperados = (por_ativo.max() - por_ativo.min()) / intervalo + 1
+    regular = (pagamentos >= minimo_pagamentos) & (pagamentos >= esperados / 2)
+    cadencia = pd.cut(intervalo[regular], [0, 1.5, 4.5, 7.5, np.inf], labels=['Mensal', 'Trimestral', 'Semestral', 'Anual'])
+    return cadencia.astype(object).reindex(pagamentos.index).fillna('Esporádico')
+
+def projetar_proventos(df, hoje=None, meses=12, anos_historico=2):
+    """
+    Proventos esperados por ativo nos próximos 'meses' (a partir do mês que vem).
+    Retorna dict com:
+      - projecao: Ativo, Mês (1º dia do mês), Valor
+      - cadencia: Ativo, Cadência, Pagamentos (no histórico usado), Último Pagamento, Projeção 12M
+    """
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    resumo = resumo_proventos_mensal(df, hoje, anos_historico)
+    if resumo.empty:
+        # 'Mês' já em datetime, para quem formata com .dt funcionar também sem proventos
+        projecao = pd.DataFrame(columns=COLUNAS_PROJECAO).astype({'Mês': 'datetime64[ns]', 'Valor': 'float64'})
+        return {"projecao": projecao, "cadencia": pd.DataFrame(columns=COLUNAS_CADENCIA)}
+
+    cadencia = inferir_cadencia(resumo)
+    mes_atual = hoje.to_period('M')
+    futuros = pd.period_range(mes_atual + 1, periods=meses, freq='M')
+
+    # Sazonal: média de cada mês do calendário, pelos anos observados de cada ativo
+    primeiro = resumo.groupby('Ativo')['Mês'].min()
+    meses_observados = (mes_atual.year * 12 + mes_atual.month) - (primeiro.dt.year * 12 + primeiro.dt.month) + 1
+    anos_observados = np.clip(np.ceil(meses_observados / 12), 1, anos_historico)
+    sazonal = resumo.assign(Calendario=resumo['Mês'].dt.month).groupby(['Ativo', 'Calendario'], as_index=False)['Valor'].sum()
+    sazonal['Valor'] /= sazonal['Ativo'].map(anos_observados)
+    grade = pd.DataFrame({'Mês': futuros, 'Calendario': futuros.month})
+    projecao = grade.merge(sazonal, on='Calendario')[['Ativo', 'Mês', 'Valor']]
+
+    # Mensal: a mediana dos últimos 12 meses em todo mês. Meses sem pagamento contam como zero,
+    # menos os anteriores ao 1º pagamento (posição nova) e o mês corrente ainda não pago
+    mensais = cadencia.index[cadencia == 'Mensal']
+    if len(mensais):
+        recentes = resumo[resumo['Ativo'].isin(mensais) & (resumo['Mês'] > mes_atual - 12)]
+        tabela = recentes.pivot_table(index='Mês', columns='Ativo', values='Valor', aggfunc='sum')
+        janela = pd.period_range(mes_atual - 11, mes_atual, freq='M')
+        tabela = tabela.reindex(janela)
+        antes_do_inicio = janela.to_numpy()[:, None] < primeiro.reindex(tabela.columns).to_numpy()[None, :]
+        tabela = tabela.fillna(0.0).mask(antes_do_inicio)
+        tabela.iloc[-1] = tabela.iloc[-1].replace(0.0, np.nan)
+        medianas = tabela.median()
+        fixo = pd.DataFrame({'Ativo': np.repeat(medianas.index.to_numpy(), meses),
+                             'Mês': np.tile(futuros, len(medianas)),
+                             'Valor': np.repeat(medianas.to_numpy(), meses)})
+        projecao = pd.concat([projecao[~projecao['Ativo'].isin(mensais)], fixo], ignore_index=True)
+
+    projecao = projecao[projecao['Valor'] > 0].sort_values(['Mês', 'Ativo'], ignore_index=True)
+    projecao['Mês'] = projecao['Mês'].dt.to_timestamp()
+
+    quadro = resumo.groupby('Ativo').agg(Pagamentos=('Valor', 'size'), **{'Último Pagamento': ('Mês', 'max')})
+    quadro['Último Pagamento'] = quadro['Último Pagamento'].dt.strftime('%m/%Y')
+    quadro['Cadência'] = cadencia
+    quadro['Projeção 12M'] = projecao.groupby('Ativo')['Valor'].sum().reindex(quadro.index).fillna(0.0)
+    quadro = quadro.reset_index().sort_values('Projeção 12M', ascending=False, ignore_index=True)
+    return {"projecao": projecao[COLUNAS_PROJECAO], "cadencia": quadro[COLUNAS_CADENCIA]}
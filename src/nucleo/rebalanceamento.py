@@ -0,0 +1,219 @@
+import pandas as pd
+from nucleo.posicoes import classificar_ativo, mapa_categorias
+from nucleo.valor_diario import carregar_valor_diario
+
+# Funções do rebalanceamento
+
+def preparar_dados_editor(df_completo):
+    """
+    Recebe tabela com 'Ativo', 'Quantidade' e 'Categoria'.
+    Monta visualização sem processamentos desnecessários.
+    """
+    lista_ativos = []
+    
+    if df_completo.empty:
+        return pd.DataFrame(columns=["Ativo", "Classificação", "Qtd Atual", "Preço Hoje", "Em Dólar?"])
+
+    for index, row in df_completo.iterrows():
+        ativo = row['Ativo']
+        qtd = float(row['Quantidade'])
+        cat_original = row['Categoria'] # Vem exata do banco
+        
+        # Classificação direta
+        macro_cat = classificar_ativo(cat_original)
+        
+        # Regra do Dólar (Ajuste se BDR ou ETF forem em Reais na sua visão)
+        # Assumindo que Stocks, REITs e ETF são dolarizados/precisam de conversão visual
+        cats_dolar = ["Stocks", "REITs", "ETF"] 
+        is_usd = macro_cat in cats_dolar
+        
+        lista_ativos.append({
+            "Ativo": ativo,
+            "Classificação": macro_cat,
+            "Qtd Atual": qtd,
+            "Preço Hoje": 0.0, 
+            "Em Dólar?": is_usd
+        })
+    
+    return pd.DataFrame(lista_ativos).sort_values(by="Classificação")
+
+def unificar_dados_com_categorias(df_carteira, df_raw):
+    """
+    Cruza o resumo da carteira com as categorias vindas do extrato.
+    """
+    # Recupera a categoria EXATA do banco (sem normalização)
+    # Pega a última categoria registrada para o ativo
+    tab_cat = df_raw[['Ativo', 'Categoria']].drop_duplicates('Ativo', keep='last')
+    
+    # Cruza: Tabela de Quantidades + Tabela de Categorias
+    df_completo = df_carteira.merge(tab_cat, on='Ativo', how='left')
+    df_completo['Categoria'] = df_completo['Categoria'].fillna("Outros")
+    
+    return df_completo
+
+def calcular_rebalanceamento(df_editado, aporte, cotacao_dolar, metas_usuario, valor_reserva=0.0):
+    """
+    Calcula rebalanceamento descontando a Reserva APENAS da categoria 'Renda Fixa'.
+    """
+    df_calc = df_editado.copy()
+    
+    # Cálculos Básicos
+    df_calc["Fator"] = df_calc["Em Dólar?"].apply(lambda x: cotacao_dolar if x else 1.0)
+    df_calc["Total Atual (R$)"] = df_calc["Qtd Atual"] * df_calc["Preço Hoje"] * df_calc["Fator"]
+    
+    # Agrupamento
+    resumo_atual = df_calc.groupby("Classificação")["Total Atual (R$)"].sum().reset_index()
+    
+    # Lógica da Reserva de Emergência (Abate apenas da Renda Fixa)
+    idx_rf = resumo_atual.index[resumo_atual["Classificação"] == "Renda Fixa"].tolist()
+    
+    if idx_rf:
+        idx = idx_rf[0]
+        valor_bruto = resumo_atual.at[idx, "Total Atual (R$)"]
+        # Garante que não fica negativo
+        valor_liquido = max(0.0, valor_bruto - valor_reserva)
+        resumo_atual.at[idx, "Total Atual (R$)"] = valor_liquido
+
+    # Totais Gerais
+    patrimonio_atual = resumo_atual["Total Atual (R$)"].sum()
+    patrimonio_final = patrimonio_atual + aporte
+    
+    # Comparação com as Metas
+    lista_comparacao = []
+    for categoria, meta_pct_raw in metas_usuario.items():
+        meta_pct = float(meta_pct_raw) / 100.0
+        
+        linha = resumo_atual[resumo_atual["Classificação"] == categoria]
+        saldo_atual = linha["Total Atual (R$)"].sum() if not linha.empty else 0.0
+        
+        pct_atual = (saldo_atual / patrimonio_atual) if patrimonio_atual > 0 else 0
+        meta_valor_ideal = patrimonio_final * meta_pct
+        diferenca = meta_valor_ideal - saldo_atual
+        
+        lista_comparacao.append({
+            "Categoria": categoria,
+            "Pct Atual": pct_atual * 100,
+            "Meta Pct": meta_pct * 100,
+            "Saldo Atual (R$)": saldo_atual,
+            "Meta (R$)": meta_valor_ideal,
+            "Diferença (R$)": diferenca
+        })
+        
+    df_comparacao = pd.DataFrame(lista_comparacao)
+    
+    # Separação Compra/Venda
+    compras = pd.DataFrame()
+    vendas = pd.DataFrame()
+    
+    if not df_comparacao.empty:
+        compras = df_comparacao[df_comparacao["Diferença (R$)"] > 1.0].sort_values("Diferença (R$)", ascending=False)
+        vendas = df_comparacao[df_comparacao["Diferença (R$)"] < -1.0].sort_values("Diferença (R$)", ascending=True)
+    
+    # Valor em "Outros" (fora das metas)
+    cats_meta = metas_usuario.keys()
+    outros = resumo_atual[~resumo_atual["Classificação"].isin(cats_meta)]
+    valor_outros = outros["Total Atual (R$)"].sum() if not outros.empty else 0.0
+
+    return {
+        "df_comparacao": df_comparacao,
+        "df_compras": compras,
+        "df_vendas": vendas,
+        "valor_outros": valor_outros,
+        "patrimonio_atual": patrimonio_atual,
+        "patrimonio_final": patrimonio_final
+    }
+
+
+# Funções do histórico (tabela rebalanceamentos)
+
+def registro_rebalanceamento(resultado):
+    """
+    Alocação atual ({categoria: %}) e operações sugeridas ([{Categoria, Diferença (R$)}]) de um
+    resultado de calcular_rebalanceamento, no formato guardado na tabela rebalanceamentos.
+    """
+    comparacao = resultado["df_comparacao"]
+    if comparacao.empty:
+        return {}, []
+    alocacao = dict(zip(comparacao["Categoria"], comparacao["Pct Atual"].round(4)))
+    operacoes = pd.concat([resultado["df_compras"], resultado["df_vendas"]])
+    return alocacao, [
+        {"Categoria": categoria, "Diferença (R$)": round(float(diferenca), 2)}
+        for categoria, diferenca in zip(operacoes["Categoria"], operacoes["Diferença (R$)"])
+    ]
+
+def tabela_historico_rebalanceamentos(registros):
+    """DataFrame dos registros de listar_rebalanceamentos, com o maior desvio da meta e as operações em texto."""
+    colunas = ["ID", "Data", "Realizado em", "Aporte (R$)", "Patrimônio (R$)", "Maior Desvio (p.p.)", "Operações"]
+    linhas = []
+    for id_rebal, data, aporte, _, _, patrimonio, metas, alocacao, operacoes, realizado_em in registros:
+        desvios = [abs(alocacao.get(cat, 0.0) - meta) for cat, meta in metas.items()] if alocacao else []
+        texto = ", ".join(
+            f"{'+' if op['Diferença (R$)'] > 0 else '-'} {op['Categoria']} R$ {abs(op['Diferença (R$)']):,.0f}"
+            for op in operacoes
+        )
+        linhas.append((id_rebal, data, realizado_em, aporte, patrimonio, max(desvios, default=None), texto))
+    tabela = pd.DataFrame(linhas, columns=colunas)
+    tabela["Data"] = pd.to_datetime(tabela["Data"])
+    tabela["Realizado em"] = pd.to_datetime(tabela["Realizado em"])
+    return tabela
+
+# Funções do desvio da alocação ao longo do tempo
+# A alocação de cada dia sai do valor_diario (valor de mercado por ativo), somado pela mesma
+# classificação do rebalanceador; o desvio é a diferença para a meta, em pontos percentuais.
+
+def alocacao_diaria(df_diario, categorias, reserva=0.0):
+    """
+    % do patrimônio em cada classificação, por dia (DataFrame Data x Classificação).
+    'df_diario' é o valor_diario longo (Data/Ativo/Valor) e 'categorias' o {ativo: categoria} do extrato.
+    A reserva de emergência sai da Renda Fixa, como em calcular_rebalanceamento.
+    """
+    if df_diario.empty:
+        return pd.DataFrame()
+    classificacao = {ativo: classificar_ativo(categorias.get(ativo, "Outros")) for ativo in df_diario["Ativo"].unique()}
+    valores = df_diario.assign(Classificação=df_diario["Ativo"].map(classificacao)).pivot_table(
+        index="Data", columns="Classificação", values="Valor", aggfunc="sum", fill_value=0.0
+    )
+    if "Renda Fixa" in valores.columns:
+        valores["Renda Fixa"] = (valores["Renda Fixa"] - reserva).clip(lower=0.0)
+    total = valores.sum(axis=1)
+    return valores.div(total.where(total > 0), axis=0).dropna(how="all") * 100
+
+def serie_desvio(alocacao, metas):
+    """
+    Desvio (p.p.) de cada categoria das metas por dia: % atual - % meta.
+    O que está fora das metas entra somado em 'Outros' (meta zero).
+    """
+    metas = pd.Series(metas, dtype="float64")
+    desvio = alocacao.reindex(columns=metas.index, fill_value=0.0) - metas
+    fora = alocacao.columns.difference(metas.index)
+    if len(fora):
+        desvio["Outros"] = alocacao[fora].sum(axis=1)
+    return desvio
+
+def alertas_desvio(desvio, metas, limite_pp=5.0, limite_relativo=25.0):
+    """
+    Categorias que pedem rebalanceamento no último dia da série: desvio acima de 'limite_pp' pontos
+    ou acima de 'limite_relativo' % da própria meta (regra 5/25).
+    Retorna DataFrame Categoria/Meta (%)/Atual (%)/Desvio (p.p.)/Desvio Relativo (%)/Fora Desde, maior desvio primeiro.
+    """
+    colunas = ["Categoria", "Meta (%)", "Atual (%)", "Desvio (p.p.)", "Desvio Relativo (%)", "Fora Desde"]
+    if desvio.empty:
+        return pd.DataFrame(columns=colunas)
+    meta = pd.Series(metas, dtype="float64").reindex(desvio.columns, fill_value=0.0)
+    relativo = desvio.abs().div(meta.where(meta > 0), axis=1) * 100
+    fora = (desvio.abs() > limite_pp) | (relativo > limite_relativo)
+
+    linhas = []
+    for categoria in fora.columns[fora.iloc[-1].to_numpy()]:
+        # Início da sequência de dias fora da faixa que chega até hoje
+        dentro = fora.index[~fora[categoria].to_numpy()]
+        depois = fora.index[fora.index > dentro[-1]] if len(dentro) else fora.index
+        atual = desvio[categoria].iloc[-1]
+        linhas.append((categoria, meta[categoria], meta[categoria] + atual, atual, relativo[categoria].iloc[-1], depois[0]))
+    alertas = pd.DataFrame(linhas, columns=colunas)
+    return alertas.reindex(alertas["Desvio (p.p.)"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+def calcular_desvio_alocacao(df_transacoes, metas, reserva=0.0, data_inicio=None):
+    """Série diária de desvios das metas (serie_desvio) a partir da tabela valor_diario da carteira ativa."""
+    df_diario = carregar_valor_diario(data_inicio)
+    return serie_desvio(alocacao_diaria(df_diario, mapa_categorias(df_transacoes), reserva), metas)
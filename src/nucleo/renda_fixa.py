@@ -0,0 +1,180 @@
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from constants import *
+from database import ler_serie_sgs, salvar_serie_sgs, ultima_data_serie
+
+# Funções de marcação da Renda Fixa (CDI, SELIC, IPCA e prefixado)
+# As séries do SGS ficam gravadas no banco e só os dias novos são baixados.
+# O valor de cada título sai de um produto acumulado vetorizado sobre os dias úteis.
+
+TIPOS_APLICACAO = ['Compra', 'Aporte']
+TIPOS_RESGATE = ['Venda', 'Resgate']
+
+def atualizar_series_sgs(series=None, hoje=None):
+    """
+    Baixa do SGS apenas os dias que ainda não estão no banco (atualização incremental).
+    Retorna { serie: quantidade de pontos novos }.
+    """
+    from bcb import sgs
+
+    hoje = pd.Timestamp(hoje or date.today())
+    novos = {}
+    for nome in series or SERIES_SGS:
+        ultima = ultima_data_serie(nome)
+        inicio = pd.Timestamp(ultima) + pd.Timedelta(days=1) if ultima else pd.Timestamp(DATA_INICIO_SGS)
+        linhas = []
+        # O SGS limita as séries diárias a 10 anos por consulta, então busca em janelas de 5
+        while inicio <= hoje:
+            fim = min(hoje, inicio + pd.DateOffset(years=5) - pd.Timedelta(days=1))
+            try:
+                df = sgs.get({nome: SERIES_SGS[nome]}, start=inicio.date(), end=fim.date())
+                linhas.extend((d.strftime('%Y-%m-%d'), float(v)) for d, v in df[nome].dropna().items())
+            except Exception as e:
+                # Sem dado novo no intervalo o SGS também responde com erro
+                print(f"Aviso: {nome} sem atualização no SGS ({e})")
+                break
+            inicio = fim + pd.Timedelta(days=1)
+
+        if linhas:
+            salvar_serie_sgs(nome, linhas)
+        novos[nome] = len(linhas)
+    return novos
+
+def carregar_series_sgs():
+    """Lê as séries gravadas no banco: { 'CDI': Series(valor, index=data), ... }."""
+    series = {}
+    for nome in SERIES_SGS:
+        dados = ler_serie_sgs(nome)
+        if dados:
+            datas, valores = zip(*dados)
+            series[nome] = pd.Series(valores, index=pd.to_datetime(datas), dtype=np.float64)
+        else:
+            series[nome] = pd.Series(dtype=np.float64, index=pd.DatetimeIndex([]))
+    return series
+
+def calendario_dias_uteis(series, inicio, fim):
+    """
+    Dias úteis entre inicio e fim.
+    Usa as datas do próprio CDI (que já exclui feriados) e completa com seg-sex
+    depois do último ponto publicado.
+    """
+    inicio, fim = pd.Timestamp(inicio).normalize(), pd.Timestamp(fim).normalize()
+    cdi = series.get("CDI", pd.Series(dtype=np.float64))
+    dias = cdi.index[(cdi.index >= inicio) & (cdi.index <= fim)]
+    inicio_extra = max(inicio, dias[-1] + pd.Timedelta(days=1)) if len(dias) else inicio
+    return dias.append(pd.bdate_range(inicio_extra, fim))
+
+def fatores_diarios(indexador, percentual, taxa, series, dias):
+    """
+    Fator de rendimento de cada dia útil (array alinhado com 'dias').
+    CDI/SELIC: 1 + pct * taxa_dia | IPCA: IPCA do mês rateado nos dias úteis + taxa real | PRE: taxa fixa.
+    """
+    fator_taxa = (1 + (taxa or 0.0) / 100) ** (1 / 252)
+
+    if indexador in ("CDI", "SELIC"):
+        # Dias sem taxa publicada (ex: hoje) repetem a última taxa conhecida
+        taxa_dia = series[indexador].reindex(dias).ffill().fillna(0.0).to_numpy()
+        pct = 100.0 if percentual is None else percentual
+        return (1 + pct / 100 * taxa_dia / 100) * fator_taxa
+
+    if indexador == "IPCA":
+        if len(dias) == 0:
+            return np.ones(0)
+        ipca = series["IPCA"]
+        meses = dias.to_period('M')
+        ipca_mes = pd.Series(ipca.to_numpy(), index=ipca.index.to_period('M'))
+        # Mês ainda não divulgado usa o último IPCA conhecido
+        ipca_dia = ipca_mes.reindex(meses.unique().sort_values()).ffill().fillna(0.0).reindex(meses).to_numpy()
+        # Dias úteis de cada mês inteiro, no mesmo calendário de 'dias' (com os feriados do CDI),
+        # para que o IPCA do mês seja composto exatamente uma vez
+        calendario = calendario_dias_uteis(series, meses.min().start_time, meses.max().end_time)
+        du_mes = calendario.to_period('M').value_counts().reindex(meses).to_numpy()
+        return (1 + ipca_dia / 100) ** (1 / du_mes) * fator_taxa
+
+    # Prefixado
+    return np.full(len(dias), fator_taxa)
+
+def descrever_indexador(indexador, percentual, taxa):
+    """Texto curto do indexador. Ex: '110% CDI', 'IPCA + 6.00%', 'PRE 12.50%'."""
+    if indexador == "PRE":
+        return f"PRE {taxa:.2f}%"
+    texto = f"{percentual:g}% {indexador}" if indexador != "IPCA" else "IPCA"
+    return f"{texto} + {taxa:.2f}%" if taxa else texto
+
+def valorizar_renda_fixa(df_transacoes, indexadores, series=None, hoje=None):
+    """
+    Marca a mercado (na curva) os títulos que têm indexador cadastrado.
+    Cada aplicação rende de sua data até hoje: valor = fluxo * I(hoje) / I(data),
+    com I = produto acumulado dos fatores diários. Resgates entram como fluxo negativo.
+    Bonificações/Reinvestimentos desses títulos são ignorados, pois o próprio modelo gera o rendimento.
+    Retorna DataFrame com Ativo, Indexador e Valor Atual.
+    """
+    colunas = ["Ativo", "Indexador", "Valor Atual"]
+    if df_transacoes.empty or not indexadores:
+        return pd.DataFrame(columns=colunas)
+
+    df_rf = df_transacoes[df_transacoes['Ativo'].isin(list(indexadores))]
+    df_rf = df_rf[df_rf['Tipo'].isin(TIPOS_APLICACAO + TIPOS_RESGATE)]
+    if df_rf.empty:
+        return pd.DataFrame(columns=colunas)
+
+    series = series if series is not None else carregar_series_sgs()
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    datas = pd.to_datetime(df_rf['Data']).dt.normalize()
+    dias = calendario_dias_uteis(series, datas.min(), hoje)
+
+    # Índice acumulado por indexador: I[k] = produto dos fatores dos dias anteriores a dias[k]
+    acumulados = {}
+    posicao_hoje = dias.searchsorted(hoje)
+    linhas = []
+    for ativo, grupo in df_rf.groupby('Ativo'):
+        chave = indexadores[ativo]
+        if chave not in acumulados:
+            fatores = fatores_diarios(*chave, series, dias)
+            acumulados[chave] = np.concatenate(([1.0], np.cumprod(fatores)))
+        indice = acumulados[chave]
+
+        sinal = np.where(grupo['Tipo'].isin(TIPOS_APLICACAO), 1.0, -1.0)
+        fluxos = grupo['Total'].to_numpy(dtype=np.float64, na_value=0.0) * sinal
+        posicao_fluxos = dias.searchsorted(datas.loc[grupo.index].values)
+        valor = float((fluxos * indice[posicao_hoje] / indice[posicao_fluxos]).sum())
+
+        linhas.append({
+            "Ativo": ativo,
+            "Indexador": descrever_indexador(*chave),
+            "Valor Atual": max(valor, 0.0)
+        })
+    return pd.DataFrame(linhas, columns=colunas)
+
+def serie_valor_renda_fixa(df_transacoes, indexadores, series, datas):
+    """
+    Valor na curva de cada título com indexador em cada data pedida (DataFrame datas x ativos).
+    Vetorizado: V(t) = I(t) * soma acumulada de fluxo / I(data do fluxo), para os fluxos até t.
+    """
+    datas = pd.DatetimeIndex(datas)
+    df_rf = df_transacoes[df_transacoes['Ativo'].isin(list(indexadores))]
+    df_rf = df_rf[df_rf['Tipo'].isin(TIPOS_APLICACAO + TIPOS_RESGATE)]
+    if df_rf.empty or datas.empty:
+        return pd.DataFrame(index=datas)
+
+    df_rf = df_rf.assign(Data=pd.to_datetime(df_rf['Data']).dt.normalize()).sort_values('Data', kind='stable')
+    dias = calendario_dias_uteis(series, min(df_rf['Data'].min(), datas.min()), datas.max())
+    posicao_datas = dias.searchsorted(datas)
+
+    acumulados = {}
+    valores = {}
+    for ativo, grupo in df_rf.groupby('Ativo'):
+        chave = indexadores[ativo]
+        if chave not in acumulados:
+            acumulados[chave] = np.concatenate(([1.0], np.cumprod(fatores_diarios(*chave, series, dias))))
+        indice = acumulados[chave]
+
+        sinal = np.where(grupo['Tipo'].isin(TIPOS_APLICACAO), 1.0, -1.0)
+        fluxos = grupo['Total'].to_numpy(dtype=np.float64, na_value=0.0) * sinal
+        datas_fluxo = grupo['Data'].values
+        acumulado = np.concatenate(([0.0], np.cumsum(fluxos / indice[dias.searchsorted(datas_fluxo)])))
+        fluxos_ate = np.searchsorted(datas_fluxo, datas.values, side='right')
+        valores[ativo] = np.maximum(indice[posicao_datas] * acumulado[fluxos_ate], 0.0)
+
+    return pd.DataFrame(valores, index=datas)
@@ -0,0 +1,127 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from constants import *
+from nucleo.posicoes import mapa_categorias
+from nucleo.precos import carregar_precos
+from nucleo.valor_diario import carregar_valor_diario
+
+# Funções de risco da carteira (volatilidade, drawdown, correlação e VaR)
+# Tudo sai da tabela valor_diario e do histórico local de preços, sem nada online.
+# Os retornos são montados como matrizes datas x (categorias + 'Carteira') e cada
+# métrica é uma janela móvel do pandas aplicada em todas as colunas de uma vez.
+
+DIAS_UTEIS_ANO = 252
+COLUNA_CARTEIRA = 'Carteira'
+
+def retornos_diarios(df_valor, categorias=None):
+    """
+    Retorno diário de cada categoria e da carteira inteira (DataFrame datas x grupos).
+    Usa a posição do dia anterior x variação do preço, então aportes e resgates
+    não aparecem como ganho ou perda.
+    """
+    if df_valor.empty:
+        return pd.DataFrame()
+
+    qtd = df_valor.pivot(index='Data', columns='Ativo', values='Qtd').fillna(0.0)
+    # Preço zerado (ex: título resgatado acima da curva) vira "sem preço" e repete o anterior
+    preco = df_valor.pivot(index='Data', columns='Ativo', values='Preço')
+    preco = preco.where(preco > 0).ffill()
+    qtd_ontem = qtd.shift(1)
+    ganho = qtd_ontem * preco.diff()
+    base = qtd_ontem * preco.shift(1)
+
+    # Agrupa as colunas por categoria (transpõe porque o groupby por colunas foi descontinuado)
+    grupos = pd.Series(categorias or {}, dtype=object).reindex(qtd.columns).fillna('Outros')
+    ganho_grupo = ganho.T.groupby(grupos).sum().T
+    base_grupo = base.T.groupby(grupos).sum().T
+    ganho_grupo[COLUNA_CARTEIRA] = ganho.sum(axis=1)
+    base_grupo[COLUNA_CARTEIRA] = base.sum(axis=1)
+
+    retornos = ganho_grupo / base_grupo.where(base_grupo > 1e-9)
+    return retornos.iloc[1:]
+
+def volatilidade_movel(retornos, janela=63):
+    """Volatilidade anualizada em janela móvel (desvio padrão x raiz de 252)."""
+    return retornos.rolling(janela, min_periods=max(2, janela // 2)).std() * np.sqrt(DIAS_UTEIS_ANO)
+
+def serie_drawdown(retornos):
+    """Queda de cada dia em relação ao pico anterior do índice acumulado (0 = no topo)."""
+    indice = (1 + retornos.fillna(0.0)).cumprod()
+    return indice / indice.cummax() - 1
+
+def calcular_var(retornos, confianca=0.95):
+    """
+    VaR de 1 dia em % (valor positivo = perda), por coluna.
+    Histórico: quantil dos retornos | Paramétrico: média + z * desvio (normal).
+    """
+    z = NormalDist().inv_cdf(1 - confianca)
+    historico = -retornos.quantile(1 - confianca)
+    parametrico = -(retornos.mean() + z * retornos.std())
+    return historico, parametrico
+
+def matriz_correlacao(df_valor, precos=None, janela=DIAS_UTEIS_ANO):
+    """
+    Correlação dos retornos diários dos ativos em carteira no último dia.
+    Usa o histórico de preços quando existe; os demais (ex: Renda Fixa na curva)
+    usam o preço gravado em valor_diario.
+    """
+    if df_valor.empty:
+        return pd.DataFrame()
+
+    ultimo_dia = df_valor['Data'].max()
+    ativos = df_valor.loc[(df_valor['Data'] == ultimo_dia) & (df_valor['Qtd'] > 1e-9), 'Ativo'].unique()
+    preco = df_valor.pivot(index='Data', columns='Ativo', values='Preço').reindex(columns=ativos)
+    preco = preco.where(preco > 0)
+    if precos is not None and not precos.empty:
+        preco = precos.reindex(columns=ativos).combine_first(preco)
+
+    retornos = preco.ffill().pct_change(fill_method=None).tail(janela)
+    # Ativo sem variação nenhuma (ex: sem cotação) não tem correlação definida
+    retornos = retornos.loc[:, retornos.std() > 0]
+    return retornos.corr()
+
+def analisar_risco(df_transacoes, janela=63, confianca=0.95, data_inicio=None):
+    """
+    Monta o painel de risco a partir de valor_diario e do histórico de preços.
+    Retorna dict com:
+      - resumo: DataFrame por grupo (categorias + Carteira) com volatilidade, máximo drawdown e VaR
+      - volatilidade: DataFrame datas x grupos (janela móvel)
+      - drawdown: DataFrame datas x grupos
+      - correlacao: matriz de correlação dos ativos em carteira
+    """
+    df_valor = carregar_valor_diario(data_inicio)
+    categorias = mapa_categorias(df_transacoes)
+    retornos = retornos_diarios(df_valor, categorias)
+    if retornos.empty:
+        return {"resumo": pd.DataFrame(), "volatilidade": pd.DataFrame(),
+                "drawdown": pd.DataFrame(), "correlacao": pd.DataFrame()}
+
+    drawdown = serie_drawdown(retornos)
+    recentes = retornos.tail(janela)
+    var_hist, var_param = calcular_var(recentes, confianca)
+
+    # Valor atual de cada grupo, para converter o VaR de % para R$
+    ultimo = df_valor[df_valor['Data'] == df_valor['Data'].max()]
+    valor_grupo = ultimo.groupby(ultimo['Ativo'].map(categorias).fillna('Outros'))['Valor'].sum()
+    valor_grupo[COLUNA_CARTEIRA] = ultimo['Valor'].sum()
+    valor_grupo = valor_grupo.reindex(retornos.columns).fillna(0.0)
+
+    resumo = pd.DataFrame({
+        'Grupo': retornos.columns,
+        'Valor Atual': valor_grupo.to_numpy(),
+        'Volatilidade (%)': (recentes.std() * np.sqrt(DIAS_UTEIS_ANO) * 100).to_numpy(),
+        'Máx. Drawdown (%)': (drawdown.min() * 100).to_numpy(),
+        'VaR Histórico (%)': (var_hist * 100).to_numpy(),
+        'VaR Paramétrico (%)': (var_param * 100).to_numpy(),
+        'VaR Histórico (R$)': (var_hist * valor_grupo).to_numpy(),
+        'VaR Paramétrico (R$)': (var_param * valor_grupo).to_numpy()
+    })
+
+    ativos = df_valor['Ativo'].unique().tolist()
+    return {
+        "resumo": resumo,
+        "volatilidade": volatilidade_movel(retornos, janela),
+        "drawdown": drawdown,
+        "correlacao": matriz_correlacao(df_valor, carregar_precos(ativos, data_inicio))
+    }
@@ -0,0 +1,192 @@
+import json
+from datetime import date
+import numpy as np
+import pandas as pd
+from constants import *
+from database import listar_eventos, ler_snapshot, obter_versao, salvar_snapshot, transacoes_alteradas
+from nucleo.dados import carregar_transacoes
+from nucleo.eventos import eventos_para_dataframe, mapa_tickers
+
+# Funções de validação do extrato (qualidade dos dados)
+# Cada regra é uma máscara sobre o DataFrame inteiro (sem laço por linha) e devolve as linhas
+# problemáticas com o ID da transação. Todas as regras olham um ativo por vez (a posição
+# acumulada, as duplicatas e a categoria usual são por ativo), então a validação incremental
+# só precisa refazer os ativos tocados desde a última passada, lidos do transacoes_log.
+# O relatório fica guardado na tabela snapshots (tipo 'validacao').
+
+COLUNAS_PROBLEMAS = ['ID', 'Data', 'Ativo', 'Regra', 'Gravidade', 'Detalhe']
+COLUNAS_DUPLICATA = ['Data', 'Ativo', 'Tipo', 'Qtd', 'Preço', 'Corretora']
+CLASSE_DA_CATEGORIA = {categoria: classe for classe, categorias in MAPA_CLASSES.items() for categoria in categorias}
+TOLERANCIA_QTD = 1e-6
+
+def _linhas(df, mascara, regra, gravidade, detalhe):
+    """Linhas de 'df' marcadas pela máscara, no formato do relatório. 'detalhe' é texto ou Series."""
+    problemas = df.loc[mascara, ['ID', 'Data', 'Ativo']].copy()
+    problemas['Regra'] = regra
+    problemas['Gravidade'] = gravidade
+    problemas['Detalhe'] = detalhe[mascara] if isinstance(detalhe, pd.Series) else detalhe
+    return problemas
+
+def _mais_comum(df, coluna):
+    """Valor mais frequente de 'coluna' em cada ativo (empate: o mais recente)."""
+    contagem = df.groupby(['Ativo', coluna]).agg(Vezes=('ID', 'size'), Ultima=('Data', 'max')).reset_index()
+    contagem = contagem.sort_values(['Vezes', 'Ultima'], ascending=False, kind='stable')
+    return contagem.drop_duplicates('Ativo').set_index('Ativo')[coluna]
+
+# Regras
+
+def verificar_quantidades(df):
+    """Compra/venda sem quantidade: o preço médio ignora a linha (e o cadastro antigo gravava o total como qtd 1)."""
+    mascara = df['Tipo'].isin(TIPOS_ENTRADA + TIPOS_SAIDA) & ~(df['Qtd'] > 0)
+    return _linhas(df, mascara, 'Quantidade inválida', 'erro', 'Quantidade zero ou vazia: a operação não entra no preço médio')
+
+def verificar_valores(df):
+    """Preço ou total negativos e total diferente de qtd x preço."""
+    negativos = (df['Preço'] < 0) | (df['Total'] < 0)
+    esperado = df['Qtd'] * df['Preço']
+    diferenca = (df['Total'] - esperado).abs()
+    divergente = ~negativos & (df['Qtd'] > 0) & (diferenca > np.maximum(0.01, 0.005 * df['Total'].abs()))
+    detalhe = "Total R$ " + df['Total'].round(2).astype(str) + " ≠ Qtd x Preço R$ " + esperado.round(2).astype(str)
+    return pd.concat([
+        _linhas(df, negativos, 'Valor negativo', 'erro', 'Preço ou total negativo'),
+        _linhas(df, divergente, 'Total inconsistente', 'aviso', detalhe),
+    ])
+
+def verificar_vendas_descobertas(df):
+    """Saídas que deixam a posição negativa (o preço médio pula essas vendas sem avisar)."""
+    mov = df[df['Tipo'].isin(TIPOS_ENTRADA + TIPOS_SAIDA)].sort_values(['Data', 'ID'], kind='stable')
+    sinal = np.where(mov['Tipo'].isin(TIPOS_SAIDA), -1.0, 1.0)
+    posicao = (mov['Qtd'].fillna(0.0) * sinal).groupby(mov['Ativo']).cumsum()
+    mascara = mov['Tipo'].isin(TIPOS_SAIDA) & (posicao < -TOLERANCIA_QTD)
+    detalhe = "Posição ficaria em " + posicao.round(6).astype(str)
+    return _linhas(mov, mascara, 'Venda a descoberto', 'erro', detalhe)
+
+def verificar_duplicatas(df):
+    """Transações idênticas (data, ativo, tipo, qtd, preço e corretora); a primeira fica de fora."""
+    chaves = df[COLUNAS_DUPLICATA]
+    repetida = chaves.duplicated(keep='first')
+    primeira = df.groupby(COLUNAS_DUPLICATA, dropna=False)['ID'].transform('min')
+    detalhe = "Igual à transação ID " + primeira.astype(str)
+    return _linhas(df, repetida, 'Duplicada', 'aviso', detalhe)
+
+def verificar_categorias(df):
+    """Categoria diferente da usual do ativo e classe que não bate com a categoria."""
+    usual = df['Ativo'].map(_mais_comum(df, 'Categoria'))
+    diferente = df['Categoria'].notna() & (df['Categoria'] != usual)
+    esperada = df['Categoria'].map(CLASSE_DA_CATEGORIA)
+    classe_errada = df['Classe'].notna() & esperada.notna() & (df['Classe'] != esperada)
+    return pd.concat([
+        _linhas(df, diferente, 'Categoria divergente', 'aviso', "Categoria usual do ativo: " + usual.astype(str)),
+        _linhas(df, classe_errada, 'Classe inconsistente', 'aviso', "Pela categoria, a classe seria " + esperada.astype(str)),
+    ])
+
+def verificar_moedas(df):
+    """Moeda diferente da usual do ativo e câmbio que não combina com a moeda."""
+    usual = df['Ativo'].map(_mais_comum(df, 'Moeda'))
+    diferente = df['Moeda'].notna() & (df['Moeda'] != usual)
+    em_real = df['Moeda'] == 'BRL'
+    cambio_errado = (em_real & (df['Cambio'] != 1.0)) | (~em_real & ~(df['Cambio'] > 0)) | (~em_real & (df['Cambio'] == 1.0))
+    detalhe_cambio = "Câmbio " + df['Cambio'].astype(str) + " em operação em " + df['Moeda'].astype(str)
+    return pd.concat([
+        _linhas(df, diferente, 'Moeda divergente', 'aviso', "Moeda usual do ativo: " + usual.astype(str)),
+        _linhas(df, cambio_errado, 'Câmbio suspeito', 'aviso', detalhe_cambio),
+    ])
+
+def verificar_datas(df, hoje=None):
+    """Transações com data no futuro."""
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    return _linhas(df, df['Data'] > hoje, 'Data futura', 'aviso', 'Data depois de hoje')
+
+def verificar_extrato(df, hoje=None):
+    """Roda todas as regras no extrato (formato de carregar_transacoes) e devolve o relatório (COLUNAS_PROBLEMAS)."""
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_PROBLEMAS)
+    df = df.copy()
+    for coluna in ('Qtd', 'Preço', 'Total', 'Cambio'):
+        df[coluna] = pd.to_numeric(df[coluna], errors='coerce')
+    partes = [
+        verificar_quantidades(df), verificar_valores(df), verificar_vendas_descobertas(df),
+        verificar_duplicatas(df), verificar_categorias(df), verificar_moedas(df), verificar_datas(df, hoje),
+    ]
+    problemas = pd.concat(partes, ignore_index=True)[COLUNAS_PROBLEMAS]
+    return _ordenar(problemas)
+
+def _ordenar(problemas):
+    problemas = problemas.assign(Ordem=(problemas['Gravidade'] != 'erro').astype(int))
+    return problemas.sort_values(['Ordem', 'Data', 'ID'], ascending=[True, False, False], ignore_index=True).drop(columns='Ordem')
+
+# Funções de execução (relatório guardado e validação incremental)
+
+def _ler_relatorio():
+    """(estado, relatório) da última validação guardada, ou (None, None)."""
+    salvo = ler_snapshot('validacao')
+    if salvo is None:
+        return None, None
+    conteudo = json.loads(salvo[2])
+    relatorio = pd.DataFrame(conteudo['problemas'], columns=COLUNAS_PROBLEMAS)
+    relatorio['Data'] = pd.to_datetime(relatorio['Data'])
+    return conteudo, relatorio
+
+def _guardar_relatorio(relatorio, ultimo_log, eventos, versao_eventos, versao_transacoes):
+    conteudo = {
+        "ultimo_log": ultimo_log,
+        "versao_eventos": versao_eventos,
+        "eventos": [list(evento) for evento in eventos],
+        "problemas": json.loads(relatorio.to_json(orient="records", date_format="iso", force_ascii=False)),
+    }
+    salvar_snapshot('validacao', '', json.dumps(conteudo, ensure_ascii=False), versao_transacoes)
+
+def _ativos_dos_eventos(eventos_antes, eventos_depois):
+    """
+    Ativos cujo extrato ajustado mudou entre as duas listas de eventos (linhas de listar_eventos),
+    com o nome de antes e o de depois (uma mudança de ticker tira o nome antigo do relatório).
+    """
+    mudados = {tuple(e) for e in eventos_antes} ^ {tuple(e) for e in eventos_depois}
+    tickers = {ticker for evento in mudados for ticker in (evento[2], evento[5]) if ticker}
+    antes = mapa_tickers(eventos_para_dataframe(eventos_antes))
+    depois = mapa_tickers(eventos_para_dataframe(eventos_depois))
+    return tickers | {antes.get(t, t) for t in tickers} | {depois.get(t, t) for t in tickers}
+
+def validar_extrato(completa=False, hoje=None):
+    """
+    Relatório de problemas do extrato da carteira ativa (COLUNAS_PROBLEMAS, erros primeiro).
+    Incremental: só os ativos das transações escritas desde a última validação (transacoes_log)
+    e os dos eventos corporativos incluídos/excluídos desde então são verificados de novo;
+    o resto do relatório guardado é mantido. completa=True refaz tudo.
+    """
+    versao_transacoes = obter_versao('transacoes')
+    versao_eventos = obter_versao('eventos_corporativos')
+    eventos = listar_eventos()
+    estado, relatorio = (None, None) if completa else _ler_relatorio()
+
+    # Relatório guardado antes de os eventos entrarem no estado: não há como saber o que mudou
+    if estado is None or (estado['versao_eventos'] != versao_eventos and 'eventos' not in estado):
+        ultimo_log, _, _ = transacoes_alteradas()
+        relatorio = verificar_extrato(carregar_transacoes(), hoje)
+        _guardar_relatorio(relatorio, ultimo_log, eventos, versao_eventos, versao_transacoes)
+        return relatorio
+
+    afetados = set()
+    if estado['versao_eventos'] != versao_eventos:
+        afetados = _ativos_dos_eventos(estado['eventos'], eventos)
+
+    ultimo_log, ids, tickers = transacoes_alteradas(estado['ultimo_log'])
+    if not ids and not afetados:
+        return relatorio
+
+    # O log guarda o ticker gravado; depois de uma mudança de ticker, vale o nome atual.
+    # Só o histórico desses ativos é lido do banco
+    renomear = mapa_tickers(eventos_para_dataframe(eventos))
+    afetados |= {renomear.get(ticker, ticker) for ticker in tickers}
+    df = carregar_transacoes(sorted(afetados))
+    novos = verificar_extrato(df[df['Ativo'].isin(afetados)], hoje)
+    mantidos = relatorio[~relatorio['Ativo'].isin(afetados)]
+    relatorio = _ordenar(pd.concat([mantidos, novos], ignore_index=True)) if not mantidos.empty else novos
+    _guardar_relatorio(relatorio, ultimo_log, eventos, versao_eventos, versao_transacoes)
+    return relatorio
+
+def resumo_validacao(relatorio):
+    """{'erro': n, 'aviso': n} e a contagem por regra (DataFrame Regra, Gravidade, Ocorrências)."""
+    por_gravidade = relatorio['Gravidade'].value_counts().reindex(['erro', 'aviso'], fill_value=0).to_dict()
+    por_regra = relatorio.groupby(['Regra', 'Gravidade'], as_index=False).size().rename(columns={'size': 'Ocorrências'})
+    return por_gravidade, por_regra.sort_values('Ocorrências', ascending=False, ignore_index=True)
@@ -0,0 +1,127 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+from constants import *
+from database import (contar_valor_diario, gravar_valor_diario, ler_pendencias_valor_diario,
+                      ler_valor_diario, listar_indexadores, marcar_valor_diario_pendente,
+                      ultimo_dia_valor_diario)
+from nucleo.dados import carregar_transacoes
+from nucleo.posicoes import historico_posicoes
+from nucleo.precos import carregar_precos
+from nucleo.renda_fixa import carregar_series_sgs, serie_valor_renda_fixa
+
+# Funções da tabela materializada valor_diario (data x ativo: qtd, custo, preço e valor)
+# Os gatilhos do banco marcam, por ativo, a data mais antiga afetada por cada escrita;
+# aqui só esse trecho é recalculado, de forma vetorizada.
+
+def calcular_valor_diario(df_transacoes, pendencias, precos, indexadores, series, hoje=None):
+    """
+    Monta as linhas de valor_diario dos ativos pendentes, a partir de suas datas mínimas.
+    Posição 'as-of' de cada dia (ffill) x preço do dia (ffill do histórico).
+    Renda Fixa com indexador usa o valor na curva; sem preço nenhum, usa o PM.
+    Retorna DataFrame Data/Ativo/Qtd/Custo/Preço/Valor.
+    """
+    colunas = ['Data', 'Ativo', 'Qtd', 'Custo', 'Preço', 'Valor']
+    hist = historico_posicoes(df_transacoes)
+    if hist.empty:
+        return pd.DataFrame(columns=colunas)
+
+    hoje = pd.Timestamp(hoje or date.today()).normalize()
+    hist['Data'] = hist['Data'].dt.normalize()
+    hist = hist.drop_duplicates(['Data', 'Ativo'], keep='last')
+
+    # Dias úteis + dias com transação (ex: cripto no fim de semana)
+    calendario = pd.bdate_range(hist['Data'].min(), hoje).union(pd.DatetimeIndex(hist['Data'].unique()))
+    calendario = calendario[calendario <= hoje]
+
+    qtd = hist.pivot(index='Data', columns='Ativo', values='Qtd').reindex(calendario).ffill().fillna(0.0)
+    custo = hist.pivot(index='Data', columns='Ativo', values='Custo').reindex(calendario).ffill().fillna(0.0)
+    pm = (custo / qtd.where(qtd > 1e-9)).ffill()
+
+    preco = pd.DataFrame(index=calendario, columns=qtd.columns, dtype=np.float64)
+    if not precos.empty:
+        # ffill no índice completo do histórico antes de alinhar com o calendário
+        precos = precos.reindex(precos.index.union(calendario)).ffill().reindex(calendario)
+        preco.update(precos.reindex(columns=qtd.columns))
+
+    indexados = {a: v for a, v in indexadores.items() if a in qtd.columns}
+    if indexados:
+        valor_rf = serie_valor_renda_fixa(df_transacoes, indexados, series, calendario)
+        preco.update(valor_rf / qtd[valor_rf.columns].where(qtd[valor_rf.columns] > 1e-9))
+
+    preco = preco.fillna(pm)
+    valor = qtd * preco
+
+    longo = pd.DataFrame({
+        'Qtd': qtd.stack(),
+        'Custo': custo.stack(),
+        'Preço': preco.stack(),
+        'Valor': valor.stack()
+    })
+    longo.index.names = ['Data', 'Ativo']
+    longo = longo.reset_index()
+
+    data_minima = pd.to_datetime(longo['Ativo'].map(pendencias).replace('0000-00-00', '1900-01-01'))
+    longo = longo[(longo['Qtd'] > 1e-9) & (longo['Data'] >= data_minima)]
+    return longo[colunas].fillna(0.0)
+
+def atualizar_valor_diario(hoje=None):
+    """
+    Recalcula os trechos pendentes de valor_diario e grava no banco.
+    Na primeira execução (tabela vazia), reconstrói tudo.
+    Retorna a quantidade de linhas gravadas.
+    """
+    if contar_valor_diario() == 0:
+        df_todos = carregar_transacoes()
+        if df_todos.empty:
+            return 0
+        marcar_valor_diario_pendente(df_todos['Ativo'].unique().tolist())
+    else:
+        # Dias novos desde a última atualização: estende os ativos que ainda estavam em carteira
+        ultima, ativos_abertos = ultimo_dia_valor_diario()
+        hoje_str = pd.Timestamp(hoje or date.today()).strftime('%Y-%m-%d')
+        if ultima and ultima < hoje_str and ativos_abertos:
+            proximo = (pd.Timestamp(ultima) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            marcar_valor_diario_pendente(ativos_abertos, proximo)
+
+    pendencias = ler_pendencias_valor_diario()
+    if not pendencias:
+        return 0
+
+    ativos = list(pendencias)
+    df = carregar_transacoes(ativos)
+    precos = carregar_precos(ativos)
+    indexadores = listar_indexadores()
+    series = carregar_series_sgs() if any(a in indexadores for a in ativos) else {}
+
+    df_valor = calcular_valor_diario(df, pendencias, precos, indexadores, series, hoje)
+    linhas = list(zip(
+        df_valor['Data'].dt.strftime('%Y-%m-%d'),
+        df_valor['Ativo'],
+        df_valor['Qtd'].tolist(),
+        df_valor['Custo'].tolist(),
+        df_valor['Preço'].tolist(),
+        df_valor['Valor'].tolist()
+    ))
+    gravar_valor_diario(pendencias, linhas)
+    return len(linhas)
+
+def reconstruir_valor_diario(hoje=None):
+    """Marca todos os ativos como pendentes desde o início e recalcula a tabela inteira."""
+    df = carregar_transacoes()
+    if df.empty:
+        return 0
+    marcar_valor_diario_pendente(df['Ativo'].unique().tolist())
+    return atualizar_valor_diario(hoje)
+
+def carregar_valor_diario(data_inicio=None, data_fim=None, ativos=None):
+    """Lê valor_diario como DataFrame longo (Data/Ativo/Qtd/Custo/Preço/Valor)."""
+    df = pd.DataFrame(ler_valor_diario(data_inicio, data_fim, ativos),
+                      columns=['Data', 'Ativo', 'Qtd', 'Custo', 'Preço', 'Valor'])
+    df['Data'] = pd.to_datetime(df['Data'])
+    return df
+
+def serie_patrimonio_diario(data_inicio=None, data_fim=None):
+    """Patrimônio total por dia: DataFrame indexado por Data com Valor e Custo."""
+    df = carregar_valor_diario(data_inicio, data_fim)
+    return df.groupby('Data')[['Valor', 'Custo']].sum()
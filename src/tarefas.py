@@ -0,0 +1,284 @@
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import pandas as pd
+
+import database
+from constants import *
+from database import (criar_tarefa, finalizar_tarefa, iniciar_tarefa, ler_snapshot, listar_carteiras, listar_metas,
+                      marcar_tarefas_interrompidas, obter_versao, pedir_cancelamento, registrar_progresso,
+                      salvar_snapshot, usar_carteira)
+
+# Tarefas pesadas em segundo plano (valor diário completo, posições, IR, Monte Carlo das metas)
+# Rodam num pool de processos (um por núcleo), fora da thread do Streamlit: a página só grava
+# o pedido na tabela 'tarefas' e depois lê o progresso de lá. O cancelamento também passa pelo banco:
+# a tarefa consulta o pedido a cada atualização de progresso e para no próximo ponto seguro.
+# O resultado fica na tabela 'snapshots' (ou, no caso do valor diário, na própria valor_diario),
+# com a versão do extrato usada no cálculo.
+
+_pool = None
+_trava_pool = threading.Lock()
+_futuros = {}       # { (caminho do banco, id da tarefa): Future }
+_bancos_verificados = set()
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa quando o cancelamento foi pedido."""
+
+# Funções de (de)serialização dos resultados (DataFrames viram JSON 'split')
+
+def resultado_para_json(resultado):
+    conteudo = {}
+    for chave, valor in resultado.items():
+        if isinstance(valor, pd.DataFrame):
+            conteudo[chave] = {"__df__": json.loads(valor.to_json(orient='split', date_format='iso'))}
+        else:
+            conteudo[chave] = valor
+    return json.dumps(conteudo)
+
+def resultado_de_json(texto):
+    resultado = {}
+    for chave, valor in json.loads(texto).items():
+        if isinstance(valor, dict) and "__df__" in valor:
+            df = valor["__df__"]
+            resultado[chave] = pd.DataFrame(df['data'], index=df['index'], columns=df['columns'])
+        else:
+            resultado[chave] = valor
+    return resultado
+
+def ler_resultado(tipo, chave='', apenas_atual=True):
+    """
+    Resultado guardado de uma tarefa (dict) ou None.
+    Com apenas_atual=True, ignora o snapshot calculado com uma versão antiga do extrato.
+    """
+    snapshot = ler_snapshot(tipo, chave)
+    if not snapshot:
+        return None
+    versao, gerado_em, conteudo = snapshot
+    if apenas_atual and versao != obter_versao('transacoes'):
+        return None
+    resultado = resultado_de_json(conteudo)
+    resultado['gerado_em'], resultado['versao_transacoes'] = gerado_em, versao
+    return resultado
+
+# Funções de cada tipo de tarefa (rodam no processo do pool, já dentro da carteira certa)
+# Recebem os parâmetros e a função de progresso; retornam (chave do snapshot, resultado) ou None.
+
+def _tarefa_valor_diario(parametros, progresso):
+    """Reconstrói a tabela valor_diario inteira (o resultado fica na própria tabela)."""
+    from nucleo.valor_diario import reconstruir_valor_diario
+
+    progresso(0.05, "Recalculando o valor diário de todos os ativos...")
+    linhas = reconstruir_valor_diario()
+    progresso(1.0, f"{linhas} linhas gravadas em valor_diario.")
+    return None
+
+def _tarefa_posicoes(parametros, progresso):
+    """Todas as quebras da posição e a conciliação de custódia."""
+    from nucleo.dados import carregar_transacoes
+    from nucleo.posicoes import calcular_posicoes_agrupadas, conciliar_custodia
+
+    progresso(0.1, "Lendo o extrato...")
+    df = carregar_transacoes()
+    progresso(0.4, "Calculando as posições...")
+    agrupadas = calcular_posicoes_agrupadas(df)
+    progresso(0.8, "Conciliando a custódia...")
+    agrupadas["Conciliação"] = conciliar_custodia(df, agrupadas["Ativo x Corretora"])
+    return '', agrupadas
+
+def _tarefa_impostos(parametros, progresso):
+    """Apuração mensal, DARFs e Bens e Direitos de um ano (a apuração roda no histórico todo por causa dos prejuízos)."""
+    from nucleo.dados import carregar_transacoes
+    from nucleo.impostos import apurar_ir_mensal, bens_e_direitos, calcular_darfs
+
+    ano = int(parametros['ano'])
+    progresso(0.1, f"Lendo o extrato ({ano})...")
+    df = carregar_transacoes()
+    progresso(0.3, f"Apurando o IR de {ano}...")
+    apuracao = apurar_ir_mensal(df)
+    darfs = calcular_darfs(apuracao)
+    progresso(0.7, f"Montando Bens e Direitos de {ano}...")
+    bens = bens_e_direitos(df, ano)
+    return str(ano), {
+        "apuracao": apuracao[apuracao['Mês'].str.startswith(str(ano))],
+        "darfs": darfs[darfs['Mês'].str.startswith(str(ano))],
+        "bens": bens,
+    }
+
+def _tarefa_monte_carlo(parametros, progresso):
+    """Chance de bater cada meta, simulando os retornos da carteira (estimados pelo valor_diario)."""
+    from nucleo.dados import carregar_transacoes
+    from nucleo.metas import calcular_progresso_metas, estimar_retorno_volatilidade, simular_metas
+    from nucleo.posicoes import calcular_carteira_atual
+    from nucleo.valor_diario import atualizar_valor_diario, carregar_valor_diario
+
+    progresso(0.02, "Lendo extrato e valor diário...")
+    df = carregar_transacoes()
+    atualizar_valor_diario()
+    retorno, volatilidade = estimar_retorno_volatilidade(carregar_valor_diario())
+    retorno = parametros.get('retorno_anual') or retorno
+    volatilidade = parametros.get('volatilidade_anual') or volatilidade
+    lista = calcular_progresso_metas(df, listar_metas()) if not df.empty else []
+
+    progresso(0.05, "Simulando cenários...")
+    resultado = simular_metas(
+        lista, calcular_carteira_atual(df).custo_total() if not df.empty else 0.0,
+        aporte_mensal=float(parametros.get('aporte_mensal', 0.0)),
+        retorno_anual=retorno, volatilidade_anual=volatilidade,
+        simulacoes=int(parametros.get('simulacoes', SIMULACOES_MC)),
+        semente=parametros.get('semente'),
+        progresso=lambda fracao: progresso(0.05 + 0.9 * fracao)
+    )
+    resultado['parametros'] = {"retorno_anual": retorno, "volatilidade_anual": volatilidade,
+                               "aporte_mensal": float(parametros.get('aporte_mensal', 0.0))}
+    return '', resultado
+
+# tipo -> (descrição, função)
+TIPOS_TAREFA = {
+    "valor_diario": ("Reconstruir valor diário", _tarefa_valor_diario),
+    "posicoes": ("Recalcular posições", _tarefa_posicoes),
+    "impostos": ("Apurar IR do ano", _tarefa_impostos),
+    "monte_carlo": ("Simular metas (Monte Carlo)", _tarefa_monte_carlo),
+}
+
+def descrever_tarefa(tipo, parametros='{}'):
+    """Rótulo da tarefa para a tela (ex: 'Apurar IR do ano 2024')."""
+    descricao = TIPOS_TAREFA[tipo][0] if tipo in TIPOS_TAREFA else tipo
+    ano = json.loads(parametros or '{}').get('ano')
+    return f"{descricao} {ano}" if ano else descricao
+
+def _executar(id_tarefa, caminhos, carteira, tipo, parametros):
+    """Ponto de entrada no processo do pool."""
+    from migracoes import migrar
+
+    # O processo novo não herda caminhos trocados em tempo de execução (ex: scripts de teste)
+    database.CAMINHO_DB, database.DIRETORIO_CARTEIRAS = caminhos
+    with usar_carteira(carteira):
+        migrar()
+        if not iniciar_tarefa(id_tarefa):
+            return  # Cancelada enquanto esperava na fila
+
+        ultimo = [0.0, 0.0]     # [fração, momento] da última gravação
+        def progresso(fracao, mensagem=None):
+            # Só grava a cada 1% (ou com mensagem nova) para não disputar o banco com a página
+            agora = time.monotonic()
+            if mensagem is None and fracao - ultimo[0] < 0.01 and agora - ultimo[1] < 1:
+                return
+            ultimo[:] = [fracao, agora]
+            if registrar_progresso(id_tarefa, min(fracao, 0.99), mensagem):
+                raise TarefaCancelada()
+
+        try:
+            # Versão lida antes do cálculo: se o extrato mudar no meio, o snapshot já nasce desatualizado
+            versao = obter_versao('transacoes')
+            saida = TIPOS_TAREFA[tipo][1](parametros, progresso)
+            if saida:
+                chave, resultado = saida
+                salvar_snapshot(tipo, chave, resultado_para_json(resultado), versao)
+        except TarefaCancelada:
+            finalizar_tarefa(id_tarefa, 'cancelada', "Cancelada pelo usuário.")
+        except Exception as e:
+            finalizar_tarefa(id_tarefa, 'erro', f"{type(e).__name__}: {e}")
+        else:
+            finalizar_tarefa(id_tarefa, 'concluida', "Concluída.")
+
+def executar_agora(tipo, **parametros):
+    """
+    Roda a tarefa no próprio processo, na carteira ativa (sem fila, pool nem progresso), e guarda
+    o snapshot como o pool faria. Para scripts que já rodam fora da página (ex: aquecimento.py).
+    """
+    versao = obter_versao('transacoes')
+    saida = TIPOS_TAREFA[tipo][1](parametros, lambda fracao, mensagem=None: None)
+    if saida:
+        chave, resultado = saida
+        salvar_snapshot(tipo, chave, resultado_para_json(resultado), versao)
+    return saida
+
+# Funções usadas pela página (processo principal)
+# Só um processo (o do Streamlit) dispara tarefas: o que ficou 'executando' no banco
+# antes desse processo subir foi interrompido junto com o servidor anterior.
+
+def _verificar_interrompidas():
+    caminho = database.caminho_banco()
+    if caminho not in _bancos_verificados:
+        marcar_tarefas_interrompidas()
+        _bancos_verificados.add(caminho)
+
+def obter_pool():
+    """Pool de processos do processo atual (criado na primeira tarefa e reaproveitado entre os reruns)."""
+    global _pool
+    with _trava_pool:
+        if _pool is None:
+            # 'spawn': o processo novo não herda as threads e conexões abertas do Streamlit
+            _pool = ProcessPoolExecutor(max_workers=MAX_PROCESSOS_TAREFAS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+@contextmanager
+def _sem_script_principal():
+    # O Streamlit instala o app.py como __main__, e o 'spawn' reexecuta o __main__ em cada processo novo
+    # (a página inteira rodaria no processo da tarefa). Enquanto os processos sobem, o __main__ fica vazio.
+    principal = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = principal
+
+def enviar_tarefa(tipo, carteira=None, **parametros):
+    """Registra e manda a tarefa para o pool. Retorna o id (na tabela 'tarefas' da carteira)."""
+    if tipo not in TIPOS_TAREFA:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo!r}")
+    carteira = carteira or database.carteira_atual()
+    with usar_carteira(carteira):
+        _verificar_interrompidas()
+        id_tarefa = criar_tarefa(tipo, json.dumps(parametros))
+        caminho = database.caminho_banco()
+    with _sem_script_principal():
+        futuro = obter_pool().submit(
+            _executar, id_tarefa, (database.CAMINHO_DB, database.DIRETORIO_CARTEIRAS), carteira, tipo, parametros
+        )
+    _futuros[(caminho, id_tarefa)] = futuro
+    futuro.add_done_callback(lambda f: _ao_terminar(f, caminho, carteira, id_tarefa))
+    return id_tarefa
+
+def _ao_terminar(futuro, caminho, carteira, id_tarefa):
+    # Roda numa thread do pool: a carteira precisa ser escolhida de novo
+    _futuros.pop((caminho, id_tarefa), None)
+    if futuro.cancelled() or futuro.exception() is None:
+        return
+    # O processo morreu antes de fechar a tarefa (ex: falta de memória)
+    with usar_carteira(carteira):
+        finalizar_tarefa(id_tarefa, 'erro', f"Processo interrompido: {futuro.exception()}")
+
+def enviar_em_lote(tipo, carteiras=None, anos=None, **parametros):
+    """
+    Uma tarefa por carteira (todas, por padrão) e, se 'anos' vier, uma por ano também.
+    As tarefas rodam em paralelo no pool. Retorna [(carteira, id), ...].
+    """
+    ids = []
+    for carteira in carteiras or listar_carteiras():
+        for ano in anos or [None]:
+            extras = {"ano": int(ano)} if ano is not None else {}
+            ids.append((carteira, enviar_tarefa(tipo, carteira, **parametros, **extras)))
+    return ids
+
+def cancelar_tarefa(id_tarefa, carteira=None):
+    """
+    Cancela a tarefa: tira da fila do pool se ainda não começou; se está rodando,
+    ela para no próximo aviso de progresso. Retorna o novo estado (ou None).
+    """
+    with usar_carteira(carteira or database.carteira_atual()):
+        futuro = _futuros.get((database.caminho_banco(), id_tarefa))
+        if futuro is not None:
+            futuro.cancel()
+        return pedir_cancelamento(id_tarefa)
+
+def tarefas_ativas(carteira=None):
+    """Quantas tarefas da carteira ainda estão na fila ou rodando."""
+    with usar_carteira(carteira or database.carteira_atual()):
+        _verificar_interrompidas()
+        return len(database.listar_tarefas(limite=1000, estados=ESTADOS_TAREFA_ATIVOS))
@@ -1,368 +1,60 @@
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import numpy as np
 import pandas as pd
 import streamlit as st
-import yfinance as yf
-from bcb import sgs
 from constants import *
-
-# Funções de cálculos primários
-
-def calcular_total_bonificacoes(df):
-    """
-    Retorna apenas a soma financeira do que entrou como Bonificação.
-    """
-    if df.empty:
-        return 0.0
-    total = df[df['Tipo'] == 'Bonificacao']['Qtd'].sum()
-    return float(total)
-
-def calcular_proventos_ano_atual(df):
-    """
-    Retorna a soma financeira de proventos (Dividendo/JCP) do ano ATUAL.
-    """
-    if df.empty:
-        return 0.0
-    
-    # Garante datetime
-    if not pd.api.types.is_datetime64_any_dtype(df['Data']):
-        df = df.copy()
-        df['Data'] = pd.to_datetime(df['Data'])
-        
-    ano_atual = datetime.now().year
-    mask_ano = df['Data'].dt.year == ano_atual
-    mask_tipo = df['Tipo'].isin(['Dividendo', 'JCP', 'Bonificacao'])
-    
-    total = df.loc[mask_ano & mask_tipo, 'Total'].sum()
-    return float(total)
-
-def calcular_carteira_atual(df):
-    """
-    Retorna apenas o dicionário da carteira atual (Qtd e Custo de cada ativo).
-    """
-    carteira, _ = _processar_fluxo_caixa(df)
-    return carteira
-
-def calcular_lucro_realizado(df):
-    """
-    Retorna apenas o valor total do Lucro Realizado com vendas.
-    """
-    _, lucro = _processar_fluxo_caixa(df)
-    return lucro
-
-def _processar_fluxo_caixa(df):
-    """
-    Função interna para preço médio
-    """
-    df = df.sort_values('Data')
-    
-    carteira = {}
-    lucro_acumulado = 0.0
-    
-    for index, row in df.iterrows():
-        ativo = row['Ativo']
-        tipo = row['Tipo']
-        qtd = row['Qtd']
-        total = row['Total']
-        
-        if ativo not in carteira:
-            carteira[ativo] = {'qtd': 0.0, 'custo_total': 0.0}
-        if tipo in ['Compra', 'Aporte', 'Reinvestimento', 'Bonificacao']:
-            carteira[ativo]['qtd'] += qtd
-            carteira[ativo]['custo_total'] += total
-        elif tipo in ['Venda', 'Resgate']:
-            if carteira[ativo]['qtd'] > 0:
-                pm = carteira[ativo]['custo_total'] / carteira[ativo]['qtd']
-                custo_saida = pm * qtd
-                
-                if tipo == 'Venda':     # Apenas vendas, lucro do resgate já foi registrado nas bonificações
-                    lucro_operacao = total - custo_saida
-                    lucro_acumulado += lucro_operacao
-                
-                carteira[ativo]['qtd'] -= qtd
-                carteira[ativo]['custo_total'] -= custo_saida
-    carteira_limpa = {k: v for k, v in carteira.items() if v['qtd'] > 0.000001}
-    return carteira_limpa, lucro_acumulado
-
-def calcular_resumo_ativos(df_transacoes):
-    """
-    Calcula Qtd e Preço Médio de cada ativo.
-    Retorna um DataFrame pronto para exibição.
-    """
-    if df_transacoes.empty:
-        return pd.DataFrame()
-
-    carteira = {}   # Estrutura: { 'PETR4': {'qtd': 100, 'custo_total': 2500} }
-    df_sorted = df_transacoes.sort_values('Data')
-
-    for _, row in df_sorted.iterrows():
-        ativo = row['Ativo']
-        tipo = row['Tipo']
-        qtd = row['Qtd']
-        total = row['Total']
-
-        if ativo not in carteira:
-            carteira[ativo] = {'qtd': 0.0, 'custo_total': 0.0}
-        
-        dados = carteira[ativo]
-
-        # Lógica de Compra (Sobe PM)
-        if tipo in ['Compra', 'Aporte', 'Reinvestimento', 'Bonificacao']:
-            dados['qtd'] += qtd
-            dados['custo_total'] += total 
-        
-        # Lógica de Venda (Mantém PM)
-        elif tipo in ['Venda', 'Resgate', 'Saque']:
-            if dados['qtd'] > 0:
-                pm_atual = dados['custo_total'] / dados['qtd']
-                custo_saida = qtd * pm_atual
-                dados['qtd'] -= qtd
-                dados['custo_total'] -= custo_saida
-
-    # Monta a tabela final
-    linhas = []
-    for ativo, dados in carteira.items():
-        qtd = dados['qtd']
-        custo = dados['custo_total']
-        
-        # Filtra ativos zerados
-        if qtd >= 1e-8:
-            pm = custo / qtd
-            linhas.append({
-                "Ativo": ativo,
-                "Quantidade": qtd,
-                "Preço Médio": pm,
-                "Total Investido": custo
-            })
-            
-    df_resumo = pd.DataFrame(linhas)
-    if not df_resumo.empty:
-        df_resumo = df_resumo.sort_values("Ativo")
-        
-    return df_resumo
-
-def calcular_evolucao_patrimonial(df_sorted, date_range):
-    """
-    Calcula a evolução patrimonial mensal.
-    Retorna eixos X (datas), Y1 (aportes mensais) e Y2 (total acumulado).
-    """
-    eixo_datas = []
-    eixo_aportes = []
-    eixo_acumulado = [] 
-    carteira_temp = {} 
-
-    for data_mes in date_range:
-        # Filtra transações deste mes específico
-        mask_mes = (df_sorted['Data'].dt.year == data_mes.year) & (df_sorted['Data'].dt.month == data_mes.month)
-        transacoes_mes = df_sorted[mask_mes]
-        
-        aporte_do_mes = 0.0
-        
-        # Processa cada transação do mês
-        for _, row in transacoes_mes.iterrows():
-            ativo = row['Ativo']
-            tipo = row['Tipo']
-            qtd = row['Qtd']
-            total = row['Total']
-            
-            if ativo not in carteira_temp:
-                carteira_temp[ativo] = {'qtd': 0.0, 'custo_total': 0.0}
-            
-            if tipo in ['Compra', 'Aporte']:
-                carteira_temp[ativo]['qtd'] += qtd
-                carteira_temp[ativo]['custo_total'] += total
-                aporte_do_mes += total 
-            
-            elif tipo == 'Reinvestimento':
-                carteira_temp[ativo]['qtd'] += qtd
-                carteira_temp[ativo]['custo_total'] += total 
-                
-            elif tipo == 'Bonificacao':
-                carteira_temp[ativo]['qtd'] += qtd
-                carteira_temp[ativo]['custo_total'] += total
-                
-            elif tipo == 'Venda':
-                if carteira_temp[ativo]['qtd'] > 0:
-                    pm = carteira_temp[ativo]['custo_total'] / carteira_temp[ativo]['qtd']
-                    custo_da_venda = pm * qtd
-                    carteira_temp[ativo]['qtd'] -= qtd
-                    carteira_temp[ativo]['custo_total'] -= custo_da_venda
-
-            elif tipo in ['Saque', 'Resgate']:
-                if carteira_temp[ativo]['qtd'] > 0:
-                    pm = carteira_temp[ativo]['custo_total'] / carteira_temp[ativo]['qtd']
-                    custo_saque = pm * qtd
-                    carteira_temp[ativo]['qtd'] -= qtd
-                    carteira_temp[ativo]['custo_total'] -= custo_saque
-                
-                # Desconta do aporte do mês
-                aporte_do_mes -= total
-
-        total_investido_mes = sum(item['custo_total'] for item in carteira_temp.values())
-        
-        eixo_datas.append(data_mes)
-        eixo_aportes.append(aporte_do_mes)
-        eixo_acumulado.append(total_investido_mes)
-        
-    return eixo_datas, eixo_aportes, eixo_acumulado
-
-def calcular_alocacao_por_classe(df):
-    """
-    Agrupa o total investido por Classe de Ativo (Renda Fixa x Variavel).
-    Retorna DataFrame pronto para o gráfico de Pizza.
-    """
-    df_temp = df.copy()
-    df_temp['Classe_Ativo'] = df_temp['Categoria'].apply(
-        lambda x: 'Renda Fixa' if x in MAPA_CLASSES['Renda Fixa'] else 'Renda Variável'
-    )
-    
-    # Calcula a alocação baseada na carteira ATUAL (Saldo de Compras - Vendas/Resgates)
-    carteira_atual = calcular_carteira_atual(df_temp)
-    
-    lista_alocacao = []
-    for ativo, dados in carteira_atual.items():
-        if dados['custo_total'] > 0.01:
-             # Recupera categoria original
-             cat = df_temp[df_temp['Ativo'] == ativo]['Categoria'].iloc[-1]
-             # Define classe
-             if cat in MAPA_CLASSES['Renda Fixa']:
-                 classe = 'Renda Fixa'
-             else:
-                 classe = 'Renda Variável'
-                 
-             lista_alocacao.append({
-                 'Classe_Ativo': classe,
-                 'Total': dados['custo_total']
-             })
-             
-    df_chart = pd.DataFrame(lista_alocacao)
-    if df_chart.empty:
-        return pd.DataFrame(columns=['Classe_Ativo', 'Total'])
-        
-    return df_chart.groupby('Classe_Ativo')['Total'].sum().reset_index()
-
-def gerar_tabela_alocacao(carteira, df_transacoes):
-    """
-    Gera a tabela de alocação detalhada por ativo e suas categorias.
-    """
-    lista_posicao = []
-    
-    # Cache simples de categorias para não buscar no DF a cada iteração de forma lenta
-    # Cria um dict: { 'PETR4': 'Ações', 'TESOURO': 'Renda Fixa' ... }
-    # Pega o último registro de categoria válido para cada ativo
-    mapa_categorias = {}
-    if not df_transacoes.empty and 'Categoria' in df_transacoes.columns:
-        df_unicos = df_transacoes[['Ativo', 'Categoria']].drop_duplicates('Ativo', keep='last')
-        mapa_categorias = dict(zip(df_unicos['Ativo'], df_unicos['Categoria']))
-
-    for ativo, dados_ativo in carteira.items():
-        if dados_ativo['custo_total'] > 0.01:
-            cat_original = mapa_categorias.get(ativo, "Outros")
-            classe = classificar_ativo(cat_original) # Usa a função já existente
-            
-            # Ajuste fino: Se a função retornar o próprio nome (Ex: Ações), converte para Macro
-            if classe not in ['Renda Fixa', 'Renda Variável']:
-                 # Se não é Renda Fixa, assume Variável para o gráfico macro
-                 classe = 'Renda Variável' if cat_original not in MAPA_CLASSES['Renda Fixa'] else 'Renda Fixa'
-
-            lista_posicao.append({
-                'Ativo': ativo,
-                'Categoria': cat_original,
-                'Classe': classe,
-                'Total Investido': dados_ativo['custo_total']
-            })
-    
-    return pd.DataFrame(lista_posicao)
-
-def calcular_cenarios_simulacao(qtd_atual, preco_simulado, pm_atual):
-    """
-    Gera cenários de venda parcial (25%, 50%, 75%, 100%).
-    """
-    cenarios = [0.25, 0.50, 0.75, 1.0]
-    lista_cenarios = []
-    
-    for p in cenarios:
-        q = qtd_atual * p
-        v = q * preco_simulado
-        c = q * pm_atual
-        l = v - c
-        lista_cenarios.append({
-            "Cenário": f"Vender {int(p*100)}%",
-            "Qtd": q,
-            "Receba (R$)": v,
-            "Lucro (R$)": l
-        })
-    
-    return pd.DataFrame(lista_cenarios)
+from agendador import em_dia
+from database import (carteira_atual, ler_cotacoes, ler_detalhes_ativo, ler_pendencias_valor_diario,
+                      listar_carteiras, listar_eventos, listar_indexadores, listar_rebalanceamentos, obter_versao,
+                      obter_versoes, salvar_cotacoes, salvar_detalhes_ativo, usar_carteira)
+from graficos import (figura_calendario_proventos, figura_correlacao, figura_desvio_alocacao, figura_evolucao,
+                      figura_linhas, figura_pizza, figura_projecao, figura_simulacao_vendas)
+from nucleo import *
+from nucleo import posicoes
+from tarefas import ler_resultado
+
+# Os cálculos ficam no pacote 'nucleo' (sem Streamlit).
+# Aqui ficam apenas as partes que dependem do Streamlit, como o cache.
+# Toda chave de cache leva a carteira ativa junto com a versão (cada carteira é um banco).
+
+def _versao(escopo='transacoes'):
+    """Versão de uma tabela na carteira ativa, como (carteira, versão)."""
+    return (carteira_atual(), obter_versao(escopo))
+
+def _versoes():
+    """{escopo: (carteira, versão)} de todas as tabelas versionadas da carteira ativa."""
+    carteira = carteira_atual()
+    return {escopo: (carteira, versao) for escopo, versao in obter_versoes().items()}
+
+def montar_extrato_ajustado(dados):
+    """DataFrame do extrato (linhas do consultar_extrato) com os eventos corporativos já aplicados."""
+    return aplicar_eventos_corporativos(pd.DataFrame(dados, columns=COLUNAS_DB), listar_eventos())
 
 # Funções que puxam dados externos
+# O agendador.py mantém cotações, histórico, SGS e notícias no banco; a página só lê de lá.
+# A busca online aqui é o plano B: ativo que o agendador ainda não viu ou agendador parado.
+
+@st.cache_data
+def _cotacoes_guardadas(versao_cotacoes, lista_tickers):
+    return ler_cotacoes(lista_tickers)
 
 @st.cache_data(ttl=3600)
+def _buscar_cotacoes_faltantes(carteira, lista_tickers):
+    cotacoes = buscar_cotacoes(list(lista_tickers))
+    salvar_cotacoes(cotacoes)
+    return cotacoes
+
 def obter_cotacao_online(lista_tickers):
     """
-    Busca cotação online via yfinance.
-    Tenta em lote primeiro. Se falhar, tenta individualmente.
-    Cache de 1 hora.
+    Cotações do cache local (cotacoes_cache), em cache pela versão 'cotacoes'.
+    Só os ativos sem nenhuma cotação guardada são buscados online (no máximo 1 vez por hora).
     """
-    if not lista_tickers:
-        return {}
-    
-    # Dicionário de resultados
-    cotacoes = {}
-    
-    # 1. Tratamento inicial de tickers
-    mapa_tickers = {} # { 'BTC': 'BTC-BRL', 'PETR4': 'PETR4.SA' }
-    
-    for t in lista_tickers:
-        t_str = str(t).upper().strip()
-        t_final = t_str
-        
-        # Lógica de sufixos
-        if t_str in ["BTC", "ETH", "USDT", "BNB", "SOL", "XRP", "ADA", "DOGE", "AVAX"]:
-             t_final = f"{t_str}-BRL"
-        elif len(t_str) >= 5 and t_str[-1].isdigit() and ".SA" not in t_str:
-             t_final = f"{t_str}.SA"
-             
-        mapa_tickers[t] = t_final
-
-    lista_para_yahoo = list(mapa_tickers.values())
-    try:
-        dados = yf.download(lista_para_yahoo, period="1d", progress=False)['Close']
-        if not dados.empty:
-            if isinstance(dados, pd.Series):
-                 val = dados.iloc[-1]
-                 if not pd.isna(val):
-                     tk_unico = list(mapa_tickers.keys())[0]
-                     cotacoes[tk_unico] = float(val)
-            elif isinstance(dados, pd.DataFrame):
-                for t_orig, t_yahoo in mapa_tickers.items():
-                    if t_yahoo in dados.columns:
-                        val = dados[t_yahoo].iloc[-1]
-                        if not pd.isna(val):
-                            cotacoes[t_orig] = float(val)
-    except Exception as e:
-        print(f"Erro no download em lote: {e}") # Changed st.write to print to avoid UI clutter in cache func
-    # Fallback: Verifica quem ficou sem cotação e tenta individualmente
-    faltantes = [t for t in lista_tickers if t not in cotacoes]
+    cotacoes = dict(_cotacoes_guardadas(_versao('cotacoes'), tuple(lista_tickers)))
+    faltantes = tuple(t for t in lista_tickers if t not in cotacoes)
     if faltantes:
-        for t in faltantes:
-            t_yahoo = mapa_tickers[t]
-            val = _buscar_ticker_individual(t_yahoo)
-            # Se falhou e era cripto BRL, tenta USD
-            if val is None and t_yahoo.endswith("-BRL"):
-                t_usd = t_yahoo.replace("-BRL", "-USD")
-                val_usd = _buscar_ticker_individual(t_usd)
-                if val_usd is not None:
-                     # Converte para BRL (pega dolar hoje aprox ou do yahoo)
-                     dolar = _buscar_ticker_individual("BRL=X") # Yahoo: BRL=X é USD/BRL? Não, USDBRL=X
-                     if not dolar: dolar = _buscar_ticker_individual("USDBRL=X")
-                     val = val_usd * dolar
-            
-            if val is not None:
-                cotacoes[t] = val
-                
+        cotacoes.update(_buscar_cotacoes_faltantes(carteira_atual(), faltantes))
     return cotacoes
 
 def limpar_cache():
@@ -370,297 +62,316 @@ def limpar_cache():
     st.cache_data.clear()
 
 @st.cache_data(ttl=86400) # Cache de 24h para infos estáticas
+def _buscar_detalhes_ativo(carteira, ticker):
+    detalhes = buscar_detalhes_ativo(ticker)
+    if not detalhes.get("erro"):
+        salvar_detalhes_ativo(ticker, detalhes)
+    return detalhes
+
 def obter_detalhes_ativo(ticker):
     """
-    Busca informações detalhadas e notícias de um ativo.
+    Informações detalhadas e notícias de um ativo, lidas do banco (o agendador atualiza a cada 3 horas).
     Retorna dict com summary, sector, news, etc.
     """
-    # Normalização de ticker igual ao obter_cotacao
-    t_str = str(ticker).upper().strip()
-    t_final = t_str
-    if t_str in ["BTC", "ETH", "USDT", "BNB", "SOL", "XRP", "ADA", "DOGE", "AVAX"]:
-            t_final = f"{t_str}-BRL"
-    elif len(t_str) >= 5 and t_str[-1].isdigit() and ".SA" not in t_str:
-            t_final = f"{t_str}.SA"
-            
-    try:
-        t = yf.Ticker(t_final)
-        info = t.info
-        news = t.news
-        
-        return {
-            "longName": info.get("longName", t_final),
-            "sector": info.get("sector", "Desconhecido"),
-            "industry": info.get("industry", "-"),
-            "longBusinessSummary": info.get("longBusinessSummary", "Sem descrição disponível."),
-            "news": news[:3] if news else [] # Top 3 noticias
-        }
-    except Exception as e:
-        return {
-            "longName": t_final,
-            "sector": "-",
-            "industry": "-",
-            "longBusinessSummary": f"Erro ao buscar detalhes: {str(e)}",
-            "news": []
-        }
-
-def _buscar_ticker_individual(ticker):
-    """Helper para buscar 1 ticker específico"""
-    try:
-        t = yf.Ticker(ticker)
-        hist = t.history(period="1d")
-        if not hist.empty:
-            return float(hist['Close'].iloc[-1])
-    except:
-        return None
-    return None
+    return ler_detalhes_ativo(ticker) or _buscar_detalhes_ativo(carteira_atual(), ticker)
+
+@st.cache_data(ttl=43200)
+def _atualizar_indices_sgs(carteira):
+    return atualizar_series_sgs()
+
+def atualizar_indices_sgs():
+    """
+    Atualiza CDI/SELIC/IPCA no banco da carteira ativa (só baixa os dias novos).
+    Cache de 12 horas por carteira; nada é baixado se o agendador já buscou depois do último fechamento.
+    """
+    if em_dia('historico'):
+        return {}
+    return _atualizar_indices_sgs(carteira_atual())
+
+@st.cache_data(ttl=3600)
+def _valores_renda_fixa(versoes, hoje, _df_transacoes):
+    # O DataFrame não entra no hash (prefixo _): a chave é a versão do extrato, das séries e dos indexadores
+    df_rf = valorizar_renda_fixa(_df_transacoes, listar_indexadores(), hoje=hoje)
+    return dict(zip(df_rf['Ativo'], df_rf['Valor Atual']))
+
+def obter_valores_renda_fixa(df_transacoes):
+    """
+    Retorna {ativo: valor na curva} dos títulos de Renda Fixa com indexador cadastrado.
+    """
+    atualizar_indices_sgs()
+    versoes = _versoes()
+    chave = (versoes.get('transacoes'), versoes.get('series_sgs'), versoes.get('indexadores_rf'))
+    return _valores_renda_fixa(chave, date.today(), df_transacoes)
+
+@st.cache_data(ttl=3600)
+def atualizar_precos_historicos(versao_transacoes, _df_transacoes):
+    """
+    Baixa os fechamentos novos dos ativos de Renda Variável (só os dias que faltam).
+    Cache de 1 hora ou até o extrato mudar.
+    """
+    return atualizar_historico_precos(inicios_renda_variavel(_df_transacoes))
+
+@st.cache_data
+def _patrimonio_diario(versao_valor_diario):
+    return serie_patrimonio_diario()
+
+_valor_diario_estendido = {}   # { carteira: data em que valor_diario já foi estendido até hoje }
+
+def _atualizar_valor_diario_se_preciso():
+    """
+    Roda atualizar_valor_diario só se há trechos pendentes ou se a tabela ainda não foi
+    estendida hoje. Nos demais reruns custa uma leitura da tabela valor_diario_pendente.
+    """
+    carteira, hoje = carteira_atual(), date.today()
+    if _valor_diario_estendido.get(carteira) == hoje and not ler_pendencias_valor_diario():
+        return
+    atualizar_valor_diario()
+    _valor_diario_estendido[carteira] = hoje
+
+def obter_patrimonio_diario(df_transacoes):
+    """
+    Série diária de Valor de Mercado e Custo da carteira, lida da tabela valor_diario.
+    Antes, recalcula apenas os trechos marcados como pendentes pelas escritas (se houver).
+    """
+    if not em_dia('historico'):
+        atualizar_precos_historicos(_versao('transacoes'), df_transacoes)
+    _atualizar_valor_diario_se_preciso()
+    return _patrimonio_diario(_versao('valor_diario'))
+
+@st.cache_data(ttl=3600)
+def atualizar_precos_benchmarks(inicio, nomes, carteira):
+    """
+    Baixa os fechamentos novos dos índices de comparação (IBOV, IFIX, S&P 500, dólar).
+    Cache de 1 hora por carteira.
+    """
+    return atualizar_benchmarks(inicio, list(nomes))
+
+@st.cache_data
+def _serie_benchmark(nome, versoes, _df_transacoes, _datas):
+    # Um cache por benchmark: marcar/desmarcar outro índice não recalcula este
+    return serie_benchmarks(_df_transacoes, [nome], _datas)[nome]
+
+def obter_benchmarks(df_transacoes, nomes, datas):
+    """
+    Valor que os mesmos aportes teriam em cada benchmark escolhido, nas datas pedidas.
+    Chave do cache: benchmark + versões do extrato, dos preços, do SGS e de valor_diario (que define as datas).
+    """
+    if not nomes:
+        return pd.DataFrame(index=datas)
+    if any(BENCHMARKS[n][0] == "sgs" for n in nomes):
+        atualizar_indices_sgs()
+    nomes_preco = tuple(n for n in nomes if BENCHMARKS[n][0] != "sgs")
+    if nomes_preco and not em_dia('historico'):
+        atualizar_precos_benchmarks(df_transacoes['Data'].min().strftime('%Y-%m-%d'), nomes_preco, carteira_atual())
+
+    versoes = _versoes()
+    chave = (versoes.get('transacoes'), versoes.get('precos'), versoes.get('series_sgs'), versoes.get('valor_diario'))
+    return pd.DataFrame({nome: _serie_benchmark(nome, chave, df_transacoes, datas) for nome in nomes}, index=datas)
+
+@st.cache_data
+def _posicoes_agrupadas(versao_transacoes, _df_transacoes):
+    # O aquecimento na subida (ou a tarefa 'posicoes') pode já ter deixado tudo pronto nesta versão
+    pronto = ler_resultado('posicoes')
+    if pronto:
+        return {chave: valor for chave, valor in pronto.items() if isinstance(valor, pd.DataFrame)}
+    agrupadas = calcular_posicoes_agrupadas(_df_transacoes)
+    agrupadas["Conciliação"] = conciliar_custodia(_df_transacoes, agrupadas["Ativo x Corretora"])
+    return agrupadas
+
+def obter_posicoes_agrupadas(df_transacoes):
+    """
+    Todas as quebras da posição (ativo, ativo x corretora, ativo x moeda) e a conciliação de custódia,
+    calculadas juntas e guardadas pela versão do extrato: trocar de quebra não recalcula nada.
+    """
+    return _posicoes_agrupadas(_versao('transacoes'), df_transacoes)
+
+@st.cache_data
+def _apuracao_ir(versao_transacoes, _df_transacoes):
+    apuracao = apurar_ir_mensal(_df_transacoes)
+    return apuracao, calcular_darfs(apuracao)
+
+def obter_apuracao_ir(df_transacoes):
+    """
+    Apuração mensal do IR e DARFs de todos os anos (recalcula só quando o extrato muda).
+    Retorna (apuracao, darfs).
+    """
+    return _apuracao_ir(_versao('transacoes'), df_transacoes)
+
+@st.cache_data
+def _bens_e_direitos(versao_transacoes, ano, _df_transacoes):
+    # A tarefa de IR em segundo plano pode já ter deixado o ano pronto (na mesma versão do extrato)
+    pronto = ler_resultado('impostos', ano)
+    return pronto['bens'] if pronto else bens_e_direitos(_df_transacoes, ano)
+
+def obter_bens_e_direitos(df_transacoes, ano):
+    """Ficha 'Bens e Direitos' do ano, em cache pela versão do extrato."""
+    return _bens_e_direitos(_versao('transacoes'), ano, df_transacoes)
+
+@st.cache_data
+def _base_simulacao_vendas(versoes, mes, _df_transacoes):
+    df_rent, _ = gerar_painel_rentabilidade(calcular_carteira_atual(_df_transacoes), _df_transacoes)
+    posicoes_venda = pd.DataFrame({
+        'Ativo': df_rent['Ativo'],
+        'Categoria': df_rent['Ativo'].map(mapa_categorias(_df_transacoes)).fillna('Outros'),
+        'Qtd': df_rent['Qtd'],
+        'PM': df_rent['PM'],
+        'Preço': df_rent['Cotação Atual'],
+    }).sort_values('Ativo', ignore_index=True)
+    return posicoes_venda, situacao_mes_ir(_df_transacoes, mes)
+
+def obter_base_simulacao_vendas(df_transacoes):
+    """
+    Entradas do simulador de vendas: posições (Ativo/Categoria/Qtd/PM/Preço, pelas cotações em cache)
+    e a situação do IR no mês corrente. A grade em si (simular_vendas) é barata e roda a cada rerun.
+    """
+    return _base_simulacao_vendas(_versoes(), date.today().strftime('%Y-%m'), df_transacoes)
+
+@st.cache_data
+def _projecao_proventos(versao_transacoes, hoje, _df_transacoes):
+    projecao = projetar_proventos(_df_transacoes, hoje)
+    figura = figura_calendario_proventos(projecao['projecao']).to_json() if not projecao['projecao'].empty else None
+    return projecao, figura
+
+def obter_projecao_proventos(df_transacoes):
+    """
+    Proventos esperados nos próximos 12 meses (projecao, cadencia) e a figura (dict) do calendário.
+    Chave do cache: versão do extrato + dia (a janela dos 12 meses anda com a data).
+    """
+    projecao, figura = _projecao_proventos(_versao('transacoes'), date.today(), df_transacoes)
+    return projecao, json.loads(figura) if figura else None
+
+@st.cache_data
+def _analise_risco(versoes, janela, confianca, _df_transacoes):
+    return analisar_risco(_df_transacoes, janela, confianca)
+
+def obter_analise_risco(df_transacoes, janela=63, confianca=0.95):
+    """
+    Volatilidade, drawdown, correlação e VaR da carteira e de cada categoria.
+    Chave do cache: versões do extrato, dos preços e de valor_diario (nada é recalculado entre reruns).
+    """
+    versoes = _versoes()
+    chave = (versoes.get('transacoes'), versoes.get('precos'), versoes.get('valor_diario'))
+    return _analise_risco(chave, janela, confianca, df_transacoes)
 
 def gerar_painel_rentabilidade(carteira, df_transacoes):
     """
-    Monta a tabela comparando PM x Cotação Atual.
-    """
-    
-    # Filtra o que é Renda Variável para buscar cotação
-    # Precisa saber a categoria de cada ativo da carteira
-    mapa_categorias = {}
-    if not df_transacoes.empty and 'Categoria' in df_transacoes.columns:
-        df_unicos = df_transacoes[['Ativo', 'Categoria']].drop_duplicates('Ativo', keep='last')
-        mapa_categorias = dict(zip(df_unicos['Ativo'], df_unicos['Categoria']))
-    
-    ativos_rv = []
-    
-    # 2. Identifica quem é Renda Variável de fato
-    for ativo, dados in carteira.items():
-        if dados['qtd'] < 0.000001: continue
-        cat = mapa_categorias.get(ativo, "Outros")
-        classe_macro = classificar_ativo(cat)
-        if classe_macro != "Renda Fixa" and classe_macro != "Outros":
-            ativos_rv.append(ativo)
+    Monta a tabela comparando PM x Cotação Atual, usando as cotações em cache.
+    A Renda Fixa entra pelo valor na curva (ou pelo custo, se não tiver indexador).
+    """
+    ativos_rv = selecionar_ativos_renda_variavel(carteira, df_transacoes)
     cotacoes = obter_cotacao_online(ativos_rv)
-    lista_rentabilidade = []
-    total_atual_carteira = 0.0
-    total_custo_carteira = 0.0
-    for ativo in ativos_rv:
-        dados = carteira[ativo]
-        qtd = dados['qtd']
-        custo_total = dados['custo_total']
-        pm = custo_total / qtd
-        
-        usou_fallback = False
-        if ativo in cotacoes:
-             cotacao_atual = cotacoes[ativo]
-        else:
-             cotacao_atual = pm 
-             usou_fallback = True
-        
-        valor_atual_ativo = qtd * cotacao_atual
-        lucro_rs = valor_atual_ativo - custo_total
-        lucro_pct = (lucro_rs / custo_total) * 100 if custo_total > 0 else 0.0
-        
-        total_atual_carteira += valor_atual_ativo
-        total_custo_carteira += custo_total
-        
-        lista_rentabilidade.append({
-            "Ativo": ativo,
-            "Qtd": qtd,
-            "PM": pm,
-            "Cotação Atual": cotacao_atual,
-            "Valor Atual": valor_atual_ativo,
-            "Lucro (R$)": lucro_rs,
-            "Var (%)": lucro_pct,
-            "Status": "⚠️ Offline" if usou_fallback else "✅ Online"
-        })
-        
-    df_rent = pd.DataFrame(lista_rentabilidade)
-    if not df_rent.empty:
-        df_rent = df_rent.sort_values(by="Var (%)", ascending=False)
-        
-    resumo_geral = {
-        "custo_total": total_custo_carteira,
-        "valor_atual": total_atual_carteira,
-        "lucro_total_rs": total_atual_carteira - total_custo_carteira,
-        "lucro_total_pct": ((total_atual_carteira - total_custo_carteira) / total_custo_carteira * 100) if total_custo_carteira > 0 else 0
-    }
-    
-    return df_rent, resumo_geral
-
-# Funções do rebalanceamento
-
-def classificar_ativo(categoria_input, *args):
-    cat = str(categoria_input).strip()
-
-    # 1. Se for Renda Fixa -> Retorna "Renda Fixa"
-    if cat in MAPA_CLASSES["Renda Fixa"]:
-        return "Renda Fixa"
-
-    # 2. Se for Variável -> Retorna o PRÓPRIO nome (Ex: "Ações", "Stocks")
-    if cat in MAPA_CLASSES["Renda Variável"]:
-        return cat
-
-    # Caso não encontre
-    return "Outros"
-
-def preparar_dados_editor(df_completo):
-    """
-    Recebe tabela com 'Ativo', 'Quantidade' e 'Categoria'.
-    Monta visualização sem processamentos desnecessários.
-    """
-    lista_ativos = []
-    
-    if df_completo.empty:
-        return pd.DataFrame(columns=["Ativo", "Classificação", "Qtd Atual", "Preço Hoje", "Em Dólar?"])
-
-    for index, row in df_completo.iterrows():
-        ativo = row['Ativo']
-        qtd = float(row['Quantidade'])
-        cat_original = row['Categoria'] # Vem exata do banco
-        
-        # Classificação direta
-        macro_cat = classificar_ativo(cat_original)
-        
-        # Regra do Dólar (Ajuste se BDR ou ETF forem em Reais na sua visão)
-        # Assumindo que Stocks, REITs e ETF são dolarizados/precisam de conversão visual
-        cats_dolar = ["Stocks", "REITs", "ETF"] 
-        is_usd = macro_cat in cats_dolar
-        
-        lista_ativos.append({
-            "Ativo": ativo,
-            "Classificação": macro_cat,
-            "Qtd Atual": qtd,
-            "Preço Hoje": 0.0, 
-            "Em Dólar?": is_usd
-        })
-    
-    return pd.DataFrame(lista_ativos).sort_values(by="Classificação")
-
-def unificar_dados_com_categorias(df_carteira, df_raw):
-    """
-    Cruza o resumo da carteira com as categorias vindas do extrato.
-    """
-    # Recupera a categoria EXATA do banco (sem normalização)
-    # Pega a última categoria registrada para o ativo
-    tab_cat = df_raw[['Ativo', 'Categoria']].drop_duplicates('Ativo', keep='last')
-    
-    # Cruza: Tabela de Quantidades + Tabela de Categorias
-    df_completo = df_carteira.merge(tab_cat, on='Ativo', how='left')
-    df_completo['Categoria'] = df_completo['Categoria'].fillna("Outros")
-    
-    return df_completo
-
-def calcular_rebalanceamento(df_editado, aporte, cotacao_dolar, metas_usuario, valor_reserva=0.0):
-    """
-    Calcula rebalanceamento descontando a Reserva APENAS da categoria 'Renda Fixa'.
-    """
-    df_calc = df_editado.copy()
-    
-    # Cálculos Básicos
-    df_calc["Fator"] = df_calc["Em Dólar?"].apply(lambda x: cotacao_dolar if x else 1.0)
-    df_calc["Total Atual (R$)"] = df_calc["Qtd Atual"] * df_calc["Preço Hoje"] * df_calc["Fator"]
-    
-    # Agrupamento
-    resumo_atual = df_calc.groupby("Classificação")["Total Atual (R$)"].sum().reset_index()
-    
-    # Lógica da Reserva de Emergência (Abate apenas da Renda Fixa)
-    idx_rf = resumo_atual.index[resumo_atual["Classificação"] == "Renda Fixa"].tolist()
-    
-    if idx_rf:
-        idx = idx_rf[0]
-        valor_bruto = resumo_atual.at[idx, "Total Atual (R$)"]
-        # Garante que não fica negativo
-        valor_liquido = max(0.0, valor_bruto - valor_reserva)
-        resumo_atual.at[idx, "Total Atual (R$)"] = valor_liquido
-
-    # Totais Gerais
-    patrimonio_atual = resumo_atual["Total Atual (R$)"].sum()
-    patrimonio_final = patrimonio_atual + aporte
-    
-    # Comparação com as Metas
-    lista_comparacao = []
-    for categoria, meta_pct_raw in metas_usuario.items():
-        meta_pct = float(meta_pct_raw) / 100.0
-        
-        linha = resumo_atual[resumo_atual["Classificação"] == categoria]
-        saldo_atual = linha["Total Atual (R$)"].sum() if not linha.empty else 0.0
-        
-        pct_atual = (saldo_atual / patrimonio_atual) if patrimonio_atual > 0 else 0
-        meta_valor_ideal = patrimonio_final * meta_pct
-        diferenca = meta_valor_ideal - saldo_atual
-        
-        lista_comparacao.append({
-            "Categoria": categoria,
-            "Pct Atual": pct_atual * 100,
-            "Meta Pct": meta_pct * 100,
-            "Saldo Atual (R$)": saldo_atual,
-            "Meta (R$)": meta_valor_ideal,
-            "Diferença (R$)": diferenca
-        })
-        
-    df_comparacao = pd.DataFrame(lista_comparacao)
-    
-    # Separação Compra/Venda
-    compras = pd.DataFrame()
-    vendas = pd.DataFrame()
-    
-    if not df_comparacao.empty:
-        compras = df_comparacao[df_comparacao["Diferença (R$)"] > 1.0].sort_values("Diferença (R$)", ascending=False)
-        vendas = df_comparacao[df_comparacao["Diferença (R$)"] < -1.0].sort_values("Diferença (R$)", ascending=True)
-    
-    # Valor em "Outros" (fora das metas)
-    cats_meta = metas_usuario.keys()
-    outros = resumo_atual[~resumo_atual["Classificação"].isin(cats_meta)]
-    valor_outros = outros["Total Atual (R$)"].sum() if not outros.empty else 0.0
-
-    return {
-        "df_comparacao": df_comparacao,
-        "df_compras": compras,
-        "df_vendas": vendas,
-        "valor_outros": valor_outros,
-        "patrimonio_atual": patrimonio_atual,
-        "patrimonio_final": patrimonio_final
-    }
-
-# Funções de meta
-
-def calcular_progresso_metas(df_transacoes, lista_metas):
-    """
-    Recebe o DataFrame de transações e a lista de metas do banco.
-    Retorna uma lista de dicionários com o progresso calculado.
-    """
-    resultados = []
-    carteira_atual = calcular_carteira_atual(df_transacoes)
-    total_investido = sum(item['custo_total'] for item in carteira_atual.values())
-    total_proventos = df_transacoes[df_transacoes['Tipo'].isin(['Dividendo', 'JCP'])]['Total'].sum()
-    for meta in lista_metas:
-        id_meta, tipo, filtro, valor_alvo, data_limite, descricao = meta
-        
-        valor_atual = 0.0
-        if tipo == 'Patrimônio Total':
-            valor_atual = total_investido
-            
-        elif tipo == 'Total em Categoria':
-            for ativo, dados in carteira_atual.items():
-                cat_original = df_transacoes[df_transacoes['Ativo'] == ativo]['Categoria'].iloc[0]
-                classe = classificar_ativo(cat_original, ativo)
-                if filtro.lower() == classe.lower():
-                    valor_atual += dados['custo_total']
-                    
-        elif tipo == 'Renda Passiva (Total)':
-            valor_atual = total_proventos
-        progresso_pct = (valor_atual / valor_alvo) if valor_alvo > 0 else 0
-        if progresso_pct > 1.0: progresso_pct = 1.0
-        
-        falta = valor_alvo - valor_atual
-        if falta < 0: falta = 0
-        
-        resultados.append({
-            "id": id_meta,
-            "titulo": descricao if descricao else f"{tipo} - {filtro}",
-            "tipo": tipo,
-            "valor_atual": valor_atual,
-            "valor_alvo": valor_alvo,
-            "falta": falta,
-            "pct": progresso_pct,
-            "data_limite": data_limite
-        })
-        
-    return resultados
\ No newline at end of file
+    valores_rf = obter_valores_renda_fixa(df_transacoes)
+    return posicoes.gerar_painel_rentabilidade(carteira, df_transacoes, cotacoes, valores_rf)
+
+# Figuras dos gráficos, guardadas em JSON (montar a figura Plotly a cada rerun é caro)
+
+@st.cache_data(max_entries=50)
+def _figura_evolucao(versoes, hoje, periodo, benchmarks, _df_transacoes, _df_diario, _df_bench):
+    fig = figura_evolucao(_df_transacoes.sort_values('Data'), _df_diario, _df_bench, periodo, CORES_BENCHMARKS, hoje)
+    return fig.to_json()
+
+def obter_figura_evolucao(df_transacoes, df_diario, benchmarks, periodo="Tudo"):
+    """
+    Figura (dict) da evolução patrimonial com as séries diárias já reduzidas.
+    Chave do cache: versões do extrato, preços, SGS e valor_diario + benchmarks + período.
+    """
+    df_bench = obter_benchmarks(df_transacoes, benchmarks, df_diario.index) if not df_diario.empty else pd.DataFrame()
+    versoes = _versoes()
+    chave = (versoes.get('transacoes'), versoes.get('precos'), versoes.get('series_sgs'), versoes.get('valor_diario'))
+    return json.loads(_figura_evolucao(chave, date.today(), periodo, tuple(benchmarks), df_transacoes, df_diario, df_bench))
+
+@st.cache_data(max_entries=50)
+def _figura_pizza(df, valores, nomes, cores, legenda_lateral):
+    return figura_pizza(df, valores, nomes, list(cores), legenda_lateral).to_json()
+
+def obter_figura_pizza(df, valores, nomes, cores, legenda_lateral=False):
+    """
+    Figura (dict) de rosca. A tabela da pizza tem poucas linhas, então ela mesma entra
+    no hash do cache (mudou a alocação, muda a chave).
+    """
+    return json.loads(_figura_pizza(df[[valores, nomes]].reset_index(drop=True), valores, nomes, tuple(cores), legenda_lateral))
+
+@st.cache_data
+def _figuras_risco(versoes, janela, confianca, _df_transacoes):
+    risco = _analise_risco(versoes, janela, confianca, _df_transacoes)
+    volatilidade = figura_linhas(risco['volatilidade'] * 100)
+    drawdown = figura_linhas(risco['drawdown'][['Carteira']] * 100, cores=['#b23b3b'], area=True, mostrar_legenda=False)
+    correlacao = figura_correlacao(risco['correlacao']).to_json() if len(risco['correlacao']) > 1 else None
+    return volatilidade.to_json(), drawdown.to_json(), correlacao
+
+def obter_figuras_risco(df_transacoes, janela=63, confianca=0.95):
+    """
+    Figuras (dicts) de volatilidade móvel, drawdown e correlação (None com menos de 2 ativos),
+    na mesma chave de obter_analise_risco.
+    """
+    versoes = _versoes()
+    chave = (versoes.get('transacoes'), versoes.get('precos'), versoes.get('valor_diario'))
+    return tuple(json.loads(fig) if fig else None for fig in _figuras_risco(chave, janela, confianca, df_transacoes))
+
+@st.cache_data
+def _desvio_alocacao(chave, metas, reserva, limite_pp, limite_relativo, _df_transacoes):
+    desvio = calcular_desvio_alocacao(_df_transacoes, metas, reserva)
+    alertas = alertas_desvio(desvio, metas, limite_pp, limite_relativo)
+    if desvio.empty:
+        return desvio, alertas, None
+    realizados = [r[9] for r in listar_rebalanceamentos(apenas_realizados=True) if r[9] >= str(desvio.index[0].date())]
+    return desvio, alertas, figura_desvio_alocacao(desvio, limite_pp, realizados).to_json()
+
+def obter_desvio_alocacao(df_transacoes, metas, reserva=0.0, limite_pp=5.0, limite_relativo=25.0):
+    """
+    Desvio diário das metas de alocação (p.p.), alertas de rebalanceamento e a figura (dict ou None).
+    Atualiza antes os trechos pendentes do valor_diario (se houver). Chave do cache: versões do extrato,
+    valor_diario e rebalanceamentos + metas, reserva e limites.
+    """
+    _atualizar_valor_diario_se_preciso()
+    versoes = _versoes()
+    chave = (versoes.get('transacoes'), versoes.get('valor_diario'), versoes.get('rebalanceamentos'))
+    desvio, alertas, figura = _desvio_alocacao(chave, metas, reserva, limite_pp, limite_relativo, df_transacoes)
+    return desvio, alertas, json.loads(figura) if figura else None
+
+def obter_simulacao_metas():
+    """
+    Último Monte Carlo das metas (tarefa 'monte_carlo') com a figura do leque, ou None.
+    Vale mesmo se o extrato mudou depois ('atual' diz se ainda é da versão corrente).
+    """
+    resultado = ler_resultado('monte_carlo', apenas_atual=False)
+    if not resultado:
+        return None
+    percentis = resultado['percentis']
+    percentis.index = pd.to_datetime(percentis.index)
+    resultado['figura'] = json.loads(figura_projecao(percentis).to_json())
+    resultado['atual'] = resultado['versao_transacoes'] == obter_versao('transacoes')
+    return resultado
+
+# Qualidade dos dados do extrato
+
+@st.cache_data
+def _validacao(versoes):
+    return validar_extrato()
+
+def obter_validacao():
+    """
+    Problemas do extrato (vendas a descoberto, duplicatas, categorias divergentes...).
+    A validação é incremental (só os ativos alterados); o cache evita até a consulta ao log
+    enquanto o extrato e os eventos não mudam.
+    """
+    versoes = _versoes()
+    return _validacao((versoes.get('transacoes'), versoes.get('eventos_corporativos')))
+
+# Visão consolidada (todas as carteiras)
+
+@st.cache_data(ttl=3600)
+def _consolidado(chave):
+    return consolidar_carteiras([nome for nome, *_ in chave])
+
+def obter_consolidado():
+    """
+    Posições somadas de todas as carteiras (lidas em paralelo).
+    Chave do cache: versões do extrato, dos preços e de valor_diario de cada carteira.
+    """
+    chave = []
+    for nome in listar_carteiras():
+        with usar_carteira(nome):
+            versoes = obter_versoes()
+        chave.append((nome, versoes.get('transacoes'), versoes.get('precos'), versoes.get('valor_diario')))
+    return _consolidado(tuple(chave))